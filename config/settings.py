@@ -2,6 +2,7 @@
 Django settings for config project.
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -31,11 +32,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'quizz.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'quizz.profiles.ProfileMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -69,9 +72,51 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Varios workers escriben a la vez: tomar el lock al empezar y esperarlo
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # En archivo (no en memoria) para que los tests con hilos compartan la BD
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
+# Los tests no usan hilos en segundo plano ni vuelcan búferes en otra BD
+TEST_RUNNER = 'quizz.test_runner.QuizzTestRunner'
+
+# Caché: el quiz en curso, los mazos y las versiones de los índices viven
+# aquí, así que con varios workers debe ser compartida. QUIZZ_CACHE_BACKEND
+# elige el backend:
+#   locmem     (por defecto) un único proceso (runserver, un worker)
+#   redis      REDIS_URL, varios workers o servidores
+#   memcached  MEMCACHED_LOCATION, varios workers o servidores
+#   db         tabla quizz_cache (python manage.py createcachetable)
+CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    'redis': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0'),
+    },
+    'memcached': {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': os.environ.get('MEMCACHED_LOCATION', '127.0.0.1:11211'),
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'quizz_cache',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+CACHES = {
+    'default': CACHE_BACKENDS[os.environ.get('QUIZZ_CACHE_BACKEND', 'locmem')],
+}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -113,3 +158,7 @@ LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'home'
 LOGOUT_REDIRECT_URL = 'welcome'
 
+
+# /metrics/ (Prometheus): además del personal staff, quien envíe
+# "Authorization: Bearer <token>"; vacío lo desactiva
+QUIZZ_METRICS_TOKEN = os.environ.get('QUIZZ_METRICS_TOKEN', '')
@@ -1,7 +1,9 @@
 from django.contrib import admin
+from . import exams
 from .models import (
     Category, Question, Answer, UserProfile, Badge, 
-    UserBadge, Quiz, QuizAttempt, QuizResponse, Friend
+    UserBadge, Quiz, QuizAttempt, QuizResponse, Friend, LeaderboardEntry,
+    LiveAnswerTally, QuestionStats, UserStats, DailyPoints, Exam, ExamDeck,
 )
 
 
@@ -19,11 +21,51 @@ class AnswerInline(admin.TabularInline):
 
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
-    list_display = ['question_text', 'category', 'points', 'is_active', 'created_at']
+    list_display = ['question_text', 'category', 'points', 'is_active', 'times_answered', 'accuracy',
+                    'difficulty_display', 'median_time', 'created_at']
     list_filter = ['category', 'is_active']
+    list_select_related = ['category', 'stats']
     search_fields = ['question_text']
+    readonly_fields = ['answer_distribution']
     inlines = [AnswerInline]
 
+    @staticmethod
+    def _stats(obj):
+        try:
+            return obj.stats
+        except QuestionStats.DoesNotExist:
+            return None
+
+    @admin.display(description='Respondida', ordering='stats__attempts')
+    def times_answered(self, obj):
+        stats = self._stats(obj)
+        return stats.attempts if stats else 0
+
+    @admin.display(description='Acierto')
+    def accuracy(self, obj):
+        stats = self._stats(obj)
+        return f'{stats.get_accuracy():.0f}%' if stats and stats.attempts else '-'
+
+    @admin.display(description='Dificultad', ordering='difficulty')
+    def difficulty_display(self, obj):
+        return f'{obj.difficulty:.2f}' if obj.difficulty is not None else '-'
+
+    @admin.display(description='Mediana (s)', ordering='stats__median_seconds')
+    def median_time(self, obj):
+        stats = self._stats(obj)
+        return f'{stats.median_seconds:.1f}' if stats and stats.median_seconds is not None else '-'
+
+    @admin.display(description='Distribución de respuestas')
+    def answer_distribution(self, obj):
+        stats = self._stats(obj)
+        if not stats or not stats.attempts:
+            return '-'
+        return ', '.join(
+            f'{answer.answer_text}{" ✓" if answer.is_correct else ""}: '
+            f'{stats.answer_counts.get(str(answer.pk), 0) / stats.attempts:.0%}'
+            for answer in obj.answers.all()
+        )
+
 
 @admin.register(Answer)
 class AnswerAdmin(admin.ModelAdmin):
@@ -75,3 +117,73 @@ class QuizResponseAdmin(admin.ModelAdmin):
 class FriendAdmin(admin.ModelAdmin):
     list_display = ['user', 'friend', 'created_at']
     search_fields = ['user__username', 'friend__username']
+
+
+@admin.register(LeaderboardEntry)
+class LeaderboardEntryAdmin(admin.ModelAdmin):
+    list_display = ['user', 'period', 'bucket', 'points', 'quizzes']
+    list_filter = ['period', 'bucket']
+    search_fields = ['user__username']
+
+
+@admin.register(LiveAnswerTally)
+class LiveAnswerTallyAdmin(admin.ModelAdmin):
+    list_display = ['quiz', 'question', 'answer', 'count']
+    list_filter = ['quiz']
+
+
+@admin.register(QuestionStats)
+class QuestionStatsAdmin(admin.ModelAdmin):
+    list_display = ['question', 'attempts', 'correct', 'median_seconds', 'updated_at']
+    list_select_related = ['question']
+    ordering = ['-question__difficulty']
+    readonly_fields = ['question', 'attempts', 'correct', 'answer_counts', 'time_histogram',
+                       'median_seconds', 'updated_at']
+
+
+@admin.register(UserStats)
+class UserStatsAdmin(admin.ModelAdmin):
+    list_display = ['user', 'best_score', 'wins', 'current_streak', 'best_streak', 'last_played_on']
+    list_select_related = ['user']
+    search_fields = ['user__username']
+
+
+@admin.register(DailyPoints)
+class DailyPointsAdmin(admin.ModelAdmin):
+    list_display = ['user', 'day', 'category', 'points', 'quizzes']
+    list_filter = ['day', 'category']
+    list_select_related = ['user', 'category']
+    search_fields = ['user__username']
+
+
+@admin.register(Exam)
+class ExamAdmin(admin.ModelAdmin):
+    list_display = ['quiz', 'group', 'starts_at', 'status', 'prepared_at']
+    list_filter = ['status', 'group']
+    list_select_related = ['quiz', 'group']
+    readonly_fields = ['status', 'prepared_at']
+    actions = ['prepare_decks', 'open_now', 'close_now']
+
+    @admin.action(description="Volver a preparar los mazos")
+    def prepare_decks(self, request, queryset):
+        decks = sum(exams.prepare(exam) for exam in queryset.select_related('quiz', 'group'))
+        self.message_user(request, f"{decks} mazos preparados")
+
+    @admin.action(description="Abrir ahora")
+    def open_now(self, request, queryset):
+        opened = sum(exams.open_exam(pk) for pk in queryset.values_list('pk', flat=True))
+        self.message_user(request, f"{opened} exámenes abiertos")
+
+    @admin.action(description="Cerrar")
+    def close_now(self, request, queryset):
+        closed = sum(exams.close_exam(pk) for pk in queryset.values_list('pk', flat=True))
+        self.message_user(request, f"{closed} exámenes cerrados")
+
+
+@admin.register(ExamDeck)
+class ExamDeckAdmin(admin.ModelAdmin):
+    list_display = ['exam', 'user', 'submitted_at', 'attempt']
+    list_filter = ['exam']
+    list_select_related = ['exam__quiz', 'exam__group', 'user', 'attempt']
+    search_fields = ['user__username']
+    readonly_fields = ['exam', 'user', 'question_ids', 'submitted_at', 'attempt']
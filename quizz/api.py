@@ -0,0 +1,125 @@
+"""API JSON para jugar un quiz en una sola página"""
+import json
+import time
+from functools import wraps
+
+from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+
+from . import quiz_state
+from .deck_pool import deck_pool
+from .decks import new_attempt_key, store_deck, load_deck, discard_deck
+from .quiz_state import QuizState
+
+
+def api_login_required(view):
+    """Como login_required, pero responde 401 en JSON en vez de redirigir"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Autenticación requerida'}, status=401)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+@api_login_required
+@require_POST
+def api_start_quiz(request):
+    """
+    Crear un intento y devolver el mazo completo (sin respuestas correctas).
+    Como en las vistas HTML, reemplaza el quiz en curso del usuario (409 si
+    es un examen, que solo termina al entregarlo).
+    """
+    if not quiz_state.clear(request.user.pk):
+        return JsonResponse({'error': 'Tienes un examen en curso'}, status=409)
+    deck = deck_pool.pop()
+    if not deck:
+        return JsonResponse({'error': 'No hay preguntas disponibles'}, status=404)
+
+    quiz_key = new_attempt_key()
+    store_deck(quiz_key, deck)
+    quiz_state.save(QuizState(quiz_key, request.user.pk, time.time(), [q.id for q in deck]))
+    return JsonResponse({
+        'quiz_key': quiz_key,
+        'total_questions': len(deck),
+        'questions': [question.to_public_dict() for question in deck],
+    })
+
+
+def _is_answer(item):
+    """{"question": int, "answer": int}; cualquier otra cosa invalida el lote"""
+    return isinstance(item, dict) and all(
+        type(item.get(field)) is int for field in ('question', 'answer')
+    )
+
+
+@api_login_required
+@require_POST
+def api_submit_answers(request, quiz_key):
+    """
+    Registrar respuestas en lote: {"answers": [{"question": id, "answer": id}], "finish": bool}.
+
+    La primera respuesta a cada pregunta es la que cuenta. Al responder todas
+    las preguntas (o con "finish") se califica y se guarda el intento. Las
+    respuestas se guardan en el estado del quiz (quiz_state), así que el
+    cliente debe enviar los lotes de un mismo quiz uno tras otro.
+    """
+    state = quiz_state.load(request.user.pk)
+    if state is None or state.quiz_key != quiz_key or state.exam_id:
+        return JsonResponse({'error': 'Quiz no encontrado o expirado'}, status=404)
+    deck = load_deck(quiz_key, state.question_ids)
+
+    try:
+        payload = json.loads(request.body or b'{}')
+        items = payload.get('answers', [])
+        finish = bool(payload.get('finish', False))
+        if not isinstance(items, list) or not all(map(_is_answer, items)):
+            raise ValueError
+    except (ValueError, AttributeError):
+        return JsonResponse({'error': 'JSON inválido'}, status=400)
+
+    questions = {question.id: question for question in deck}
+    answered_at = time.time()
+    accepted, rejected = 0, []
+    for item in items:
+        question = questions.get(item['question'])
+        answer = question.get_answer(item.get('answer')) if question else None
+        if answer is None:
+            rejected.append(item)
+        elif state.answer_question(question.id, answer.id, answer.is_correct, question.points_for(answer),
+                                   answered_at):
+            accepted += 1
+
+    if not finish and not state.finished:
+        if accepted:
+            quiz_state.save(state)
+        return JsonResponse({
+            'accepted': accepted,
+            'rejected': rejected,
+            'answered': state.current_index,
+            'total_questions': state.total_questions,
+            'finished': False,
+        })
+
+    # Solo una petición puede cerrar el intento
+    if not quiz_state.discard(request.user.pk):
+        return JsonResponse({'error': 'El quiz ya fue enviado'}, status=409)
+    try:
+        attempt, profile = state.complete(request.user)
+    except Exception:
+        quiz_state.save(state)
+        raise
+
+    discard_deck(quiz_key)
+    return JsonResponse({
+        'accepted': accepted,
+        'rejected': rejected,
+        'finished': True,
+        'attempt_id': attempt.pk,
+        'score': state.score,
+        'correct_answers': state.correct_answers,
+        'total_questions': state.total_questions,
+        'percentage': attempt.get_percentage(),
+        'total_points': profile.total_points,
+        'rank': profile.get_rank(),
+    })
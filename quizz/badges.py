@@ -0,0 +1,107 @@
+"""Motor de evaluación de insignias por umbrales"""
+import bisect
+
+from .indexes import VersionedIndex
+from .models import Badge, UserBadge, UserProfile
+
+# Métrica del perfil que desbloquea cada tipo de insignia ('special' se otorga a mano)
+BADGE_METRICS = {
+    'beginner': 'quizzes_played',
+    'intermediate': 'total_points',
+    'expert': 'total_points',
+    'master': 'total_points',
+}
+
+
+class BadgeEngine(VersionedIndex):
+    """
+    Umbrales de insignias cargados una vez por proceso, ordenados por métrica.
+
+    Se recargan cuando un Badge se crea, modifica o elimina.
+    """
+    version_key = 'quizz:badge_engine:version'
+    metrics_name = 'badge_thresholds'
+
+    def __init__(self):
+        super().__init__()
+        self._requirements = {}
+        self._badge_ids = {}
+
+    def _load(self):
+        thresholds = {}
+        rows = Badge.objects.filter(badge_type__in=BADGE_METRICS).values_list('id', 'badge_type', 'requirement')
+        for badge_id, badge_type, requirement in rows:
+            thresholds.setdefault(BADGE_METRICS[badge_type], []).append((requirement, badge_id))
+        self._requirements = {}
+        self._badge_ids = {}
+        for metric, items in thresholds.items():
+            items.sort()
+            self._requirements[metric] = [requirement for requirement, _ in items]
+            self._badge_ids[metric] = [badge_id for _, badge_id in items]
+
+    def crossed(self, **metrics):
+        """IDs de las insignias cuyo umbral alcanzan los valores dados"""
+        self._ensure_loaded()
+        badge_ids = set()
+        with self._lock:
+            for metric, value in metrics.items():
+                count = bisect.bisect_right(self._requirements.get(metric, []), value)
+                badge_ids.update(self._badge_ids.get(metric, [])[:count])
+        return badge_ids
+
+    def evaluate(self, user, profile):
+        """Otorgar al usuario las insignias nuevas; devuelve sus IDs"""
+        crossed = self.crossed(quizzes_played=profile.quizzes_played, total_points=profile.total_points)
+        if not crossed:
+            return set()
+        earned = set(UserBadge.objects.filter(user=user, badge_id__in=crossed).values_list('badge_id', flat=True))
+        new_ids = crossed - earned
+        if new_ids:
+            UserBadge.objects.bulk_create(
+                [UserBadge(user=user, badge_id=badge_id) for badge_id in new_ids],
+                ignore_conflicts=True,
+            )
+        return new_ids
+
+    def reevaluate_all(self, batch_size=1000):
+        """Reevaluar a todos los usuarios (p. ej. tras crear una insignia); devuelve las otorgadas"""
+        self._ensure_loaded()
+        awarded = 0
+        batch = []
+        profiles = UserProfile.objects.values_list('user_id', 'quizzes_played', 'total_points').order_by('user_id')
+        for row in profiles.iterator(chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                awarded += self._award_batch(batch)
+                batch = []
+        if batch:
+            awarded += self._award_batch(batch)
+        return awarded
+
+    def _award_batch(self, rows):
+        crossed = {
+            user_id: self.crossed(quizzes_played=played, total_points=points)
+            for user_id, played, points in rows
+        }
+        crossed = {user_id: badge_ids for user_id, badge_ids in crossed.items() if badge_ids}
+        if not crossed:
+            return 0
+        earned = set(
+            UserBadge.objects.filter(user_id__in=crossed).values_list('user_id', 'badge_id')
+        )
+        new_badges = [
+            UserBadge(user_id=user_id, badge_id=badge_id)
+            for user_id, badge_ids in crossed.items()
+            for badge_id in badge_ids
+            if (user_id, badge_id) not in earned
+        ]
+        UserBadge.objects.bulk_create(new_badges, ignore_conflicts=True)
+        return len(new_badges)
+
+
+badge_engine = BadgeEngine()
+
+
+def check_and_award_badges(user, profile):
+    """Verificar y otorgar badges según logros"""
+    return badge_engine.evaluate(user, profile)
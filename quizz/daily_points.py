@@ -0,0 +1,108 @@
+"""
+Puntos diarios por usuario y categoría (DailyPoints).
+
+Cada intento completado suma a la fila (usuario, día local, categoría
+jugada) dentro de la misma transacción. Cualquier ventana (7 días, 30 días, un
+trimestre) se responde sumando como mucho una fila por día y categoría, en
+lugar de recorrer QuizAttempt. `rebuild` las recalcula desde los intentos y
+`verify` las compara con ellos (comandos rebuild_daily_points y
+check_daily_points).
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .leaderboards import _local_day
+from .models import DailyPoints, QuizAttempt
+
+
+def window_start(days, today=None):
+    """Primer día de una ventana de `days` días que termina hoy (incluido)"""
+    return _local_day(today) - timezone.timedelta(days=days - 1)
+
+
+def add(user_id, points, category_id=None, when=None, quizzes=1):
+    """Sumar puntos a la fila del día sin leerla antes"""
+    day = _local_day(when)
+    rows = DailyPoints.objects.filter(user_id=user_id, day=day, category_id=category_id)
+    if rows.update(points=F('points') + points, quizzes=F('quizzes') + quizzes):
+        return
+    try:
+        with transaction.atomic():
+            DailyPoints.objects.create(
+                user_id=user_id, day=day, category_id=category_id,
+                points=points, quizzes=quizzes,
+            )
+    except IntegrityError:
+        # Otro proceso creó la fila entre el update y el insert
+        rows.update(points=F('points') + points, quizzes=F('quizzes') + quizzes)
+
+
+def record_attempt(attempt):
+    """Registrar un intento completado en su día y categoría"""
+    add(attempt.user_id, attempt.score, attempt.category_id, attempt.completed_at)
+
+
+def window_totals(user_id, days, category=None, today=None):
+    """Devolver (puntos, quizzes) del usuario en los últimos `days` días"""
+    rows = DailyPoints.objects.filter(user_id=user_id, day__gte=window_start(days, today))
+    if category is not None:
+        rows = rows.filter(category=category)
+    totals = rows.aggregate(points=Sum('points'), quizzes=Sum('quizzes'))
+    return totals['points'] or 0, totals['quizzes'] or 0
+
+
+def _attempt_totals(since=None):
+    """Totales por (usuario, día, categoría) calculados desde QuizAttempt"""
+    attempts = QuizAttempt.objects.all()
+    if since is not None:
+        attempts = attempts.filter(completed_at__date__gte=since)
+    return (
+        attempts
+        .annotate(day=TruncDate('completed_at'))
+        .values('user_id', 'day', 'category_id')
+        .annotate(points=Sum('score'), quizzes=Count('id'))
+        .order_by()
+    )
+
+
+@transaction.atomic
+def rebuild(batch_size=1000):
+    """Recalcular todas las filas desde los intentos; devuelve las filas creadas"""
+    DailyPoints.objects.all().delete()
+    rows = DailyPoints.objects.bulk_create(
+        [
+            DailyPoints(user_id=row['user_id'], day=row['day'], category_id=row['category_id'],
+                        points=row['points'], quizzes=row['quizzes'])
+            for row in _attempt_totals().iterator(chunk_size=batch_size)
+        ],
+        batch_size=batch_size,
+    )
+    return len(rows)
+
+
+def verify(since=None):
+    """
+    Comparar las filas con los intentos; devuelve una lista de
+    ((user_id, día, category_id), (puntos, quizzes) en buckets, (puntos, quizzes) en intentos).
+    """
+    expected = {
+        (row['user_id'], row['day'], row['category_id']): (row['points'], row['quizzes'])
+        for row in _attempt_totals(since)
+    }
+    stored = DailyPoints.objects.all()
+    if since is not None:
+        stored = stored.filter(day__gte=since)
+    actual = {
+        (user_id, day, category_id): (points, quizzes)
+        for user_id, day, category_id, points, quizzes
+        in stored.values_list('user_id', 'day', 'category_id', 'points', 'quizzes')
+        if points or quizzes
+    }
+    return sorted(
+        ((key, actual.get(key, (0, 0)), expected.get(key, (0, 0)))
+         for key in actual.keys() | expected.keys()
+         if actual.get(key) != expected.get(key)),
+        key=lambda mismatch: (mismatch[0][1], mismatch[0][0], mismatch[0][2] or 0),
+    )
@@ -0,0 +1,150 @@
+"""
+Reserva de mazos de preguntas ya construidos, por categoría y tamaño.
+
+Un hilo del proceso mantiene hasta QUIZZ_DECK_POOL_SIZE mazos listos por
+(categoría, tamaño), con None como mezcla de todas las categorías, y los
+repone cuando una reserva baja de la mitad o cada QUIZZ_DECK_POOL_INTERVAL
+segundos; start_quiz saca uno en O(1) y solo construye el mazo en la
+petición si la reserva está vacía.
+
+Los mazos se descartan cuando cambia alguna de sus preguntas: la reserva se
+suscribe a los cambios del pool de preguntas, que llegan también desde los
+demás procesos. QUIZZ_DECK_POOL_SIZE = 0 desactiva la reserva y el hilo.
+"""
+import logging
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.db import connections, DatabaseError
+
+from . import metrics
+from .decks import build_deck
+from .indexes import question_pool
+
+logger = logging.getLogger(__name__)
+
+DECK_SIZE = 20
+
+
+def _label(category_id):
+    return 'all' if category_id is None else str(category_id)
+
+
+class DeckPool:
+    """Mazos listos por categoría y tamaño, repuestos por un hilo en segundo plano"""
+
+    def __init__(self, deck_size=DECK_SIZE, background=True):
+        self.deck_size = deck_size
+        self.background = background
+        self._lock = threading.Lock()
+        # (category_id, tamaño) -> mazos listos
+        self._buckets = {(None, deck_size): deque()}
+        # Se incrementa con cada descarte; un mazo construido antes no se guarda
+        self._generation = 0
+        self._wake = threading.Event()
+        self._worker = None
+
+    @property
+    def size(self):
+        return getattr(settings, 'QUIZZ_DECK_POOL_SIZE', 10)
+
+    @property
+    def interval(self):
+        return getattr(settings, 'QUIZZ_DECK_POOL_INTERVAL', 5)
+
+    def pop(self, category_id=None, size=None):
+        """Sacar un mazo listo de la categoría o, si no hay, construirlo ahora"""
+        size = size or self.deck_size
+        question_pool.sync()
+        deck = None
+        with self._lock:
+            bucket = self._buckets.setdefault((category_id, size), deque())
+            if bucket:
+                deck = bucket.popleft()
+            low = len(bucket) < self.size // 2
+        metrics.inc('quizz_deck_pool_requests_total', category=_label(category_id),
+                    result='miss' if deck is None else 'hit')
+        if self.size > 0:
+            if low:
+                self._wake.set()
+            self._ensure_worker()
+        if deck is None:
+            deck = build_deck(question_pool.sample(size, category_id))
+        return deck
+
+    def refill(self):
+        """Completar todas las reservas; devuelve el número de mazos construidos"""
+        built = 0
+        with self._lock:
+            keys = list(self._buckets)
+        for key in keys:
+            category_id, size = key
+            while True:
+                with self._lock:
+                    missing = self.size - len(self._buckets[key])
+                    generation = self._generation
+                if missing <= 0:
+                    break
+                deck = tuple(build_deck(question_pool.sample(size, category_id)))
+                if not deck:
+                    break
+                with self._lock:
+                    if generation != self._generation:
+                        # Alguna pregunta cambió mientras se construía
+                        continue
+                    self._buckets[key].append(deck)
+                built += 1
+                metrics.inc('quizz_deck_pool_refills_total', category=_label(category_id))
+        return built
+
+    def discard_question(self, pk):
+        """
+        Descartar los mazos que contienen la pregunta (todos si pk es None) y
+        los incompletos: omitieron preguntas sin respuestas y esta puede ser una
+        """
+        with self._lock:
+            self._generation += 1
+            discarded = 0
+            for key, bucket in self._buckets.items():
+                size = key[1]
+                keep = deque(deck for deck in bucket
+                             if pk is not None and len(deck) == size and all(q.id != pk for q in deck))
+                discarded += len(bucket) - len(keep)
+                self._buckets[key] = keep
+        if discarded:
+            metrics.inc('quizz_deck_pool_discarded_total', discarded)
+            self._wake.set()
+        return discarded
+
+    def clear(self):
+        return self.discard_question(None)
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(bucket) for bucket in self._buckets.values())
+
+    def _ensure_worker(self):
+        if not self.background or (self._worker is not None and self._worker.is_alive()):
+            return
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(target=self._run, name='quizz-deck-pool', daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.refill()
+            except DatabaseError:
+                logger.warning("No se pudo reponer la reserva de mazos", exc_info=True)
+            finally:
+                # El hilo no debe retener conexiones entre reposiciones
+                connections.close_all()
+
+
+deck_pool = DeckPool()
+question_pool.subscribe(deck_pool.discard_question)
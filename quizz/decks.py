@@ -0,0 +1,103 @@
+"""Mazos de preguntas precargados para un intento de quiz"""
+import uuid
+from collections import namedtuple
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+
+from . import metrics
+from .models import Answer
+
+# Los mazos viven lo que dura un quiz razonable
+DECK_TIMEOUT = 60 * 60 * 2
+
+DeckAnswer = namedtuple('DeckAnswer', 'id answer_text is_correct')
+
+
+class DeckQuestion(namedtuple('DeckQuestion', 'id question_text points image answers')):
+    """Pregunta del mazo con sus respuestas (tuplas, sin modelos)"""
+    __slots__ = ()
+
+    @property
+    def image_url(self):
+        return default_storage.url(self.image) if self.image else ''
+
+    def get_answer(self, answer_id):
+        """Buscar una respuesta de esta pregunta por ID"""
+        try:
+            answer_id = int(answer_id)
+        except (TypeError, ValueError):
+            return None
+        for answer in self.answers:
+            if answer.id == answer_id:
+                return answer
+        return None
+
+    def points_for(self, answer):
+        """Regla de puntuación: los puntos de la pregunta si la respuesta es correcta"""
+        return self.points if answer.is_correct else 0
+
+    def to_public_dict(self):
+        """Pregunta para el cliente, sin indicar la respuesta correcta"""
+        return {
+            'id': self.id,
+            'text': self.question_text,
+            'points': self.points,
+            'image': self.image_url,
+            'answers': [{'id': answer.id, 'text': answer.answer_text} for answer in self.answers],
+        }
+
+
+def new_attempt_key():
+    """Generar la clave de un nuevo intento"""
+    return uuid.uuid4().hex
+
+
+def deck_cache_key(attempt_key):
+    return f'quizz:deck:{attempt_key}'
+
+
+def build_deck(question_ids):
+    """Cargar textos, puntos y respuestas de las preguntas en una sola consulta"""
+    rows = Answer.objects.filter(question_id__in=question_ids).values_list(
+        'question_id', 'question__question_text', 'question__points', 'question__image',
+        'id', 'answer_text', 'is_correct',
+    ).order_by('question_id', 'id')
+
+    questions = {}
+    for question_id, text, points, image, answer_id, answer_text, is_correct in rows:
+        if question_id not in questions:
+            questions[question_id] = (text, points, image or '', [])
+        questions[question_id][3].append(DeckAnswer(answer_id, answer_text, is_correct))
+
+    # Respetar el orden del muestreo; las preguntas sin respuestas no se pueden jugar
+    deck = []
+    for pk in question_ids:
+        if pk in questions:
+            text, points, image, answers = questions[pk]
+            deck.append(DeckQuestion(pk, text, points, image, tuple(answers)))
+    return deck
+
+
+def store_deck(attempt_key, deck):
+    cache.set(deck_cache_key(attempt_key), deck, DECK_TIMEOUT)
+
+
+def load_deck(attempt_key, question_ids=None):
+    """
+    Obtener el mazo del intento desde la caché.
+
+    Si la caché lo ha descartado y se conocen los IDs, se reconstruye.
+    """
+    deck = cache.get(deck_cache_key(attempt_key)) if attempt_key else None
+    metrics.inc('quizz_cache_requests_total', cache='deck', result='miss' if deck is None else 'hit')
+    if deck is None and question_ids:
+        deck = build_deck(question_ids)
+        if attempt_key:
+            store_deck(attempt_key, deck)
+    return deck
+
+
+def discard_deck(attempt_key):
+    if attempt_key:
+        cache.delete(deck_cache_key(attempt_key))
@@ -0,0 +1,327 @@
+"""
+Exámenes programados para toda una clase a la vez.
+
+Al programar un examen (`prepare`, que se lanza al crearlo) se sortean y
+guardan las preguntas de cada alumno del grupo (ExamDeck) y los mazos ya
+construidos se dejan en la caché. A la hora de inicio `open_exam` solo
+cambia el estado (comando open_exams). Cuando toda la clase pulsa "empezar"
+en el mismo segundo, cada petición hace dos lecturas de caché y ninguna
+consulta (salvo que la caché haya perdido el mazo: entonces se reconstruye
+desde ExamDeck).
+
+El alumno que empieza queda marcado en la caché (`begin`): mientras no
+entregue, empezar otra vez retoma el mismo intento y ni el quiz libre ni la
+API pueden descartarlo.
+
+Cada entrega se guarda en la propia petición en su fila de ExamDeck (un
+UPDATE por clave primaria, sin tocar filas compartidas). El intento, los
+contadores, las insignias y las clasificaciones los crea después un hilo
+del proceso de uno en uno, avisado por una cola acotada
+(QUIZZ_EXAM_QUEUE_SIZE), así la base de datos recibe un flujo constante de
+transacciones en lugar de doscientas a la vez. La cola no guarda nada que
+no esté ya en la tabla: si se llena o el proceso muere, las entregas
+pendientes las recoge el barrido que cada hilo hace cada
+QUIZZ_EXAM_SWEEP_SECONDS sin trabajo (o el comando process_exam_submissions).
+QUIZZ_EXAM_QUEUE_SIZE = 0 crea el intento en la propia petición.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction, DatabaseError
+from django.utils import timezone
+
+from . import metrics
+from .deck_pool import DECK_SIZE
+from .decks import DECK_TIMEOUT, build_deck
+from .indexes import question_pool
+from .models import Exam, ExamDeck
+from .quiz_state import QuizState
+
+logger = logging.getLogger(__name__)
+
+# Preguntas por consulta al construir los mazos de toda la clase
+BUILD_CHUNK = 500
+
+
+def exam_cache_key(exam_id):
+    return f'quizz:exam:{exam_id}'
+
+
+def exam_deck_key(exam_id, user_id):
+    return f'quizz:exam:{exam_id}:deck:{user_id}'
+
+
+def exam_submitted_key(exam_id, user_id):
+    return f'quizz:exam:{exam_id}:submitted:{user_id}'
+
+
+def exam_started_key(exam_id, user_id):
+    return f'quizz:exam:{exam_id}:started:{user_id}'
+
+
+# La marca de inicio dura más que el estado del quiz: un examen no se reinicia por dejarlo caducar
+STARTED_TIMEOUT = 60 * 60 * 24
+
+
+def status_timeout():
+    """Segundos que un proceso puede ver un estado antiguo del examen"""
+    return getattr(settings, 'QUIZZ_EXAM_STATUS_TIMEOUT', 5)
+
+
+def _deck_timeout(exam):
+    """Los mazos viven hasta la hora de inicio más lo que dura un quiz"""
+    until_start = (exam.starts_at - timezone.now()).total_seconds()
+    return max(0, int(until_start)) + DECK_TIMEOUT
+
+
+def _build_decks(question_ids_by_user):
+    """Construir los mazos de todos los alumnos consultando cada pregunta una sola vez"""
+    unique_ids = list({pk for ids in question_ids_by_user.values() for pk in ids})
+    questions = {}
+    for start in range(0, len(unique_ids), BUILD_CHUNK):
+        questions.update((q.id, q) for q in build_deck(unique_ids[start:start + BUILD_CHUNK]))
+    return {
+        user_id: tuple(questions[pk] for pk in ids if pk in questions)
+        for user_id, ids in question_ids_by_user.items()
+    }
+
+
+def prepare(exam):
+    """
+    Sortear, guardar y cachear el mazo de cada alumno del grupo. Se puede
+    repetir: solo rehace los mazos de quien aún no ha entregado.
+    Devuelve el número de mazos preparados.
+    """
+    size = exam.quiz.total_questions or DECK_SIZE
+    category_id = exam.quiz.category_id
+    with transaction.atomic():
+        ExamDeck.objects.filter(exam=exam, submitted_at__isnull=True).delete()
+        submitted = set(ExamDeck.objects.filter(exam=exam).values_list('user_id', flat=True))
+        user_ids = exam.group.user_set.exclude(pk__in=submitted).values_list('pk', flat=True)
+        question_ids = {user_id: question_pool.sample(size, category_id) for user_id in user_ids}
+        ExamDeck.objects.bulk_create(
+            [ExamDeck(exam=exam, user_id=user_id, question_ids=ids) for user_id, ids in question_ids.items()],
+            batch_size=500,
+        )
+        exam.prepared_at = timezone.now()
+        exam.save(update_fields=['prepared_at'])
+
+    decks = _build_decks(question_ids)
+    cache.set_many(
+        {exam_deck_key(exam.pk, user_id): deck for user_id, deck in decks.items()},
+        _deck_timeout(exam),
+    )
+    cache.delete(exam_cache_key(exam.pk))
+    return len(decks)
+
+
+def _set_status(exam_id, status, previous):
+    changed = Exam.objects.filter(pk=exam_id, status__in=previous).update(status=status)
+    cache.delete(exam_cache_key(exam_id))
+    return bool(changed)
+
+
+def open_exam(exam_id):
+    """Abrir el examen: un UPDATE del estado, los mazos ya están listos"""
+    return _set_status(exam_id, 'open', ['scheduled'])
+
+
+def close_exam(exam_id):
+    """Cerrar el examen: nadie más puede empezarlo (las entregas en curso se aceptan)"""
+    return _set_status(exam_id, 'closed', ['scheduled', 'open'])
+
+
+def open_due_exams(now=None):
+    """Abrir los exámenes programados cuya hora de inicio ya llegó; devuelve sus IDs"""
+    due = list(Exam.objects.filter(status='scheduled', starts_at__lte=now or timezone.now())
+               .values_list('pk', flat=True))
+    return [exam_id for exam_id in due if open_exam(exam_id)]
+
+
+def exam_header(exam_id):
+    """(quiz_id, categoría, estado) del examen, cacheado unos segundos; None si no existe"""
+    key = exam_cache_key(exam_id)
+    header = cache.get(key)
+    if header is None:
+        header = Exam.objects.filter(pk=exam_id).values_list('quiz_id', 'quiz__category_id', 'status').first()
+        if header is None:
+            return None
+        cache.set(key, header, status_timeout())
+    return header
+
+
+def load_deck(exam_id, user_id):
+    """Mazo preparado del alumno (None si no está inscrito o ya entregó)"""
+    deck_key, submitted_key = exam_deck_key(exam_id, user_id), exam_submitted_key(exam_id, user_id)
+    cached = cache.get_many([deck_key, submitted_key])
+    if submitted_key in cached:
+        return None
+    deck = cached.get(deck_key)
+    metrics.inc('quizz_cache_requests_total', cache='exam_deck', result='miss' if deck is None else 'hit')
+    if deck is None:
+        question_ids = (ExamDeck.objects.filter(exam_id=exam_id, user_id=user_id, submitted_at__isnull=True)
+                        .values_list('question_ids', flat=True).first())
+        if question_ids is None:
+            return None
+        deck = _build_decks({user_id: question_ids})[user_id]
+    return deck
+
+
+def begin(state):
+    """
+    Registrar que el alumno empezó el examen. Si ya lo había empezado devuelve
+    el estado con el que empezó (misma clave, mismas preguntas e inicio) en vez
+    del nuevo, así volver a empezar no da otro intento ni reinicia el reloj.
+    """
+    key = exam_started_key(state.exam_id, state.user_id)
+    if cache.add(key, state.encode(), STARTED_TIMEOUT):
+        return state
+    started = cache.get(key)
+    return QuizState.decode(started) if started is not None else state
+
+
+def process_submission(exam_id, user_id):
+    """
+    Crear el intento de una entrega guardada y enlazarlo en la misma
+    transacción; False si no hay entrega pendiente (otro proceso ya la hizo)
+    """
+    with transaction.atomic():
+        deck = (ExamDeck.objects.select_for_update().select_related('user')
+                .filter(exam_id=exam_id, user_id=user_id, submitted_at__isnull=False, attempt__isnull=True)
+                .first())
+        if deck is None:
+            return False
+        deck.attempt, _ = QuizState.decode(bytes(deck.submission)).complete(deck.user)
+        deck.save(update_fields=['attempt'])
+    return True
+
+
+def pending_submissions(older_than=0):
+    """(exam_id, user_id) de las entregas guardadas hace más de older_than segundos sin intento"""
+    before = timezone.now() - timezone.timedelta(seconds=older_than)
+    return list(ExamDeck.objects.filter(submitted_at__lte=before, attempt__isnull=True)
+                .order_by('submitted_at').values_list('exam_id', 'user_id'))
+
+
+class SubmissionQueue:
+    """Cola acotada que avisa al hilo de las entregas ya guardadas en ExamDeck"""
+
+    def __init__(self, background=True):
+        self.background = background
+        self._lock = threading.Lock()
+        self._queue = None
+        self._worker = None
+
+    @property
+    def maxsize(self):
+        return getattr(settings, 'QUIZZ_EXAM_QUEUE_SIZE', 500)
+
+    @property
+    def sweep_seconds(self):
+        return getattr(settings, 'QUIZZ_EXAM_SWEEP_SECONDS', 60)
+
+    def _get_queue(self):
+        with self._lock:
+            if self._queue is None:
+                self._queue = queue.Queue(self.maxsize)
+            if self.background and (self._worker is None or not self._worker.is_alive()):
+                self._worker = threading.Thread(target=self._run, name='quizz-exam-submissions', daemon=True)
+                self._worker.start()
+            return self._queue
+
+    def submit(self, user, state):
+        """
+        Guardar la entrega (un UPDATE) y encolar la creación del intento.
+        False si el alumno ya había entregado este examen.
+        """
+        saved = ExamDeck.objects.filter(
+            exam_id=state.exam_id, user=user, submitted_at__isnull=True,
+        ).update(submission=state.encode(), submitted_at=timezone.now())
+        # Que el alumno no pueda volver a empezar (la BD ya lo impide; la caché lo abarata)
+        cache.set(exam_submitted_key(state.exam_id, user.pk), True, DECK_TIMEOUT)
+        cache.delete_many([exam_deck_key(state.exam_id, user.pk), exam_started_key(state.exam_id, user.pk)])
+        if not saved:
+            return False
+        if self.maxsize > 0:
+            try:
+                self._get_queue().put_nowait((state.exam_id, user.pk, time.monotonic()))
+                metrics.inc('quizz_exam_submissions_total', result='queued')
+                return True
+            except queue.Full:
+                # Sigue guardada: la recogerá el barrido
+                metrics.inc('quizz_exam_submissions_total', result='deferred')
+                return True
+        metrics.inc('quizz_exam_submissions_total', result='direct')
+        process_submission(state.exam_id, user.pk)
+        return True
+
+    def _process(self, exam_id, user_id, queued_at=None):
+        try:
+            processed = process_submission(exam_id, user_id)
+        except Exception:
+            # La entrega sigue en ExamDeck: se reintentará en el próximo barrido
+            metrics.inc('quizz_exam_submissions_total', result='failed')
+            logger.exception("No se pudo crear el intento del examen %s de %s; queda pendiente", exam_id, user_id)
+            return False
+        if processed and queued_at is not None:
+            metrics.observe('quizz_exam_submission_delay_seconds', time.monotonic() - queued_at)
+        return processed
+
+    def sweep(self, older_than=0):
+        """Crear los intentos de las entregas pendientes de cualquier proceso; devuelve cuántos"""
+        processed = 0
+        for exam_id, user_id in pending_submissions(older_than):
+            if self._process(exam_id, user_id):
+                metrics.inc('quizz_exam_submissions_total', result='swept')
+                processed += 1
+        return processed
+
+    def _run(self):
+        while True:
+            try:
+                job = self._queue.get(timeout=self.sweep_seconds)
+            except queue.Empty:
+                # Sin trabajo: recoger lo que otro proceso dejó pendiente
+                try:
+                    self.sweep(older_than=self.sweep_seconds)
+                except DatabaseError:
+                    logger.warning("No se pudieron barrer las entregas de examen", exc_info=True)
+                finally:
+                    close_old_connections()
+                continue
+            try:
+                self._process(*job)
+            finally:
+                self._queue.task_done()
+                close_old_connections()
+
+    def join(self):
+        """Esperar a que el hilo procese todas las entregas encoladas"""
+        if self._queue is not None:
+            self._queue.join()
+
+    def drain(self):
+        """Procesar en este hilo las entregas encoladas; devuelve cuántas eran"""
+        drained = 0
+        while self._queue is not None:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                self._process(*job)
+            finally:
+                self._queue.task_done()
+            drained += 1
+        return drained
+
+
+submissions = SubmissionQueue()
+
+
+atexit.register(submissions.drain)
@@ -0,0 +1,151 @@
+"""
+Exportación en streaming de intentos y respuestas (CSV o JSONL).
+
+Las filas se leen por páginas con paginación por clave (`id > último id`),
+y cada página se recorre con `.iterator(chunk_size=...)` (cursor del lado del
+servidor en PostgreSQL). Nada se acumula en memoria: ni la consulta ni la
+salida, que se escribe fila a fila.
+"""
+import csv
+import json
+from datetime import datetime, time, timedelta
+
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import QuizAttempt, QuizResponse
+
+PAGE_SIZE = 5000
+CHUNK_SIZE = 1000
+
+# dataset -> (modelo, ruta hasta el intento, columnas: (cabecera, campo))
+DATASETS = {
+    'attempts': (QuizAttempt, '', [
+        ('attempt_id', 'id'),
+        ('username', 'user__username'),
+        ('quiz', 'quiz__title'),
+        ('category', 'category__name'),
+        ('score', 'score'),
+        ('correct_answers', 'correct_answers'),
+        ('total_questions', 'total_questions'),
+        ('completed_at', 'completed_at'),
+    ]),
+    'responses': (QuizResponse, 'attempt__', [
+        ('response_id', 'id'),
+        ('attempt_id', 'attempt_id'),
+        ('username', 'attempt__user__username'),
+        ('category', 'question__category__name'),
+        ('question_id', 'question_id'),
+        ('question', 'question__question_text'),
+        ('answer', 'selected_answer__answer_text'),
+        ('is_correct', 'is_correct'),
+        ('answered_at', 'answered_at'),
+    ]),
+}
+FORMATS = ('csv', 'jsonl')
+
+
+class ExportError(ValueError):
+    """Filtro o formato inválido"""
+
+
+def _day_start(value):
+    return timezone.make_aware(datetime.combine(value, time.min))
+
+
+def parse_day(value, name):
+    if not value:
+        return None
+    day = parse_date(value) if isinstance(value, str) else value
+    if day is None:
+        raise ExportError(f'Fecha inválida en {name}: {value!r} (formato AAAA-MM-DD)')
+    return day
+
+
+def build_queryset(dataset, date_from=None, date_to=None, category=None, group=None):
+    """Queryset filtrado; `date_to` es inclusivo, `category` es un id y `group` un nombre de grupo"""
+    if dataset not in DATASETS:
+        raise ExportError(f'Conjunto desconocido: {dataset!r}')
+    model, attempt, _ = DATASETS[dataset]
+    queryset = model.objects.all()
+    if date_from:
+        queryset = queryset.filter(**{f'{attempt}completed_at__gte': _day_start(date_from)})
+    if date_to:
+        queryset = queryset.filter(**{f'{attempt}completed_at__lt': _day_start(date_to + timedelta(days=1))})
+    if group:
+        queryset = queryset.filter(**{f'{attempt}user__groups__name': group})
+    if category:
+        # Los intentos, por la categoría jugada (aunque no tengan respuestas)
+        queryset = queryset.filter(**{'category_id' if dataset == 'attempts' else 'question__category_id': category})
+    return queryset
+
+
+def iter_rows(queryset, fields, page_size=PAGE_SIZE, chunk_size=CHUNK_SIZE):
+    """Tuplas de `fields` en orden de id, página a página por clave"""
+    rows = queryset.order_by('pk').values_list('pk', *fields)
+    last_pk = 0
+    while True:
+        count = 0
+        for row in rows.filter(pk__gt=last_pk)[:page_size].iterator(chunk_size=chunk_size):
+            last_pk = row[0]
+            count += 1
+            yield row[1:]
+        if count < page_size:
+            return
+
+
+class _Echo:
+    """Pseudo-archivo para csv.writer: devuelve la línea en vez de guardarla"""
+
+    def write(self, value):
+        return value
+
+
+def _text(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def stream(dataset, file_format='csv', **filters):
+    """Genera el export como líneas de texto"""
+    if file_format not in FORMATS:
+        raise ExportError(f'Formato desconocido: {file_format!r}')
+    queryset = build_queryset(dataset, **filters)
+    headers, fields = zip(*DATASETS[dataset][2])
+    rows = iter_rows(queryset, fields)
+    if file_format == 'csv':
+        writer = csv.writer(_Echo())
+        yield writer.writerow(headers)
+        for row in rows:
+            yield writer.writerow([_text(value) for value in row])
+    else:
+        for row in rows:
+            yield json.dumps(dict(zip(headers, map(_text, row))), ensure_ascii=False) + '\n'
+
+
+@staff_member_required
+def export_view(request, dataset):
+    """Descarga en streaming para el personal (?format=&from=&to=&category=&group=)"""
+    file_format = request.GET.get('format', 'csv')
+    try:
+        filters = {
+            'date_from': parse_day(request.GET.get('from'), 'from'),
+            'date_to': parse_day(request.GET.get('to'), 'to'),
+            'category': int(request.GET['category']) if request.GET.get('category') else None,
+            'group': request.GET.get('group') or None,
+        }
+        lines = stream(dataset, file_format, **filters)
+        # Validar antes de empezar a responder
+        first = next(lines, '')
+    except (ExportError, ValueError) as exc:
+        return HttpResponseBadRequest(str(exc))
+
+    def body():
+        yield first
+        yield from lines
+
+    content_type = 'text/csv' if file_format == 'csv' else 'application/x-ndjson'
+    response = StreamingHttpResponse(body(), content_type=f'{content_type}; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{dataset}.{file_format}"'
+    return response
@@ -0,0 +1,66 @@
+"""
+Clasificación de amigos (el usuario y las personas que sigue).
+
+Se calcula con una sola consulta: los perfiles del grupo, filtrados con una
+subconsulta sobre Friend, con sus puntos totales o los de la entrada de la
+semana o mes actual (LEFT JOIN a LeaderboardEntry). El resultado se guarda en
+la caché por usuario y periodo, y se invalida cuando alguien del grupo termina
+un quiz o cambia la lista de amigos del usuario.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, FilteredRelation, Q
+from django.db.models.functions import Coalesce
+
+from . import leaderboards, metrics
+from .models import Friend, UserProfile
+
+PERIODS = ('alltime',) + leaderboards.PERIODS
+
+
+def cache_timeout():
+    return getattr(settings, 'QUIZZ_FRIENDS_LEADERBOARD_TIMEOUT', 60 * 10)
+
+
+def cache_key(user_id, period):
+    return f'quizz:friends:{user_id}:{period}'
+
+
+def _query(user_id, period, when=None):
+    members = UserProfile.objects.filter(
+        Q(user_id=user_id) | Q(user_id__in=Friend.objects.filter(user_id=user_id).values('friend_id'))
+    ).select_related('user')
+    if period == 'alltime':
+        points = F('total_points')
+    else:
+        members = members.annotate(entry=FilteredRelation(
+            'user__leaderboard_entries',
+            condition=Q(user__leaderboard_entries__period=period,
+                        user__leaderboard_entries__bucket=leaderboards.bucket_start(period, when)),
+        ))
+        points = Coalesce('entry__points', 0)
+    return list(members.annotate(points=points).order_by('-points', 'user_id'))
+
+
+def leaderboard(user, period='alltime'):
+    """Perfiles del grupo de amigos ordenados por puntos (atributo `points`)"""
+    if period not in PERIODS:
+        raise ValueError(f"Periodo desconocido: {period}")
+    key = cache_key(user.pk, period)
+    profiles = cache.get(key)
+    metrics.inc('quizz_cache_requests_total', cache='friends', result='miss' if profiles is None else 'hit')
+    if profiles is None:
+        profiles = _query(user.pk, period)
+        cache.set(key, profiles, cache_timeout())
+    return profiles
+
+
+def invalidate(*user_ids):
+    """Descartar las clasificaciones en caché de estos usuarios"""
+    cache.delete_many([cache_key(user_id, period) for user_id in user_ids for period in PERIODS])
+
+
+def invalidate_followers(user_id):
+    """Descartar las clasificaciones en las que aparece el usuario (la suya y la de quien lo sigue)"""
+    followers = Friend.objects.filter(friend_id=user_id).values_list('user_id', flat=True)
+    invalidate(user_id, *followers)
@@ -0,0 +1,192 @@
+"""
+Importación masiva de bancos de preguntas desde CSV o JSONL.
+
+Las filas se leen en streaming y se procesan en lotes de tamaño fijo, cada uno
+en su propia transacción, así que la memoria no depende del tamaño del
+archivo. Los duplicados (misma categoría y mismo texto normalizado, ver
+`question_content_hash`) se descartan tanto dentro del lote como frente a la
+base de datos.
+
+Formato JSONL (el mismo que usa load_sample_data), una pregunta por línea:
+
+    {"category": "Historia", "text": "¿...?", "points": 10,
+     "answers": [{"text": "...", "correct": true}, {"text": "...", "correct": false}]}
+
+`correct` acepta true/false, 1/0 o sus versiones en texto ("sí", "no",
+"verdadero"...); cualquier otro valor invalida la fila.
+
+Formato CSV, con cabecera:
+
+    category,text,points,correct,answer1,answer2,answer3,answer4
+
+donde `correct` es la posición (desde 1) de la respuesta correcta.
+"""
+import csv
+import json
+from itertools import islice
+
+from django.db import transaction
+
+from .models import Category, Question, Answer, question_content_hash
+
+FORMATS = ('csv', 'jsonl')
+
+
+class ImportRowError(ValueError):
+    """Fila con datos incompletos o inválidos"""
+
+
+def detect_format(path):
+    return 'csv' if path.lower().endswith('.csv') else 'jsonl'
+
+
+TRUE_VALUES = {'true', '1', 'yes', 'y', 'sí', 'si', 's', 'verdadero', 'v'}
+FALSE_VALUES = {'false', '0', 'no', 'n', 'falso', 'f', ''}
+
+
+def _parse_correct(value):
+    """Marca de respuesta correcta: se interpreta el texto, porque bool('false') es True"""
+    if value is None or isinstance(value, bool):
+        return bool(value)
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        value = value.strip().casefold()
+        if value in TRUE_VALUES:
+            return True
+        if value in FALSE_VALUES:
+            return False
+    raise ImportRowError(f'valor de correct inválido: {value!r}')
+
+
+def _clean_answers(answers):
+    answers = [(str(text).strip(), _parse_correct(correct)) for text, correct in answers if str(text).strip()]
+    if len(answers) < 2:
+        raise ImportRowError('se necesitan al menos dos respuestas')
+    if not any(correct for _, correct in answers):
+        raise ImportRowError('ninguna respuesta está marcada como correcta')
+    max_length = Answer._meta.get_field('answer_text').max_length
+    if any(len(text) > max_length for text, _ in answers):
+        raise ImportRowError(f'respuesta de más de {max_length} caracteres')
+    return answers
+
+
+def _clean_row(category, text, points, answers):
+    category, text = (category or '').strip(), (text or '').strip()
+    if not category or not text:
+        raise ImportRowError('faltan la categoría o el texto')
+    try:
+        points = int(points) if points not in (None, '') else 10
+    except (TypeError, ValueError):
+        raise ImportRowError(f'puntos inválidos: {points!r}')
+    return {'category': category, 'text': text, 'points': points, 'answers': _clean_answers(answers)}
+
+
+def read_jsonl(fh):
+    """Genera (línea, fila) o (línea, ImportRowError)"""
+    for line_number, line in enumerate(fh, start=1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+            answers = [(answer.get('text', ''), answer.get('correct', False)) for answer in data.get('answers', [])]
+            yield line_number, _clean_row(
+                data.get('category'), data.get('text') or data.get('question'), data.get('points'), answers
+            )
+        except ImportRowError as exc:
+            yield line_number, exc
+        except (ValueError, AttributeError, TypeError) as exc:
+            yield line_number, ImportRowError(f'JSON inválido: {exc}')
+
+
+def read_csv(fh):
+    reader = csv.DictReader(fh)
+    answer_columns = [name for name in (reader.fieldnames or []) if name.startswith('answer')]
+    for row in reader:
+        line_number = reader.line_num
+        try:
+            correct = int(row.get('correct') or 0)
+        except ValueError:
+            yield line_number, ImportRowError(f'columna correct inválida: {row.get("correct")!r}')
+            continue
+        answers = [(row.get(column) or '', position == correct)
+                   for position, column in enumerate(answer_columns, start=1)]
+        try:
+            yield line_number, _clean_row(row.get('category'), row.get('text'), row.get('points'), answers)
+        except ImportRowError as exc:
+            yield line_number, exc
+
+
+READERS = {'csv': read_csv, 'jsonl': read_jsonl}
+
+
+class QuestionImporter:
+    """
+    Crea categorías, preguntas y respuestas con bulk_create en lotes de
+    `batch_size` filas. Las categorías se crean una a una (son pocas y así se
+    indexan para la búsqueda); las preguntas no emiten señales, por eso quien
+    llama debe invalidar el pool de preguntas al terminar.
+    """
+
+    def __init__(self, batch_size=500, on_error=None):
+        self.batch_size = batch_size
+        self.on_error = on_error
+        self.categories = {}
+        self.stats = {'rows': 0, 'created': 0, 'duplicates': 0, 'invalid': 0}
+
+    def run(self, rows):
+        """`rows` es un iterable de (línea, fila) como los de READERS; devuelve stats"""
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, self.batch_size))
+            if not chunk:
+                break
+            self.stats['rows'] += len(chunk)
+            valid = []
+            for line_number, row in chunk:
+                if isinstance(row, ImportRowError):
+                    self.stats['invalid'] += 1
+                    if self.on_error:
+                        self.on_error(line_number, row)
+                else:
+                    valid.append(row)
+            with transaction.atomic():
+                self._import_chunk(valid)
+        return self.stats
+
+    def _category_id(self, name):
+        key = name.casefold()
+        if key not in self.categories:
+            category = Category.objects.filter(name__iexact=name).first()
+            if category is None:
+                category = Category.objects.create(name=name)
+            self.categories[key] = category.pk
+        return self.categories[key]
+
+    def _import_chunk(self, rows):
+        pending = {}
+        for row in rows:
+            category_id = self._category_id(row['category'])
+            content_hash = question_content_hash(category_id, row['text'])
+            if content_hash in pending:
+                self.stats['duplicates'] += 1
+                continue
+            pending[content_hash] = (category_id, row)
+
+        existing = set(Question.objects.filter(content_hash__in=list(pending)).values_list('content_hash', flat=True))
+        self.stats['duplicates'] += len(existing)
+        new_rows = [(content_hash, category_id, row)
+                    for content_hash, (category_id, row) in pending.items() if content_hash not in existing]
+        if not new_rows:
+            return
+
+        questions = Question.objects.bulk_create([
+            Question(category_id=category_id, question_text=row['text'], points=row['points'], content_hash=content_hash)
+            for content_hash, category_id, row in new_rows
+        ])
+        Answer.objects.bulk_create([
+            Answer(question=question, answer_text=text, is_correct=correct)
+            for question, (_, _, row) in zip(questions, new_rows)
+            for text, correct in row['answers']
+        ])
+        self.stats['created'] += len(questions)
@@ -0,0 +1,384 @@
+"""Índices en memoria por proceso (pool de preguntas y ranking)"""
+import logging
+import os
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class VersionedIndex:
+    """
+    Índice local al proceso sincronizado con un contador de versión en la caché.
+
+    Cada proceso aplica sus propios cambios de forma incremental y los publica
+    en la caché bajo el número de versión siguiente; los demás procesos los
+    reproducen al leer, o recargan desde la base de datos si les falta alguno.
+    La caché debe ser compartida por los workers. Como incr no es atómico en
+    todos los backends (archivo, db) un cambio se puede perder: por eso cada
+    proceso recarga además cada QUIZZ_INDEX_RESYNC_SECONDS (0 lo desactiva).
+    """
+    version_key = None
+    metrics_name = None
+    # Cambios pendientes que se reproducen antes de preferir una recarga completa
+    max_replay = 500
+    change_timeout = 60 * 60
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._version = None
+        self._loaded_at = 0.0
+
+    @property
+    def resync_seconds(self):
+        return getattr(settings, 'QUIZZ_INDEX_RESYNC_SECONDS', 300)
+
+    def _expired(self):
+        resync = self.resync_seconds
+        return bool(resync) and time.monotonic() - self._loaded_at >= resync
+
+    def _change_key(self, version):
+        return f'{self.version_key}:{version}'
+
+    def _current_version(self):
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, 0, None)
+            version = cache.get(self.version_key, 0)
+        return version
+
+    def _bump_version(self):
+        try:
+            return cache.incr(self.version_key)
+        except ValueError:
+            cache.add(self.version_key, 0, None)
+            return cache.incr(self.version_key)
+
+    def _ensure_loaded(self):
+        version = self._current_version()
+        if self._loaded and version == self._version and not self._expired():
+            metrics.inc('quizz_cache_requests_total', cache=self.metrics_name, result='hit')
+            return
+        with self._lock:
+            version = self._current_version()
+            expired = self._expired()
+            if self._loaded and version == self._version and not expired:
+                metrics.inc('quizz_cache_requests_total', cache=self.metrics_name, result='hit')
+                return
+            if not expired and self._replay(version):
+                result = 'replay'
+            else:
+                self._load()
+                self._loaded_at = time.monotonic()
+                result = 'miss'
+            metrics.inc('quizz_cache_requests_total', cache=self.metrics_name, result=result)
+            self._loaded = True
+            self._version = version
+            self._report()
+
+    def _replay(self, version):
+        """Aplicar los cambios publicados por otros procesos; False si hay que recargar"""
+        if not self._loaded or self._version is None:
+            return False
+        pending = version - self._version
+        if pending <= 0 or pending > self.max_replay:
+            return False
+        keys = [self._change_key(v) for v in range(self._version + 1, version + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) != len(keys):
+            return False
+        for key in keys:
+            self._apply(*changes[key])
+        return True
+
+    def _publish(self, *change):
+        """Aplicar un cambio localmente y publicarlo para los demás procesos"""
+        with self._lock:
+            if self._loaded:
+                self._apply(*change)
+            version = self._bump_version()
+            cache.set(self._change_key(version), change, self.change_timeout)
+            if self._loaded and self._version == version - 1:
+                self._version = version
+            if self._loaded:
+                self._report()
+
+    def sync(self):
+        """Aplicar los cambios publicados por otros procesos (o recargar)"""
+        self._ensure_loaded()
+
+    def invalidate(self):
+        """Forzar la recarga en todos los procesos (p. ej. tras un bulk_create)"""
+        with self._lock:
+            self._loaded = False
+        self._bump_version()
+
+    def _load(self):
+        raise NotImplementedError
+
+    def _apply(self, *change):
+        raise NotImplementedError
+
+    def _report(self):
+        """Publicar el estado del índice de este proceso en las métricas (opcional)"""
+
+
+class _IdBucket:
+    """Lista de IDs con borrado O(1) (swap-remove) y muestreo O(k)"""
+
+    def __init__(self):
+        self.ids = []
+        self.positions = {}
+
+    def add(self, pk):
+        if pk not in self.positions:
+            self.positions[pk] = len(self.ids)
+            self.ids.append(pk)
+
+    def discard(self, pk):
+        index = self.positions.pop(pk, None)
+        if index is None:
+            return
+        last = self.ids.pop()
+        if last != pk:
+            self.ids[index] = last
+            self.positions[last] = index
+
+    def sample(self, k):
+        if k >= len(self.ids):
+            ids = list(self.ids)
+            random.shuffle(ids)
+            return ids
+        return random.sample(self.ids, k)
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class QuestionPool(VersionedIndex):
+    """Pool de IDs de preguntas activas, agrupados por categoría"""
+    version_key = 'quizz:question_pool:version'
+    metrics_name = 'question_pool'
+
+    def __init__(self):
+        super().__init__()
+        self._all = _IdBucket()
+        self._by_category = {}
+        self._category_of = {}
+        self._listeners = []
+
+    def subscribe(self, callback):
+        """
+        Llamar a callback(pk) cada vez que se aplica el cambio de una pregunta
+        (local o de otro proceso), o callback(None) si se recarga todo el pool
+        """
+        self._listeners.append(callback)
+
+    def _notify(self, pk):
+        for callback in self._listeners:
+            callback(pk)
+
+    def _load(self):
+        from .models import Question
+
+        self._all = _IdBucket()
+        self._by_category = {}
+        self._category_of = {}
+        rows = Question.objects.filter(is_active=True).values_list('id', 'category_id').order_by()
+        for pk, category_id in rows.iterator(chunk_size=10000):
+            self._insert(pk, category_id)
+        self._notify(None)
+
+    def _insert(self, pk, category_id):
+        self._all.add(pk)
+        self._by_category.setdefault(category_id, _IdBucket()).add(pk)
+        self._category_of[pk] = category_id
+
+    def _remove(self, pk):
+        category_id = self._category_of.pop(pk, None)
+        self._all.discard(pk)
+        bucket = self._by_category.get(category_id)
+        if bucket is not None:
+            bucket.discard(pk)
+
+    def sample(self, k, category_id=None):
+        """Devolver hasta k IDs de preguntas activas al azar, sin repetir"""
+        self._ensure_loaded()
+        with self._lock:
+            if category_id is None:
+                return self._all.sample(k)
+            bucket = self._by_category.get(category_id)
+            return bucket.sample(k) if bucket else []
+
+    def count(self, category_id=None):
+        """Número de preguntas activas en el pool"""
+        self._ensure_loaded()
+        if category_id is None:
+            return len(self._all)
+        return len(self._by_category.get(category_id, ()))
+
+    def _apply(self, pk, category_id=None, is_active=False):
+        self._remove(pk)
+        if is_active:
+            self._insert(pk, category_id)
+        self._notify(pk)
+
+    def refresh_question(self, pk, category_id, is_active):
+        """Aplicar el alta, baja o cambio de una pregunta"""
+        self._publish(pk, category_id, is_active)
+
+    def remove_question(self, pk):
+        """Quitar una pregunta eliminada"""
+        self._publish(pk)
+
+
+class _Fenwick:
+    """Árbol de Fenwick de conteos sobre los valores 0..size-1"""
+
+    def __init__(self, counts):
+        self.size = len(counts)
+        tree = [0] + list(counts)
+        for i in range(1, self.size + 1):
+            parent = i + (i & -i)
+            if parent <= self.size:
+                tree[parent] += tree[i]
+        self.tree = tree
+
+    def add(self, value, delta):
+        i = value + 1
+        while i <= self.size:
+            self.tree[i] += delta
+            i += i & -i
+
+    def prefix(self, value):
+        """Cantidad de elementos con valor <= value"""
+        i = min(value + 1, self.size)
+        total = 0
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+
+class RankIndex(VersionedIndex):
+    """
+    Ranking por total_points con consultas O(log n).
+
+    Guarda los puntos de cada usuario y un árbol de Fenwick indexado por
+    puntos; el tamaño del árbol se duplica cuando alguien supera el máximo.
+    Cada proceso publica su versión, usuarios y suma de puntos como gauges
+    para que check_rank_index compare los índices de los workers con la BD.
+    """
+    version_key = 'quizz:rank_index:version'
+    metrics_name = 'rank_index'
+    min_size = 1024
+
+    def __init__(self):
+        super().__init__()
+        self._points = {}
+        self._total = 0
+        self._tree = _Fenwick([0] * self.min_size)
+
+    def _load(self):
+        from .models import UserProfile
+
+        rows = UserProfile.objects.values_list('user_id', 'total_points').order_by()
+        self._points = dict(rows.iterator(chunk_size=10000))
+        self._total = sum(self._points.values())
+        self._rebuild_tree()
+
+    def _report(self):
+        pid = os.getpid()
+        metrics.set_gauge('quizz_rank_index_version', self._version or 0, pid=pid)
+        metrics.set_gauge('quizz_rank_index_users', len(self._points), pid=pid)
+        metrics.set_gauge('quizz_rank_index_points', self._total, pid=pid)
+
+    def _rebuild_tree(self):
+        highest = max(self._points.values(), default=0)
+        size = self.min_size
+        while size <= highest:
+            size *= 2
+        counts = [0] * size
+        for points in self._points.values():
+            counts[self._slot(points)] += 1
+        self._tree = _Fenwick(counts)
+
+    @staticmethod
+    def _slot(points):
+        # Los puntos nunca bajan de 0; un valor negativo cuenta como 0
+        return max(points, 0)
+
+    def _apply(self, user_id, points=None):
+        old = self._points.pop(user_id, None)
+        if old is not None:
+            self._tree.add(self._slot(old), -1)
+            self._total -= old
+        if points is None:
+            return
+        self._points[user_id] = points
+        self._total += points
+        if self._slot(points) >= self._tree.size:
+            self._rebuild_tree()
+        else:
+            self._tree.add(self._slot(points), 1)
+
+    def rank(self, points):
+        """Puesto para un total de puntos: usuarios con más puntos + 1"""
+        self._ensure_loaded()
+        with self._lock:
+            if points < 0:
+                return len(self._points) + 1
+            return len(self._points) - self._tree.prefix(points) + 1
+
+    def record(self, user_id, points):
+        """Registrar el total de puntos confirmado de un usuario"""
+        with self._lock:
+            unchanged = self._loaded and self._points.get(user_id) == points
+            if unchanged and self._version == self._current_version():
+                return
+            self._publish(user_id, points)
+
+    def remove(self, user_id):
+        """Quitar a un usuario eliminado"""
+        self._publish(user_id)
+
+    def verify(self, limit=None):
+        """
+        Comparar los puestos del índice de este proceso con el conteo SQL de
+        UserProfile (comprueba el árbol; para los workers, check_rank_index).
+
+        Devuelve la lista de (puntos, puesto_índice, puesto_sql) que no coinciden.
+        """
+        from .models import UserProfile
+
+        values = UserProfile.objects.values_list('total_points', flat=True).distinct().order_by('-total_points')
+        if limit:
+            values = values[:limit]
+        mismatches = []
+        for points in values:
+            expected = UserProfile.objects.filter(total_points__gt=points).count() + 1
+            actual = self.rank(points)
+            if actual != expected:
+                mismatches.append((points, actual, expected))
+        return mismatches
+
+
+question_pool = QuestionPool()
+rank_index = RankIndex()
+
+
+def warm_up():
+    """Cargar los índices al arrancar el proceso (si la base de datos está lista)"""
+    for index in (question_pool, rank_index):
+        try:
+            index._ensure_loaded()
+        except DatabaseError:
+            logger.warning("No se pudo precargar %s", type(index).__name__, exc_info=True)
@@ -0,0 +1,155 @@
+"""
+Clasificaciones semanales y mensuales materializadas.
+
+Los periodos son de calendario en hora local: la semana va de lunes a
+domingo y el mes empieza el día 1 (antes la pestaña semanal sumaba los
+últimos 7 días). `UserProfile.get_weekly_points` lee el mismo periodo;
+las ventanas móviles ("últimos 7 días") del perfil salen de DailyPoints.
+
+Los periodos antiguos se purgan al escribir la primera fila de un periodo
+nuevo; `refresh_leaderboards` sigue disponible para purgar o reconstruir
+a mano.
+"""
+from datetime import datetime
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum, Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import LeaderboardEntry, QuizAttempt
+
+PERIODS = ('weekly', 'monthly')
+
+# Cuántos periodos se conservan antes de purgarlos
+KEEP_BUCKETS = {'weekly': 8, 'monthly': 12}
+
+# Último periodo purgado en este proceso, para purgar una vez por periodo
+_pruned_buckets = {}
+
+
+def _local_day(when):
+    if when is None:
+        return timezone.localdate()
+    if isinstance(when, datetime):
+        return timezone.localdate(when)
+    return when
+
+
+def bucket_start(period, when=None):
+    """Fecha de inicio (local) de la semana o mes que contiene `when`"""
+    day = _local_day(when)
+    if period == 'weekly':
+        return day - timezone.timedelta(days=day.weekday())
+    if period == 'monthly':
+        return day.replace(day=1)
+    raise ValueError(f"Periodo desconocido: {period}")
+
+
+def _previous_bucket(period, bucket, steps):
+    """Inicio del periodo `steps` periodos antes de `bucket`"""
+    if period == 'weekly':
+        return bucket - timezone.timedelta(weeks=steps)
+    month_index = bucket.year * 12 + (bucket.month - 1) - steps
+    return bucket.replace(year=month_index // 12, month=month_index % 12 + 1)
+
+
+def add_points(user_id, points, when=None, quizzes=1):
+    """Sumar puntos a las entradas del usuario en todos los periodos"""
+    created = False
+    for period in PERIODS:
+        bucket = bucket_start(period, when)
+        entries = LeaderboardEntry.objects.filter(period=period, bucket=bucket, user_id=user_id)
+        if entries.update(points=F('points') + points, quizzes=F('quizzes') + quizzes):
+            continue
+        try:
+            with transaction.atomic():
+                LeaderboardEntry.objects.create(
+                    period=period, bucket=bucket, user_id=user_id,
+                    points=points, quizzes=quizzes,
+                )
+            created = True
+        except IntegrityError:
+            # Otro proceso creó la fila entre el update y el insert
+            entries.update(points=F('points') + points, quizzes=F('quizzes') + quizzes)
+    if created:
+        _prune_new_buckets()
+
+
+def _prune_new_buckets():
+    """Purgar los periodos antiguos la primera vez que se escribe en uno nuevo"""
+    current = {period: bucket_start(period) for period in PERIODS}
+    if _pruned_buckets == current:
+        return
+
+    def purge():
+        prune()
+        _pruned_buckets.update(current)
+    transaction.on_commit(purge)
+
+
+def record_attempt(attempt):
+    """Registrar un intento completado en las clasificaciones"""
+    add_points(attempt.user_id, attempt.score, attempt.completed_at)
+
+
+def top(period, limit=10, when=None):
+    """Mejores `limit` entradas del periodo actual"""
+    return (
+        LeaderboardEntry.objects
+        .filter(period=period, bucket=bucket_start(period, when), points__gt=0)
+        .select_related('user', 'user__profile')
+        .order_by('-points', 'user_id')[:limit]
+    )
+
+
+def standing(period, user, when=None):
+    """Devolver (puntos, puesto) del usuario en el periodo actual"""
+    bucket = bucket_start(period, when)
+    entries = LeaderboardEntry.objects.filter(period=period, bucket=bucket)
+    points = entries.filter(user=user).values_list('points', flat=True).first() or 0
+    rank = entries.filter(points__gt=points).count() + 1
+    return points, rank
+
+
+def prune(when=None):
+    """Eliminar los periodos antiguos; devuelve el número de filas borradas"""
+    deleted = 0
+    for period in PERIODS:
+        oldest = _previous_bucket(period, bucket_start(period, when), KEEP_BUCKETS[period] - 1)
+        deleted += LeaderboardEntry.objects.filter(period=period, bucket__lt=oldest).delete()[0]
+    return deleted
+
+
+@transaction.atomic
+def rebuild(when=None):
+    """Recalcular los periodos conservados a partir de los intentos"""
+    LeaderboardEntry.objects.all().delete()
+    oldest = min(
+        _previous_bucket(period, bucket_start(period, when), KEEP_BUCKETS[period] - 1)
+        for period in PERIODS
+    )
+    daily = (
+        QuizAttempt.objects
+        .filter(completed_at__date__gte=oldest)
+        .annotate(day=TruncDate('completed_at'))
+        .values('user_id', 'day')
+        .annotate(points=Sum('score'), quizzes=Count('id'))
+        .order_by()
+    )
+    totals = {}
+    for row in daily:
+        for period in PERIODS:
+            key = (period, bucket_start(period, row['day']), row['user_id'])
+            points, quizzes = totals.get(key, (0, 0))
+            totals[key] = (points + row['points'], quizzes + row['quizzes'])
+    LeaderboardEntry.objects.bulk_create(
+        [
+            LeaderboardEntry(period=period, bucket=bucket, user_id=user_id, points=points, quizzes=quizzes)
+            for (period, bucket, user_id), (points, quizzes) in totals.items()
+        ],
+        batch_size=1000,
+    )
+    prune(when)
+    return len(totals)
+
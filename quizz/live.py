@@ -0,0 +1,394 @@
+"""
+Salas de quiz en vivo sobre ASGI.
+
+El docente controla la sala y todos los alumnos reciben la misma pregunta a
+la vez por Server-Sent Events. Las respuestas se cuentan en memoria y se
+vuelcan a la base de datos cada QUIZZ_LIVE_FLUSH_SECONDS segundos; al
+terminar, cada alumno recibe su QuizAttempt.
+
+El estado de las salas vive en el proceso: se asume un único nodo ASGI. La
+difusión pasa por una capa de canales configurable (QUIZZ_LIVE_CHANNEL_LAYER).
+"""
+import asyncio
+import json
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone as dt_timezone
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.http import JsonResponse, StreamingHttpResponse, HttpResponseForbidden, Http404
+from django.shortcuts import render
+from django.utils.module_loading import import_string
+
+from . import search
+from .decks import build_deck
+from .indexes import question_pool
+from .models import Quiz, LiveAnswerTally
+from .services import complete_quiz
+
+HEARTBEAT_SECONDS = 15
+
+
+class BaseChannelLayer:
+    """Interfaz de difusión: publicar en un grupo y suscribirse a él"""
+
+    async def publish(self, group, message):
+        raise NotImplementedError
+
+    async def subscribe(self, group):
+        """Devolver una suscripción con un método async get()"""
+        raise NotImplementedError
+
+    async def unsubscribe(self, group, subscription):
+        raise NotImplementedError
+
+
+class InMemoryChannelLayer(BaseChannelLayer):
+    """Capa de canales en memoria, para un solo nodo y para tests"""
+
+    def __init__(self, capacity=100):
+        self.capacity = capacity
+        self._groups = defaultdict(set)
+
+    async def publish(self, group, message):
+        for queue in list(self._groups.get(group, ())):
+            if queue.full():
+                # Un cliente lento pierde el mensaje más antiguo, no bloquea a los demás
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    async def subscribe(self, group):
+        queue = asyncio.Queue(self.capacity)
+        self._groups[group].add(queue)
+        return queue
+
+    async def unsubscribe(self, group, subscription):
+        queues = self._groups.get(group)
+        if queues is not None:
+            queues.discard(subscription)
+            if not queues:
+                del self._groups[group]
+
+
+_channel_layer = None
+
+
+def get_channel_layer():
+    global _channel_layer
+    if _channel_layer is None:
+        path = getattr(settings, 'QUIZZ_LIVE_CHANNEL_LAYER', 'quizz.live.InMemoryChannelLayer')
+        _channel_layer = import_string(path)()
+    return _channel_layer
+
+
+def room_group(quiz_id):
+    return f'live-quiz-{quiz_id}'
+
+
+class LiveRoom:
+    """Estado en memoria de una sala: pregunta actual, conteos y puntajes"""
+
+    def __init__(self, quiz_id, deck, category_id=None):
+        self.quiz_id = quiz_id
+        self.category_id = category_id
+        self.deck = deck
+        self.index = -1
+        self.started_at = None
+        self.counts = defaultdict(Counter)
+        self.pending = Counter()
+        self.answered = set()
+        self.scores = defaultdict(lambda: [0, 0])
+        self.responses = defaultdict(list)
+        # Serializa las acciones del docente (start/next/finish)
+        self.lock = asyncio.Lock()
+
+    @property
+    def current(self):
+        if 0 <= self.index < len(self.deck):
+            return self.deck[self.index]
+        return None
+
+    def advance(self):
+        """Pasar a la siguiente pregunta; False si ya no quedan"""
+        self.index += 1
+        if self.started_at is None:
+            self.started_at = time.time()
+        self.answered = set()
+        return self.current is not None
+
+    def answer(self, user_id, answer_id):
+        """Registrar la primera respuesta del alumno a la pregunta actual"""
+        question = self.current
+        answer = question.get_answer(answer_id) if question else None
+        if answer is None or user_id in self.answered:
+            return False
+        self.answered.add(user_id)
+        self.counts[question.id][answer.id] += 1
+        self.pending[(question.id, answer.id)] += 1
+        score = self.scores[user_id]
+        score[0] += question.points_for(answer)
+        score[1] += answer.is_correct
+        self.responses[user_id].append((question.id, answer.id, answer.is_correct, time.time()))
+        return True
+
+    def take_pending(self):
+        pending, self.pending = self.pending, Counter()
+        return pending
+
+    def question_event(self):
+        return {
+            'event': 'question',
+            'data': {
+                'index': self.index + 1,
+                'total_questions': len(self.deck),
+                'question': self.current.to_public_dict(),
+            },
+        }
+
+    def results_event(self):
+        question = self.current
+        counts = self.counts[question.id]
+        return {
+            'event': 'results',
+            'data': {
+                'question': question.id,
+                'correct': [answer.id for answer in question.answers if answer.is_correct],
+                'counts': {str(answer.id): counts[answer.id] for answer in question.answers},
+            },
+        }
+
+
+def flush_tallies(quiz_id, pending):
+    """Sumar a la base de datos los conteos acumulados desde el último volcado"""
+    with transaction.atomic():
+        for (question_id, answer_id), delta in pending.items():
+            tallies = LiveAnswerTally.objects.filter(quiz_id=quiz_id, question_id=question_id, answer_id=answer_id)
+            if not tallies.update(count=F('count') + delta):
+                LiveAnswerTally.objects.create(
+                    quiz_id=quiz_id, question_id=question_id, answer_id=answer_id, count=delta,
+                )
+
+
+def set_live(quiz_id, is_live):
+    """Marcar el quiz en vivo (o no) y actualizar su documento de búsqueda"""
+    with transaction.atomic():
+        Quiz.objects.filter(pk=quiz_id).update(is_live=is_live)
+        search.reindex('quiz', quiz_id)
+
+
+@transaction.atomic
+def persist_room(room, pending=()):
+    """
+    Guardar los conteos pendientes y un QuizAttempt por alumno al cerrar la
+    sala, todo o nada; devuelve {user_id: username}. Los alumnos cuya cuenta
+    se borró mientras la sala estaba abierta se omiten.
+    """
+    if pending:
+        flush_tallies(room.quiz_id, pending)
+    users = User.objects.in_bulk(list(room.scores))
+    started_at = datetime.fromtimestamp(room.started_at, tz=dt_timezone.utc) if room.started_at else None
+    for user_id, (score, correct_answers) in room.scores.items():
+        if user_id not in users:
+            continue
+        responses = [
+            (question_id, answer_id, is_correct, datetime.fromtimestamp(answered_at, tz=dt_timezone.utc))
+            for question_id, answer_id, is_correct, answered_at in room.responses[user_id]
+        ]
+        complete_quiz(users[user_id], score, correct_answers, len(room.deck), responses, started_at,
+                      quiz_id=room.quiz_id, category_id=room.category_id)
+    set_live(room.quiz_id, False)
+    return {user_id: user.username for user_id, user in users.items()}
+
+
+class LiveRooms:
+    """Registro de salas del proceso y tarea de volcado periódico"""
+
+    def __init__(self):
+        self.rooms = {}
+        self._flush_task = None
+
+    @property
+    def flush_seconds(self):
+        return getattr(settings, 'QUIZZ_LIVE_FLUSH_SECONDS', 5)
+
+    def _ensure_flusher(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while self.rooms:
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
+
+    async def flush(self):
+        for room in list(self.rooms.values()):
+            pending = room.take_pending()
+            if pending:
+                await sync_to_async(flush_tallies)(room.quiz_id, pending)
+
+    async def open(self, quiz):
+        question_ids = await sync_to_async(question_pool.sample)(quiz.total_questions, quiz.category_id)
+        deck = await sync_to_async(build_deck)(question_ids)
+        if quiz.pk in self.rooms:
+            # Otro "start" abrió la sala mientras se armaba este mazo
+            return self.rooms[quiz.pk]
+        room = LiveRoom(quiz.pk, deck, quiz.category_id)
+        self.rooms[quiz.pk] = room
+        self._ensure_flusher()
+        await sync_to_async(set_live)(quiz.pk, True)
+        return room
+
+    async def close(self, quiz_id):
+        """
+        Cerrar la sala: volcar conteos y guardar intentos; devuelve {user_id: username}.
+        Si falla el guardado la sala sigue abierta con sus conteos, para reintentar.
+        """
+        room = self.rooms.get(quiz_id)
+        if room is None:
+            return {}
+        pending = room.take_pending()
+        try:
+            usernames = await sync_to_async(persist_room)(room, pending)
+        except Exception:
+            room.pending.update(pending)
+            raise
+        self.rooms.pop(quiz_id, None)
+        return usernames
+
+
+live_rooms = LiveRooms()
+
+
+def _sse(message):
+    return f"event: {message['event']}\ndata: {json.dumps(message['data'])}\n\n"
+
+
+async def _get_quiz(quiz_id):
+    try:
+        return await Quiz.objects.aget(pk=quiz_id)
+    except Quiz.DoesNotExist:
+        raise Http404("Quiz no encontrado")
+
+
+async def live_room(request, quiz_id):
+    """Página de la sala (alumnos y docente)"""
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Autenticación requerida'}, status=401)
+    quiz = await _get_quiz(quiz_id)
+    context = {
+        'quiz': quiz,
+        'is_host': quiz.created_by_id == user.pk or user.is_staff,
+    }
+    return await sync_to_async(render)(request, 'quizz/live_room.html', context)
+
+
+async def live_events(request, quiz_id):
+    """Flujo SSE de la sala: preguntas, resultados y cierre"""
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Autenticación requerida'}, status=401)
+    layer = get_channel_layer()
+    group = room_group(quiz_id)
+
+    async def stream():
+        subscription = await layer.subscribe(group)
+        try:
+            room = live_rooms.rooms.get(quiz_id)
+            if room is not None and room.current is not None:
+                yield _sse(room.question_event())
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscription.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ': heartbeat\n\n'
+                    continue
+                yield _sse(message)
+                if message['event'] == 'finished':
+                    break
+        finally:
+            await layer.unsubscribe(group, subscription)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def live_answer(request, quiz_id):
+    """Registrar la respuesta de un alumno a la pregunta actual (sin escribir en BD)"""
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Autenticación requerida'}, status=401)
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+    room = live_rooms.rooms.get(quiz_id)
+    if room is None or room.current is None:
+        return JsonResponse({'error': 'La sala no está activa'}, status=409)
+    accepted = room.answer(user.pk, request.POST.get('answer'))
+    return JsonResponse({'accepted': accepted, 'question': room.current.id})
+
+
+async def live_control(request, quiz_id):
+    """Acciones del docente: start, next, finish"""
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse({'error': 'Autenticación requerida'}, status=401)
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Método no permitido'}, status=405)
+    quiz = await _get_quiz(quiz_id)
+    if quiz.created_by_id != user.pk and not user.is_staff:
+        return HttpResponseForbidden()
+
+    action = request.POST.get('action')
+    room = live_rooms.rooms.get(quiz_id)
+    if action == 'start' and room is None:
+        room = await live_rooms.open(quiz)
+    if room is None:
+        return JsonResponse({'error': 'La sala no está activa'}, status=409)
+
+    async with room.lock:
+        if live_rooms.rooms.get(quiz_id) is not room:
+            # Otra acción la cerró mientras esperábamos el turno
+            return JsonResponse({'error': 'La sala no está activa'}, status=409)
+        return await _host_action(room, action)
+
+
+async def _host_action(room, action):
+    layer = get_channel_layer()
+    group = room_group(room.quiz_id)
+
+    if action == 'start':
+        if not room.deck:
+            await live_rooms.close(room.quiz_id)
+            return JsonResponse({'error': 'No hay preguntas disponibles'}, status=409)
+        if room.index >= 0:
+            # Repetir "start" (doble clic, recarga) no avanza la sala
+            return JsonResponse({'index': room.index + 1, 'total_questions': len(room.deck)})
+        action = 'next'
+
+    if action == 'next':
+        if room.current is not None:
+            await layer.publish(group, room.results_event())
+        if room.advance():
+            await layer.publish(group, room.question_event())
+            return JsonResponse({'index': room.index + 1, 'total_questions': len(room.deck)})
+        action = 'finish'
+
+    if action == 'finish':
+        usernames = await live_rooms.close(room.quiz_id)
+        standings = sorted(room.scores.items(), key=lambda item: item[1][0], reverse=True)
+        await layer.publish(group, {
+            'event': 'finished',
+            'data': {
+                'players': len(standings),
+                'top': [[usernames.get(user_id, ''), score] for user_id, (score, _) in standings[:10]],
+            },
+        })
+        return JsonResponse({'finished': True, 'players': len(standings)})
+
+    return JsonResponse({'error': 'Acción desconocida'}, status=400)
@@ -0,0 +1,127 @@
+"""Utilidades compartidas por los comandos de benchmark"""
+import math
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from quizz.models import Category, Question, Answer
+from quizz.question_stats import question_stats
+
+
+@contextmanager
+def throwaway_database():
+    """Crear una base de datos (y una caché) temporal y migrada, y destruirlas al terminar"""
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    tmpdir = tempfile.mkdtemp(prefix='quizz-bench-')
+    if connection.vendor == 'sqlite':
+        # Archivo y no memoria: los hilos del benchmark abren sus propias conexiones
+        test_settings['NAME'] = os.path.join(tmpdir, 'bench.sqlite3')
+    # Caché propia del proceso (los hilos del benchmark la comparten): no toca la de los workers
+    caches = override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'quizz-bench',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    }})
+    caches.enable()
+    setup_test_environment()
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        yield
+    finally:
+        # Volcar aquí las estadísticas del benchmark: después el hilo de volcado las llevaría a la BD real
+        question_stats.flush()
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        caches.disable()
+        test_settings['NAME'] = old_test_name
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def seed_questions(total, categories=4, answers=4, batch_size=5000):
+    """Insertar preguntas sintéticas (y sus respuestas) en lotes"""
+    cats = Category.objects.bulk_create(
+        Category(name=f'Categoría {i + 1}') for i in range(categories)
+    )
+    created = 0
+    while created < total:
+        size = min(batch_size, total - created)
+        questions = Question.objects.bulk_create(
+            Question(
+                category=cats[(created + i) % len(cats)],
+                question_text=f'Pregunta de prueba número {created + i + 1}',
+                points=10,
+            )
+            for i in range(size)
+        )
+        if answers:
+            Answer.objects.bulk_create(
+                Answer(question=q, answer_text=f'Respuesta {j + 1}', is_correct=(j == 0))
+                for q in questions
+                for j in range(answers)
+            )
+        created += size
+    return cats
+
+
+def seed_users(total, prefix='alumno', password=None):
+    """Crear usuarios de prueba (el perfil lo crea la señal)"""
+    users = []
+    for i in range(total):
+        user = User(username=f'{prefix}{i + 1}')
+        if password:
+            user.set_password(password)
+        else:
+            user.set_unusable_password()
+        user.save()
+        users.append(user)
+    return users
+
+
+class QueryCounter:
+    """execute_wrapper que cuenta las consultas SQL de la conexión del hilo actual"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def percentile(values, pct):
+    """Percentil por rango más cercano"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def time_calls(func, runs):
+    """Ejecutar func varias veces y devolver las latencias en milisegundos"""
+    latencies = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def summarize(latencies):
+    """Resumen p50/p95/p99 de una lista de latencias (ms)"""
+    return {
+        'runs': len(latencies),
+        'p50_ms': round(percentile(latencies, 50), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'max_ms': round(max(latencies), 3) if latencies else 0.0,
+    }
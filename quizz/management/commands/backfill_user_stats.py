@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from quizz import user_stats
+
+
+class Command(BaseCommand):
+    help = 'Recalcular el resumen UserStats de todos los usuarios desde sus intentos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        self.stdout.write('Recalculando estadísticas de usuarios...')
+        total = user_stats.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✓ {total} usuarios con estadísticas'))
@@ -0,0 +1,155 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import Group
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.utils import timezone
+
+from quizz import exams
+from quizz.models import Exam, Quiz
+
+from ._bench import throwaway_database, seed_questions, seed_users, QueryCounter, summarize
+from .bench_quiz_flow import ANSWER_RE, FlowRecorder
+
+
+def herd(recorder, clients, view, method, path, expected):
+    """Lanzar la misma petición desde todos los clientes a la vez (barrera)"""
+    barrier = threading.Barrier(len(clients))
+
+    def fire(client):
+        try:
+            barrier.wait()
+            return recorder.request(view, method, path, expected=expected, client=client)
+        finally:
+            connection.close()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(clients)) as pool:
+        responses = list(pool.map(fire, clients))
+    return responses, time.perf_counter() - start
+
+
+def answer_all(recorder, client):
+    """Responder el mazo completo (sin barrera: cada alumno a su ritmo)"""
+    try:
+        while True:
+            page = recorder.request('play_quiz', 'get', '/play/', client=client)
+            answer_ids = ANSWER_RE.findall(page.content) if page.status_code == 200 else []
+            if not answer_ids:
+                break
+            recorder.request('play_quiz', 'post', '/play/', {'answer': random.choice(answer_ids).decode()},
+                             expected=(302,), client=client)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Simular a toda una clase empezando y entregando un examen en el mismo segundo'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=2000)
+        parser.add_argument('--categories', type=int, default=4)
+        parser.add_argument('--students', type=int, default=500,
+                            help='Alumnos del grupo; todos empiezan a la vez')
+        parser.add_argument('--deck-size', type=int, default=20)
+        parser.add_argument('--compare', action='store_true',
+                            help='Medir también la misma avalancha sobre /start-quiz/ (mazo en la petición)')
+        parser.add_argument('--output', help='Ruta del JSON de resultados')
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            students = options['students']
+            self.stdout.write(f"Sembrando {options['questions']} preguntas y {students} alumnos...")
+            cats = seed_questions(options['questions'], categories=options['categories'])
+            users = seed_users(students)
+            group = Group.objects.create(name='Sección bench')
+            group.user_set.add(*users)
+            teacher = seed_users(1, prefix='docente')[0]
+            quiz = Quiz.objects.create(title='Examen bench', category=cats[0], created_by=teacher,
+                                       total_questions=options['deck_size'])
+
+            # La señal prepara los mazos al crear el examen
+            start = time.perf_counter()
+            exam = Exam.objects.create(quiz=quiz, group=group, starts_at=timezone.now())
+            prepare_s = time.perf_counter() - start
+
+            clients = []
+            for user in users:
+                client = Client()
+                client.force_login(user)
+                clients.append(client)
+
+            recorder = FlowRecorder()
+            # Antes de la hora: todos ven la página de espera
+            herd(recorder, clients, 'exam_waiting', 'get', f'/exam/{exam.pk}/start/', expected=(200,))
+            start = time.perf_counter()
+            exams.open_exam(exam.pk)
+            open_s = time.perf_counter() - start
+            _, start_s = herd(recorder, clients, 'start_exam', 'get', f'/exam/{exam.pk}/start/', expected=(302,))
+
+            with ThreadPoolExecutor(max_workers=min(students, 32)) as pool:
+                list(pool.map(lambda client: answer_all(recorder, client), clients))
+
+            _, submit_s = herd(recorder, clients, 'submit_exam', 'get', '/results/', expected=(200,))
+            start = time.perf_counter()
+            exams.submissions.join()
+            # Las que no cupieron en la cola siguen guardadas en ExamDeck
+            exams.submissions.sweep()
+            drain_s = time.perf_counter() - start
+            saved = exam.decks.filter(attempt__isnull=False).count()
+
+            if options['compare']:
+                herd(recorder, clients, 'start_quiz', 'get', '/start-quiz/', expected=(302,))
+
+        report = self.build_report(options, recorder, {
+            'prepare_s': prepare_s,
+            'open_s': open_s,
+            'start_herd_s': start_s,
+            'submit_herd_s': submit_s,
+            'queue_drain_s': drain_s,
+        }, saved)
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                json.dump(report, fh, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"✓ Resultados guardados en {options['output']}"))
+
+    def build_report(self, options, recorder, phases, saved):
+        views = {}
+        for view, latencies in recorder.latencies.items():
+            queries = recorder.queries[view]
+            views[view] = {
+                **summarize(latencies),
+                'errors': recorder.errors[view],
+                'queries_mean': round(sum(queries) / len(queries), 2),
+                'queries_max': max(queries),
+            }
+        return {
+            'config': {key: options[key] for key in ('questions', 'categories', 'students', 'deck_size')},
+            'database': connection.vendor,
+            'phases': {key: round(value, 3) for key, value in phases.items()},
+            'submissions_saved': saved,
+            'views': views,
+        }
+
+    def print_report(self, report):
+        phases = report['phases']
+        self.stdout.write(self.style.SUCCESS(
+            f"\n{report['config']['students']} alumnos: mazos preparados en {phases['prepare_s']} s, "
+            f"apertura en {phases['open_s'] * 1000:.1f} ms, avalancha de inicio en {phases['start_herd_s']} s"
+        ))
+        self.stdout.write(
+            f"  Entregas: avalancha en {phases['submit_herd_s']} s, cola vaciada {phases['queue_drain_s']} s después "
+            f"({report['submissions_saved']}/{report['config']['students']} guardadas)"
+        )
+        self.stdout.write(f"  {'vista':<14}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'SQL/req':>9}{'errores':>9}")
+        for view, stats in report['views'].items():
+            self.stdout.write(
+                f"  {view:<14}{stats['runs']:>6}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+                f"{stats['p99_ms']:>10.2f}{stats['queries_mean']:>9.1f}{stats['errors']:>9}"
+            )
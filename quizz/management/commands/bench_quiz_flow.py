@@ -0,0 +1,134 @@
+import json
+import random
+import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+
+from quizz.models import Badge
+
+from ._bench import throwaway_database, seed_questions, seed_users, QueryCounter, summarize
+
+ANSWER_RE = re.compile(rb'name="answer" value="(\d+)"')
+
+PASSWORD = 'bench-password'
+
+
+class FlowRecorder:
+    """Latencias y consultas SQL por vista, compartidas entre hilos"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def request(self, view, method, path, data=None, expected=(200, 302), client=None):
+        counter = QueryCounter()
+        start = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            response = getattr(client, method)(path, data or {})
+        elapsed = (time.perf_counter() - start) * 1000
+        with self.lock:
+            self.latencies[view].append(elapsed)
+            self.queries[view].append(counter.count)
+            if response.status_code not in expected:
+                self.errors[view] += 1
+        return response
+
+
+def student_flow(recorder, username, answer_count):
+    """login → start_quiz → N× play_quiz (GET + POST) → quiz_results → leaderboard"""
+    client = Client()
+    try:
+        recorder.request('login', 'post', '/', {'username': username, 'password': PASSWORD}, expected=(302,), client=client)
+        recorder.request('start_quiz', 'get', '/start-quiz/', expected=(302,), client=client)
+        for _ in range(answer_count):
+            page = recorder.request('play_quiz', 'get', '/play/', client=client)
+            if page.status_code != 200:
+                break
+            answer_ids = ANSWER_RE.findall(page.content)
+            if not answer_ids:
+                break
+            recorder.request('play_quiz', 'post', '/play/', {'answer': random.choice(answer_ids).decode()},
+                             expected=(302,), client=client)
+        recorder.request('quiz_results', 'get', '/results/', client=client)
+        recorder.request('leaderboard', 'get', '/leaderboard/', client=client)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = 'Simular estudiantes concurrentes recorriendo el flujo completo del quiz'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--questions', type=int, default=2000)
+        parser.add_argument('--categories', type=int, default=4)
+        parser.add_argument('--students', type=int, default=40,
+                            help='Usuarios sembrados; cada uno completa un quiz')
+        parser.add_argument('--concurrency', type=int, default=8, help='Hilos simultáneos')
+        parser.add_argument('--rounds', type=int, default=1, help='Quizzes por estudiante')
+        parser.add_argument('--output', help='Ruta del JSON de resultados')
+
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+    def handle(self, *args, **options):
+        with throwaway_database():
+            self.stdout.write(
+                f"Sembrando {options['questions']} preguntas y {options['students']} estudiantes..."
+            )
+            seed_questions(options['questions'], categories=options['categories'])
+            Badge.objects.create(name='Primer Quiz', description='', badge_type='beginner', requirement=1)
+            Badge.objects.create(name='Aficionado', description='', badge_type='intermediate', requirement=100)
+            users = seed_users(options['students'], password=PASSWORD)
+            usernames = [user.username for user in users] * options['rounds']
+
+            recorder = FlowRecorder()
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+                list(pool.map(lambda name: student_flow(recorder, name, 20), usernames))
+            duration = time.perf_counter() - start
+
+        report = self.build_report(options, recorder, duration, len(usernames))
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                json.dump(report, fh, indent=2, sort_keys=True)
+            self.stdout.write(self.style.SUCCESS(f"✓ Resultados guardados en {options['output']}"))
+
+    def build_report(self, options, recorder, duration, quizzes):
+        requests = sum(len(values) for values in recorder.latencies.values())
+        views = {}
+        for view, latencies in recorder.latencies.items():
+            queries = recorder.queries[view]
+            views[view] = {
+                **summarize(latencies),
+                'errors': recorder.errors[view],
+                'queries_mean': round(sum(queries) / len(queries), 2),
+                'queries_max': max(queries),
+            }
+        return {
+            'config': {key: options[key] for key in ('questions', 'categories', 'students', 'concurrency', 'rounds')},
+            'database': connection.vendor,
+            'duration_s': round(duration, 3),
+            'requests': requests,
+            'throughput_rps': round(requests / duration, 2) if duration else 0.0,
+            'quizzes_per_s': round(quizzes / duration, 2) if duration else 0.0,
+            'views': views,
+        }
+
+    def print_report(self, report):
+        self.stdout.write(self.style.SUCCESS(
+            f"\n{report['requests']} peticiones en {report['duration_s']} s "
+            f"({report['throughput_rps']} req/s, {report['quizzes_per_s']} quizzes/s)"
+        ))
+        self.stdout.write(f"  {'vista':<14}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'SQL/req':>9}{'errores':>9}")
+        for view, stats in report['views'].items():
+            self.stdout.write(
+                f"  {view:<14}{stats['runs']:>6}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+                f"{stats['p99_ms']:>10.2f}{stats['queries_mean']:>9.1f}{stats['errors']:>9}"
+            )
@@ -0,0 +1,87 @@
+import random
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.test import Client
+
+from quizz import search
+from quizz.models import Quiz, Category
+
+from ._bench import throwaway_database, seed_users, time_calls, summarize
+
+WORDS = [
+    'álgebra', 'matemáticas', 'historia', 'geografía', 'química', 'física', 'biología',
+    'programación', 'redes', 'estadística', 'economía', 'literatura', 'inglés', 'ética',
+    'contabilidad', 'electrónica', 'mecánica', 'enfermería', 'gastronomía', 'diseño',
+]
+
+QUERIES = ['algebra', 'Química básica', 'histo', 'redes programacion', 'zzz']
+
+
+def seed_quizzes(total, batch_size=5000):
+    """Insertar quizzes sintéticos en lotes y reconstruir el índice de búsqueda"""
+    author = User.objects.create(username='docente-bench')
+    categories = Category.objects.bulk_create(Category(name=word.capitalize()) for word in WORDS)
+    created = 0
+    while created < total:
+        size = min(batch_size, total - created)
+        Quiz.objects.bulk_create(
+            Quiz(
+                title=' '.join(random.sample(WORDS, 2)).capitalize() + f' {created + i + 1}',
+                description=f'Repaso de {" y ".join(random.sample(WORDS, 3))} para el instituto',
+                category=categories[(created + i) % len(categories)],
+                created_by=author,
+                is_live=True,
+            )
+            for i in range(size)
+        )
+        created += size
+    # bulk_create no emite señales
+    return search.rebuild()
+
+
+def legacy_search(query):
+    """Búsqueda anterior: icontains sobre título y descripción"""
+    return list(Quiz.objects.filter(
+        Q(title__icontains=query) | Q(description__icontains=query),
+        is_live=True
+    )[:10])
+
+
+def fts_search(query):
+    """Búsqueda nueva: conteo + primera página, como en discover"""
+    page = Paginator(search.search('quiz', query), 10).get_page(1)
+    return list(page.object_list)
+
+
+class Command(BaseCommand):
+    help = 'Comparar la búsqueda de texto completo con icontains sobre muchos quizzes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quizzes', type=int, default=100000)
+        parser.add_argument('--runs', type=int, default=50)
+
+    def handle(self, *args, **options):
+        with throwaway_database():
+            self.stdout.write(f"Sembrando {options['quizzes']} quizzes...")
+            indexed = seed_quizzes(options['quizzes'])
+            self.stdout.write(f'{indexed} documentos indexados ({search.get_backend().__class__.__name__})')
+            user = seed_users(1)[0]
+            client = Client()
+            client.force_login(user)
+
+            for query in QUERIES:
+                results = search.search('quiz', query)
+                self.stdout.write(self.style.SUCCESS(f'\n"{query}": {results.count()} resultados'))
+                for label, func in [
+                    ('icontains (anterior)', lambda: legacy_search(query)),
+                    ('search (conteo + primera página)', lambda: fts_search(query)),
+                    ('vista discover completa', lambda: client.get('/discover/', {'search': query})),
+                ]:
+                    stats = summarize(time_calls(func, options['runs']))
+                    self.stdout.write(
+                        f'  {label:<35} p50={stats["p50_ms"]:>9.3f} ms  '
+                        f'p95={stats["p95_ms"]:>9.3f} ms  (n={stats["runs"]})'
+                    )
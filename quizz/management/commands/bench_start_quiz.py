@@ -0,0 +1,62 @@
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+
+from quizz.indexes import question_pool
+from quizz.models import Question
+
+from ._bench import throwaway_database, seed_questions, seed_users, time_calls, summarize
+
+
+def legacy_sample():
+    """Selección anterior: cargar todas las preguntas activas y muestrear"""
+    all_questions = list(Question.objects.filter(is_active=True))
+    return random.sample(all_questions, min(20, len(all_questions)))
+
+
+def start_quiz(client):
+    """Empezar un quiz y comprobar que se construyó un mazo (no la página sin preguntas)"""
+    response = client.get('/start-quiz/')
+    if response.status_code != 302 or response.url != '/play/':
+        raise CommandError(f'start_quiz no empezó un quiz (HTTP {response.status_code})')
+    return response
+
+
+class Command(BaseCommand):
+    help = 'Medir la latencia de inicio de quiz con distintos volúmenes de preguntas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', nargs='+', type=int, default=[100000, 1000000])
+        parser.add_argument('--runs', type=int, default=200)
+        parser.add_argument('--legacy-runs', type=int, default=5)
+
+    def handle(self, *args, **options):
+        for size in options['sizes']:
+            with throwaway_database():
+                self.stdout.write(f'Sembrando {size} preguntas...')
+                # Con respuestas: build_deck descarta las preguntas que no tienen
+                seed_questions(size, answers=4)
+                user = seed_users(1)[0]
+                client = Client()
+                client.force_login(user)
+
+                legacy = time_calls(legacy_sample, options['legacy_runs'])
+
+                question_pool.invalidate()
+                cold = time_calls(lambda: question_pool.sample(20), 1)
+                warm = time_calls(lambda: question_pool.sample(20), options['runs'])
+                view = time_calls(lambda: start_quiz(client), options['runs'])
+
+                self.stdout.write(self.style.SUCCESS(f'\n{size} preguntas activas'))
+                for label, latencies in [
+                    ('selección anterior (list + random.sample)', legacy),
+                    ('carga inicial del pool', cold),
+                    ('question_pool.sample(20)', warm),
+                    ('vista start_quiz completa', view),
+                ]:
+                    stats = summarize(latencies)
+                    self.stdout.write(
+                        f'  {label:<45} p50={stats["p50_ms"]:>10.3f} ms  '
+                        f'p95={stats["p95_ms"]:>10.3f} ms  (n={stats["runs"]})'
+                    )
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from quizz import daily_points
+
+
+class Command(BaseCommand):
+    help = 'Verificar los puntos diarios contra los intentos (QuizAttempt)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help='Verificar solo los últimos N días')
+        parser.add_argument('--repair', action='store_true',
+                            help='Reconstruir todas las filas desde los intentos si hay diferencias')
+
+    def handle(self, *args, **options):
+        since = daily_points.window_start(options['days']) if options['days'] else None
+        mismatches = daily_points.verify(since)
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS('✓ Los puntos diarios coinciden con los intentos'))
+            return
+
+        for (user_id, day, category_id), (points, quizzes), (expected_points, expected_quizzes) in mismatches[:20]:
+            self.stdout.write(
+                f'  usuario {user_id}, {day}, categoría {category_id or "-"}: '
+                f'{points} pts/{quizzes} quizzes, intentos {expected_points} pts/{expected_quizzes} quizzes'
+            )
+        if options['repair']:
+            rows = daily_points.rebuild()
+            self.stdout.write(self.style.WARNING(f'Puntos diarios reconstruidos: {rows} filas'))
+        raise CommandError(f'{len(mismatches)} filas de puntos diarios no coinciden')
@@ -0,0 +1,62 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Sum
+
+from quizz import metrics
+from quizz.indexes import rank_index
+from quizz.models import UserProfile
+
+GAUGES = {
+    'quizz_rank_index_version': 'version',
+    'quizz_rank_index_users': 'users',
+    'quizz_rank_index_points': 'points',
+}
+
+
+def worker_indexes():
+    """{pid: {'version', 'users', 'points'}} publicado por los workers vivos de este servidor"""
+    _, gauges, _ = metrics.collect()
+    workers = defaultdict(dict)
+    for (name, labels), value in gauges.items():
+        if name in GAUGES:
+            workers[int(dict(labels)['pid'])][GAUGES[name]] = int(value)
+    return {pid: state for pid, state in workers.items() if len(state) == len(GAUGES)}
+
+
+class Command(BaseCommand):
+    help = 'Verificar el índice de ranking de cada worker (sus métricas) contra la base de datos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repair', action='store_true',
+                            help='Forzar la recarga del índice en todos los procesos si hay diferencias')
+
+    def handle(self, *args, **options):
+        workers = worker_indexes()
+        if not workers:
+            raise CommandError(f'Ningún worker ha publicado su índice en {metrics.metrics_dir()}')
+
+        expected = UserProfile.objects.aggregate(users=Count('pk'), points=Sum('total_points'))
+        expected['points'] = expected['points'] or 0
+        current = rank_index._current_version()
+        stale = []
+        for pid, state in sorted(workers.items()):
+            if (state['users'], state['points']) == (expected['users'], expected['points']):
+                self.stdout.write(f'  worker {pid}: ✓ versión {state["version"]}')
+            elif state['version'] < current:
+                # Reproducirá los cambios pendientes en su próxima lectura
+                self.stdout.write(f'  worker {pid}: versión {state["version"]} de {current}, pendiente')
+            else:
+                stale.append(pid)
+                self.stdout.write(
+                    f'  worker {pid}: {state["users"]} usuarios/{state["points"]} puntos, '
+                    f'BD {expected["users"]}/{expected["points"]}'
+                )
+        if not stale:
+            self.stdout.write(self.style.SUCCESS(f'✓ {len(workers)} índices de ranking al día'))
+            return
+
+        if options['repair']:
+            rank_index.invalidate()
+            self.stdout.write(self.style.WARNING('Índice invalidado; se recargará en cada proceso'))
+        raise CommandError(f'{len(stale)} workers tienen el índice de ranking desactualizado')
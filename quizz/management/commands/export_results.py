@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from quizz.exports import DATASETS, FORMATS, ExportError, parse_day, stream
+
+
+class Command(BaseCommand):
+    help = 'Exportar intentos o respuestas en CSV/JSONL (en streaming)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=list(DATASETS))
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--from', dest='date_from', help='Desde el día (AAAA-MM-DD)')
+        parser.add_argument('--to', dest='date_to', help='Hasta el día, inclusive (AAAA-MM-DD)')
+        parser.add_argument('--category', type=int, help='ID de categoría')
+        parser.add_argument('--group', help='Nombre del grupo de usuarios')
+        parser.add_argument('--output', help='Archivo de salida (por defecto, la salida estándar)')
+
+    def handle(self, *args, **options):
+        try:
+            lines = stream(
+                options['dataset'], options['format'],
+                date_from=parse_day(options['date_from'], '--from'),
+                date_to=parse_day(options['date_to'], '--to'),
+                category=options['category'],
+                group=options['group'],
+            )
+            if options['output']:
+                written = 0
+                with open(options['output'], 'w', encoding='utf-8', newline='') as fh:
+                    for line in lines:
+                        fh.write(line)
+                        written += 1
+                self.stderr.write(self.style.SUCCESS(f"✓ {written} líneas escritas en {options['output']}"))
+            else:
+                for line in lines:
+                    self.stdout.write(line, ending='')
+        except ExportError as exc:
+            raise CommandError(str(exc))
@@ -0,0 +1,54 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from quizz.importers import FORMATS, READERS, QuestionImporter, detect_format
+from quizz.indexes import question_pool
+
+MAX_ERRORS_SHOWN = 20
+
+
+class Command(BaseCommand):
+    help = 'Importar un banco de preguntas desde CSV o JSONL (en streaming y por lotes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Archivo CSV/JSONL, o - para leer de la entrada estándar')
+        parser.add_argument('--format', choices=FORMATS, help='Por defecto se deduce de la extensión')
+        parser.add_argument('--batch-size', type=int, default=500, help='Filas por lote y por transacción')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('jsonl' if path == '-' else detect_format(path))
+        self.errors_shown = 0
+
+        importer = QuestionImporter(batch_size=options['batch_size'], on_error=self.report_error)
+        start = time.perf_counter()
+        try:
+            if path == '-':
+                stats = importer.run(READERS[file_format](sys.stdin))
+            else:
+                with open(path, encoding='utf-8-sig', newline='') as fh:
+                    stats = importer.run(READERS[file_format](fh))
+        except OSError as exc:
+            raise CommandError(f'No se pudo leer {path}: {exc}')
+        finally:
+            # bulk_create no emite señales: recargar el pool en todos los procesos
+            if importer.stats['created']:
+                question_pool.invalidate()
+        elapsed = time.perf_counter() - start
+
+        rate = stats['rows'] / elapsed if elapsed else 0.0
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {stats['rows']} filas en {elapsed:.2f} s ({rate:.0f} filas/s)"
+        ))
+        self.stdout.write(f"  Preguntas creadas: {stats['created']}")
+        self.stdout.write(f"  Duplicadas: {stats['duplicates']}")
+        self.stdout.write(f"  Inválidas: {stats['invalid']}")
+
+    def report_error(self, line_number, error):
+        self.errors_shown += 1
+        if self.errors_shown <= MAX_ERRORS_SHOWN:
+            self.stderr.write(f'  Línea {line_number}: {error}')
+        elif self.errors_shown == MAX_ERRORS_SHOWN + 1:
+            self.stderr.write('  (más errores omitidos)')
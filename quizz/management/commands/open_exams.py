@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from quizz import exams
+
+
+class Command(BaseCommand):
+    help = 'Abrir los exámenes programados cuya hora de inicio ya llegó'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true',
+                            help='Seguir comprobando cada --interval segundos (en lugar de cron)')
+        parser.add_argument('--interval', type=float, default=1.0)
+
+    def handle(self, *args, **options):
+        while True:
+            for exam_id in exams.open_due_exams():
+                self.stdout.write(self.style.SUCCESS(f'✓ Examen {exam_id} abierto'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
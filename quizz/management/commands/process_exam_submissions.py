@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from quizz import exams
+
+
+class Command(BaseCommand):
+    help = 'Crear los intentos de las entregas de examen guardadas que siguen pendientes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=0,
+                            help='Solo las entregas guardadas hace más de N segundos')
+
+    def handle(self, *args, **options):
+        pending = len(exams.pending_submissions(options['older_than']))
+        processed = exams.submissions.sweep(options['older_than'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Intentos creados: {processed} de {pending} entregas pendientes'))
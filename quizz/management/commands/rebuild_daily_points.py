@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from quizz import daily_points
+
+
+class Command(BaseCommand):
+    help = 'Recalcular los puntos diarios por usuario y categoría desde QuizAttempt'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rows = daily_points.rebuild(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Puntos diarios reconstruidos: {rows} filas'))
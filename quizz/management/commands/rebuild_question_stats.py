@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from quizz import question_stats
+
+
+class Command(BaseCommand):
+    help = 'Recalcular las estadísticas por pregunta desde QuizResponse'
+
+    def handle(self, *args, **options):
+        self.stdout.write('Recalculando estadísticas por pregunta...')
+        total = question_stats.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'✓ {total} preguntas con estadísticas'))
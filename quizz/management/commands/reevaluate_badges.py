@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from quizz.badges import badge_engine
+
+
+class Command(BaseCommand):
+    help = 'Reevaluar las insignias de todos los usuarios (p. ej. tras crear un badge nuevo)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        awarded = badge_engine.reevaluate_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'✓ Insignias otorgadas: {awarded}'))
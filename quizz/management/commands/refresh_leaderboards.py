@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from quizz import leaderboards
+
+
+class Command(BaseCommand):
+    help = 'Purgar periodos antiguos de las clasificaciones (o reconstruirlas desde los intentos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help='Recalcular todas las entradas a partir de QuizAttempt',
+        )
+
+    def handle(self, *args, **options):
+        if options['rebuild']:
+            entries = leaderboards.rebuild()
+            self.stdout.write(self.style.SUCCESS(f'✓ Clasificaciones reconstruidas: {entries} entradas'))
+        else:
+            deleted = leaderboards.prune()
+            self.stdout.write(self.style.SUCCESS(f'✓ Entradas antiguas eliminadas: {deleted}'))
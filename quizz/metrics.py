@@ -0,0 +1,344 @@
+"""
+Métricas por vista en formato de texto de Prometheus.
+
+Cada proceso acumula sus contadores e histogramas en memoria y los vuelca
+como JSON en QUIZZ_METRICS_DIR (un archivo por PID, escritura atómica) como
+máximo una vez por segundo. El endpoint /metrics/ suma los archivos de todos
+los workers de gunicorn; los contadores de los workers que ya murieron se
+acumulan en un único archivo y sus archivos se borran.
+
+El endpoint lo ven el personal staff, quien envíe `Authorization: Bearer
+<QUIZZ_METRICS_TOKEN>` y las IPs de QUIZZ_METRICS_ALLOWED_IPS (ninguna por
+defecto: detrás de un proxy REMOTE_ADDR es la del proxy).
+"""
+import atexit
+import hmac
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse, HttpResponseForbidden
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+FLUSH_INTERVAL = 1.0
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    'quizz_requests_total': ('counter', 'Peticiones atendidas por vista y clase de estado'),
+    'quizz_request_duration_seconds': ('histogram', 'Latencia de las peticiones por vista'),
+    'quizz_sql_queries_total': ('counter', 'Consultas SQL ejecutadas por vista'),
+    'quizz_sql_duration_seconds_total': ('counter', 'Tiempo acumulado en consultas SQL por vista'),
+    'quizz_cache_requests_total': ('counter', 'Lecturas de las cachés de la app por resultado'),
+    'quizz_deck_pool_requests_total': ('counter', 'Mazos pedidos a la reserva por categoría y resultado'),
+    'quizz_deck_pool_refills_total': ('counter', 'Mazos construidos en segundo plano por categoría'),
+    'quizz_deck_pool_discarded_total': ('counter', 'Mazos descartados porque cambió alguna de sus preguntas'),
+    'quizz_exam_submissions_total': ('counter', 'Entregas de examen por camino (encolada, diferida, directa, barrida o fallida)'),
+    'quizz_exam_submission_delay_seconds': ('histogram', 'Espera de las entregas de examen en la cola hasta tener intento'),
+    'quizz_rank_index_version': ('gauge', 'Versión del índice de ranking aplicada por cada worker'),
+    'quizz_rank_index_users': ('gauge', 'Usuarios en el índice de ranking de cada worker'),
+    'quizz_rank_index_points': ('gauge', 'Suma de puntos en el índice de ranking de cada worker'),
+}
+
+
+# Contadores e histogramas acumulados de los workers que ya murieron
+ARCHIVE_FILENAME = 'archive.json'
+
+
+def metrics_dir():
+    return getattr(settings, 'QUIZZ_METRICS_DIR', os.path.join(tempfile.gettempdir(), 'quizz-metrics'))
+
+
+def _write_json(directory, filename, data):
+    """Escritura atómica: quien lee nunca ve un archivo a medias"""
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.metrics-')
+    with os.fdopen(fd, 'w') as fh:
+        json.dump(data, fh)
+    os.replace(tmp_path, os.path.join(directory, filename))
+
+
+class MetricsRegistry:
+    """Contadores, valores (gauges) e histogramas del proceso actual"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._gauges = {}
+        self._histograms = {}
+        self._last_flush = 0.0
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def set(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._gauges[key] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0, 0]
+            histogram[0][bisect_left(LATENCY_BUCKETS, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, dict(labels), value] for (name, labels), value in self._counters.items()],
+                'gauges': [[name, dict(labels), value] for (name, labels), value in self._gauges.items()],
+                'histograms': [
+                    [name, dict(labels), list(buckets), total, count]
+                    for (name, labels), (buckets, total, count) in self._histograms.items()
+                ],
+            }
+
+    def flush(self, force=False):
+        """Escribir la instantánea del proceso (como mucho una vez por FLUSH_INTERVAL)"""
+        now = time.monotonic()
+        if not force and now - self._last_flush < FLUSH_INTERVAL:
+            return
+        self._last_flush = now
+        directory = metrics_dir()
+        try:
+            os.makedirs(directory, exist_ok=True)
+            _write_json(directory, f'metrics-{os.getpid()}.json', self.snapshot())
+        except OSError:
+            # Las métricas nunca deben tumbar una petición
+            logger.warning("No se pudieron volcar las métricas en %s", directory, exc_info=True)
+
+
+registry = MetricsRegistry()
+inc = registry.inc
+set_gauge = registry.set
+observe = registry.observe
+
+
+atexit.register(registry.flush, force=True)
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _worker_pid(filename):
+    """PID del archivo de un worker; None para los demás archivos del directorio"""
+    if filename.startswith('metrics-') and filename.endswith('.json'):
+        pid = filename[len('metrics-'):-len('.json')]
+        if pid.isdigit():
+            return int(pid)
+    return None
+
+
+def _read_json(path):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+@contextmanager
+def _directory_lock(directory):
+    """Un solo proceso a la vez lee y archiva los archivos del directorio"""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, '.lock'), 'w') as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        yield
+
+
+def _merge(data, counters, histograms, gauges=None):
+    for name, labels, value in data['counters']:
+        counters[(name, tuple(sorted(labels.items())))] += value
+    if gauges is not None:
+        for name, labels, value in data.get('gauges', []):
+            gauges[(name, tuple(sorted(labels.items())))] = value
+    for name, labels, buckets, total, count in data['histograms']:
+        key = (name, tuple(sorted(labels.items())))
+        merged = histograms.setdefault(key, [[0] * len(buckets), 0.0, 0])
+        merged[0] = [a + b for a, b in zip(merged[0], buckets)]
+        merged[1] += total
+        merged[2] += count
+
+
+def _archive_dead_workers(directory, archive, dead):
+    """Sumar al archivo común los workers muertos y borrar sus archivos"""
+    if not dead:
+        return
+    counters, histograms = defaultdict(float), {}
+    for data in [archive] + [data for _, data in dead]:
+        _merge(data, counters, histograms)
+    archive.update(
+        counters=[[name, dict(labels), value] for (name, labels), value in counters.items()],
+        histograms=[[name, dict(labels), buckets, total, count]
+                    for (name, labels), (buckets, total, count) in histograms.items()],
+    )
+    try:
+        _write_json(directory, ARCHIVE_FILENAME, archive)
+        for filename, _ in dead:
+            os.unlink(os.path.join(directory, filename))
+    except OSError:
+        logger.warning("No se pudieron archivar las métricas de %s", directory, exc_info=True)
+
+
+def collect():
+    """
+    Sumar las instantáneas de todos los procesos. Los gauges no se suman:
+    llevan la etiqueta pid y solo cuentan los de procesos vivos. Los archivos
+    de los procesos muertos se pasan al archivo común y se borran.
+    """
+    registry.flush(force=True)
+    counters = defaultdict(float)
+    gauges = {}
+    histograms = {}
+    directory = metrics_dir()
+    with _directory_lock(directory):
+        archive = _read_json(os.path.join(directory, ARCHIVE_FILENAME)) or {'counters': [], 'histograms': []}
+        _merge(archive, counters, histograms)
+        dead = []
+        for filename in os.listdir(directory):
+            pid = _worker_pid(filename)
+            if pid is None:
+                continue
+            data = _read_json(os.path.join(directory, filename))
+            if data is None:
+                continue
+            alive = pid_alive(pid)
+            _merge(data, counters, histograms, gauges if alive else None)
+            if not alive:
+                dead.append((filename, data))
+        _archive_dead_workers(directory, archive, dead)
+    return counters, gauges, histograms
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in items) + '}'
+
+
+def render_prometheus():
+    counters, gauges, histograms = collect()
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind in ('counter', 'gauge'):
+            values = counters if kind == 'counter' else gauges
+            for (metric, labels), value in sorted(values.items()):
+                if metric == name:
+                    lines.append(f'{name}{_labels(labels)} {value:g}')
+        else:
+            for (metric, labels), (buckets, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, bucket in zip(LATENCY_BUCKETS + ('+Inf',), buckets):
+                    cumulative += bucket
+                    lines.append(f'{name}_bucket{_labels(labels, le=bound)} {cumulative}')
+                lines.append(f'{name}_sum{_labels(labels)} {total:g}')
+                lines.append(f'{name}_count{_labels(labels)} {count}')
+    return '\n'.join(lines) + '\n'
+
+
+class _SQLTimer:
+    """execute_wrapper que mide las consultas de la petición en curso"""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - start
+            self.queries += 1
+
+
+class MetricsMiddleware:
+    """
+    Latencia, estado y consultas SQL por nombre de URL. Admite vistas síncronas
+    y asíncronas, así las vistas ASGI (salas en vivo) no saltan a un hilo.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timer = _SQLTimer()
+        start = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        self._record(request, response, time.perf_counter() - start, timer)
+        return response
+
+    async def __acall__(self, request):
+        timer = _SQLTimer()
+        start = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = await self.get_response(request)
+        self._record(request, response, time.perf_counter() - start, timer)
+        return response
+
+    def _record(self, request, response, elapsed, timer):
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        observe('quizz_request_duration_seconds', elapsed, view=view)
+        inc('quizz_requests_total', view=view, status=f'{response.status_code // 100}xx')
+        inc('quizz_sql_queries_total', timer.queries, view=view)
+        inc('quizz_sql_duration_seconds_total', timer.seconds, view=view)
+        registry.flush()
+
+
+def _has_token(request):
+    token = getattr(settings, 'QUIZZ_METRICS_TOKEN', '')
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and hmac.compare_digest(header.encode(), f'Bearer {token}'.encode())
+
+
+def metrics_view(request):
+    """Endpoint de Prometheus (personal staff, token compartido o IPs permitidas)"""
+    allowed_ips = getattr(settings, 'QUIZZ_METRICS_ALLOWED_IPS', [])
+    if not (request.user.is_staff or _has_token(request) or request.META.get('REMOTE_ADDR') in allowed_ips):
+        return HttpResponseForbidden()
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-18 14:47
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizz', '0002_leaderboardentry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='quizresponse',
+            name='answered_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 6.0 on 2026-10-18 14:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizz', '0003_quizresponse_answered_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LiveAnswerTally',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.IntegerField(default=0)),
+                ('answer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='quizz.answer')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='quizz.question')),
+                ('quiz', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='live_tallies', to='quizz.quiz')),
+            ],
+            options={
+                'unique_together': {('quiz', 'question', 'answer')},
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0 on 2026-10-18 14:52
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizz', '0004_liveanswertally'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='question',
+            options={},
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-18 15:10
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from quizz import search
+
+    backend = search.get_backend(schema_editor.connection.vendor)
+    backend.create(schema_editor)
+    Quiz = apps.get_model('quizz', 'Quiz')
+    Category = apps.get_model('quizz', 'Category')
+    backend.bulk_index(
+        [('quiz', quiz.pk, quiz.title, quiz.description) for quiz in Quiz.objects.filter(is_live=True)]
+        + [('category', category.pk, category.name, category.description) for category in Category.objects.all()]
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    from quizz import search
+
+    search.get_backend(schema_editor.connection.vendor).drop(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizz', '0006_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
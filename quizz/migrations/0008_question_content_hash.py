@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-18 15:24
+
+from django.db import migrations, models
+
+
+def fill_content_hash(apps, schema_editor):
+    from quizz.models import question_content_hash
+
+    Question = apps.get_model('quizz', 'Question')
+    batch = []
+    for question in Question.objects.only('id', 'category_id', 'question_text').iterator(chunk_size=2000):
+        question.content_hash = question_content_hash(question.category_id, question.question_text)
+        batch.append(question)
+        if len(batch) >= 2000:
+            Question.objects.bulk_update(batch, ['content_hash'])
+            batch = []
+    Question.objects.bulk_update(batch, ['content_hash'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizz', '0007_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='content_hash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+        migrations.RunPython(fill_content_hash, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-18 15:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('quizz', '0009_questionstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('best_score', models.IntegerField(default=0)),
+                ('wins', models.IntegerField(default=0)),
+                ('correct_answers', models.IntegerField(default=0)),
+                ('questions_answered', models.IntegerField(default=0)),
+                ('current_streak', models.IntegerField(default=0, help_text='Días seguidos jugando')),
+                ('best_streak', models.IntegerField(default=0)),
+                ('last_played_on', models.DateField(blank=True, null=True)),
+                ('month', models.DateField(blank=True, help_text='Inicio del mes de monthly_plays', null=True)),
+                ('monthly_plays', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'User stats',
+            },
+        ),
+    ]
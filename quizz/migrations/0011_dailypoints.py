@@ -0,0 +1,55 @@
+# Generated by Django 6.0 on 2026-10-18 15:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def fill_daily_points(apps, schema_editor):
+    QuizAttempt = apps.get_model('quizz', 'QuizAttempt')
+    DailyPoints = apps.get_model('quizz', 'DailyPoints')
+    totals = (
+        QuizAttempt.objects
+        .annotate(day=TruncDate('completed_at'))
+        .values('user_id', 'day', 'quiz__category_id')
+        .annotate(points=Sum('score'), quizzes=Count('id'))
+        .order_by()
+    )
+    DailyPoints.objects.bulk_create(
+        [
+            DailyPoints(user_id=row['user_id'], day=row['day'], category_id=row['quiz__category_id'],
+                        points=row['points'], quizzes=row['quizzes'])
+            for row in totals.iterator(chunk_size=2000)
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizz', '0010_userstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyPoints',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('points', models.IntegerField(default=0)),
+                ('quizzes', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='quizz.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_points', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily points',
+                'indexes': [models.Index(fields=['day', 'user'], name='quizz_daily_day_user_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'day', 'category'), name='quizz_daily_user_day_cat_uniq'), models.UniqueConstraint(condition=models.Q(('category__isnull', True)), fields=('user', 'day'), name='quizz_daily_user_day_uniq')],
+            },
+        ),
+        migrations.RunPython(fill_daily_points, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-18 15:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizz', '0012_exams'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='examdeck',
+            name='submission',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='examdeck',
+            name='submitted_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='examdeck',
+            index=models.Index(condition=models.Q(('attempt__isnull', True), ('submitted_at__isnull', False)), fields=['submitted_at'], name='quizz_examdeck_pending_idx'),
+        ),
+    ]
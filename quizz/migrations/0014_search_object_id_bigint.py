@@ -0,0 +1,22 @@
+# Generated by Django 6.0 on 2026-10-18 17:05
+
+from django.db import migrations
+
+
+def widen_object_id(apps, schema_editor):
+    from quizz import search
+
+    backend = search.get_backend(schema_editor.connection.vendor)
+    if isinstance(backend, search.PostgresSearch):
+        backend.widen(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizz', '0013_exam_submissions'),
+    ]
+
+    operations = [
+        migrations.RunPython(widen_object_id, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 6.0 on 2026-10-18 17:45
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizz', '0015_quizattempt_started_at'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='userstats',
+            name='month',
+        ),
+        migrations.RemoveField(
+            model_name='userstats',
+            name='monthly_plays',
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-18 18:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def fill_attempt_category(apps, schema_editor):
+    # Los intentos de una categoría sin Quiz no guardaban cuál era: quedan vacíos
+    Quiz = apps.get_model('quizz', 'Quiz')
+    QuizAttempt = apps.get_model('quizz', 'QuizAttempt')
+    QuizAttempt.objects.filter(quiz__isnull=False).update(
+        category_id=Subquery(Quiz.objects.filter(pk=OuterRef('quiz_id')).values('category_id')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('quizz', '0016_remove_userstats_monthly_plays'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizattempt',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='attempts', to='quizz.category'),
+        ),
+        migrations.RunPython(fill_attempt_category, migrations.RunPython.noop),
+    ]
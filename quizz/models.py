@@ -1,8 +1,12 @@
+import hashlib
+import unicodedata
+
 from django.db import models
-from django.contrib.auth.models import User
-from django.db.models import Sum
+from django.contrib.auth.models import User, Group
 from django.utils import timezone
 
+from .indexes import rank_index
+
 
 class Category(models.Model):
     """Categoría de preguntas"""
@@ -19,6 +23,12 @@ class Category(models.Model):
         return self.name
 
 
+def question_content_hash(category_id, question_text):
+    """Huella del contenido normalizado (mayúsculas, espacios, Unicode) para deduplicar"""
+    normalized = ' '.join(unicodedata.normalize('NFKC', question_text).casefold().split())
+    return hashlib.sha256(f'{category_id}:{normalized}'.encode('utf-8')).hexdigest()
+
+
 class Question(models.Model):
     """Pregunta del quiz"""
     category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='questions')
@@ -27,12 +37,26 @@ class Question(models.Model):
     points = models.IntegerField(default=10)
     created_at = models.DateTimeField(auto_now_add=True)
     is_active = models.BooleanField(default=True)
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True, editable=False)
+    # Copia de QuestionStats (proporción de fallos) para ordenar con índice
+    difficulty = models.FloatField(null=True, blank=True, editable=False)
     
+    # Sin orden aleatorio por defecto: para muestrear usar quizz.sampling.QuestionSampler
     class Meta:
-        ordering = ['?']  # Random ordering
+        indexes = [
+            models.Index(fields=['is_active', 'category'], name='quizz_question_active_idx'),
+            models.Index(fields=['difficulty'], name='quizz_question_difficulty_idx'),
+        ]
     
     def __str__(self):
         return self.question_text[:50]
+    
+    def save(self, *args, **kwargs):
+        self.content_hash = question_content_hash(self.category_id, self.question_text)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = {*update_fields, 'content_hash'}
+        super().save(*args, **kwargs)
 
 
 class Answer(models.Model):
@@ -55,29 +79,29 @@ class UserProfile(models.Model):
     country_flag = models.CharField(max_length=10, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['-total_points'], name='quizz_profile_points_idx'),
+        ]
+    
     def __str__(self):
         return f"{self.user.username} - Profile"
     
     def get_rank(self):
-        """Obtener ranking del usuario"""
-        return UserProfile.objects.filter(total_points__gt=self.total_points).count() + 1
+        """Obtener ranking del usuario (índice en memoria, O(log n))"""
+        return rank_index.rank(self.total_points)
     
     def get_weekly_points(self):
-        """Obtener puntos de la semana"""
-        week_ago = timezone.now() - timezone.timedelta(days=7)
-        weekly_points = QuizAttempt.objects.filter(
-            user=self.user,
-            completed_at__gte=week_ago
-        ).aggregate(total=Sum('score'))['total'] or 0
-        return weekly_points
+        """Obtener puntos de la semana actual (la misma que la clasificación semanal)"""
+        from .leaderboards import standing
+        return standing('weekly', self.user_id)[0]
     
     def get_monthly_quizzes(self):
-        """Obtener quizzes jugados este mes"""
-        month_ago = timezone.now() - timezone.timedelta(days=30)
-        return QuizAttempt.objects.filter(
-            user=self.user,
-            completed_at__gte=month_ago
-        ).count()
+        """Obtener quizzes jugados en el mes actual (el de la clasificación mensual)"""
+        from .leaderboards import bucket_start
+        return self.user.leaderboard_entries.filter(
+            period='monthly', bucket=bucket_start('monthly'),
+        ).values_list('quizzes', flat=True).first() or 0
 
 
 class Badge(models.Model):
@@ -127,6 +151,10 @@ class Quiz(models.Model):
     
     class Meta:
         verbose_name_plural = "Quizzes"
+        indexes = [
+            # Índice parcial: Django compila is_live=True como WHERE "is_live"
+            models.Index(fields=['-created_at'], condition=models.Q(is_live=True), name='quizz_quiz_live_idx'),
+        ]
     
     def __str__(self):
         return self.title
@@ -136,13 +164,23 @@ class QuizAttempt(models.Model):
     """Intento de quiz por un usuario"""
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='quiz_attempts')
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='attempts', null=True, blank=True)
+    # Categoría jugada (la del quiz o la elegida); vacía para los quizzes mezclados
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='attempts', null=True, blank=True)
     score = models.IntegerField(default=0)
     correct_answers = models.IntegerField(default=0)
     total_questions = models.IntegerField(default=20)
+    # Inicio del quiz: mide el tiempo de la primera respuesta en rebuild_question_stats
+    started_at = models.DateTimeField(null=True, blank=True, editable=False)
     completed_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-completed_at']
+        indexes = [
+            # Puntos de la semana / quizzes del mes
+            models.Index(fields=['user', 'completed_at'], name='quizz_attempt_user_date_idx'),
+            # Quizzes ganados (correct_answers >= 14)
+            models.Index(fields=['user', 'correct_answers'], name='quizz_attempt_user_correct_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.score} points"
@@ -160,7 +198,8 @@ class QuizResponse(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     selected_answer = models.ForeignKey(Answer, on_delete=models.CASCADE)
     is_correct = models.BooleanField(default=False)
-    answered_at = models.DateTimeField(auto_now_add=True)
+    # Se asigna al responder (no al guardar): las respuestas se insertan en lote al final
+    answered_at = models.DateTimeField(default=timezone.now)
     
     def __str__(self):
         return f"{self.attempt.user.username} - Q{self.question.id}"
@@ -177,3 +216,181 @@ class Friend(models.Model):
     
     def __str__(self):
         return f"{self.user.username} - {self.friend.username}"
+
+
+class LeaderboardEntry(models.Model):
+    """Puntos acumulados por un usuario en una semana o un mes"""
+    PERIODS = [
+        ('weekly', 'Weekly'),
+        ('monthly', 'Monthly'),
+    ]
+
+    period = models.CharField(max_length=10, choices=PERIODS)
+    bucket = models.DateField(help_text="Inicio de la semana o del mes")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='leaderboard_entries')
+    points = models.IntegerField(default=0)
+    quizzes = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Leaderboard entries"
+        unique_together = ['period', 'bucket', 'user']
+        indexes = [
+            models.Index(fields=['period', 'bucket', '-points'], name='quizz_lb_bucket_points_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.period} {self.bucket}: {self.points}"
+
+
+class LiveAnswerTally(models.Model):
+    """Conteo de respuestas de una sala en vivo (se vuelca por lotes desde memoria)"""
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='live_tallies')
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    answer = models.ForeignKey(Answer, on_delete=models.CASCADE)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['quiz', 'question', 'answer']
+
+    def __str__(self):
+        return f"{self.quiz.title} - Q{self.question_id}/A{self.answer_id}: {self.count}"
+
+
+class QuestionStats(models.Model):
+    """Estadísticas de una pregunta, acumuladas por lotes al terminar quizzes"""
+    # Límites superiores (segundos) del histograma de tiempo de respuesta; el último cubo es "más"
+    TIME_BUCKETS = [1, 2, 3, 5, 8, 10, 15, 20, 30, 45, 60, 90, 120, 300]
+
+    question = models.OneToOneField(Question, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    attempts = models.IntegerField(default=0)
+    correct = models.IntegerField(default=0)
+    answer_counts = models.JSONField(default=dict, help_text="{answer_id: veces elegida}")
+    time_histogram = models.JSONField(default=list)
+    median_seconds = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "Question stats"
+
+    def __str__(self):
+        return f"Q{self.question_id}: {self.correct}/{self.attempts}"
+
+    def get_accuracy(self):
+        """Porcentaje de acierto"""
+        if self.attempts > 0:
+            return self.correct / self.attempts * 100
+        return 0
+    
+    def get_difficulty(self):
+        """Proporción de respuestas incorrectas (0 = fácil, 1 = difícil)"""
+        if self.attempts > 0:
+            return 1 - self.correct / self.attempts
+        return None
+
+
+class UserStats(models.Model):
+    """Resumen desnormalizado del usuario para el perfil (se actualiza al terminar cada quiz)"""
+    # Un quiz se gana con al menos este porcentaje de aciertos
+    WIN_RATIO = 0.7
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    best_score = models.IntegerField(default=0)
+    wins = models.IntegerField(default=0)
+    correct_answers = models.IntegerField(default=0)
+    questions_answered = models.IntegerField(default=0)
+    current_streak = models.IntegerField(default=0, help_text="Días seguidos jugando")
+    best_streak = models.IntegerField(default=0)
+    last_played_on = models.DateField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = "User stats"
+
+    def __str__(self):
+        return f"{self.user.username} - Stats"
+
+    def get_accuracy(self):
+        """Porcentaje de acierto global"""
+        if self.questions_answered > 0:
+            return self.correct_answers / self.questions_answered * 100
+        return 0
+
+    def get_current_streak(self, today=None):
+        """Racha vigente: se pierde si ayer no se jugó"""
+        today = today or timezone.localdate()
+        if self.last_played_on and (today - self.last_played_on).days <= 1:
+            return self.current_streak
+        return 0
+
+
+class DailyPoints(models.Model):
+    """Puntos y quizzes de un usuario en un día (local), por categoría jugada"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_points')
+    day = models.DateField()
+    # Vacía para los quizzes mezclados (sin categoría)
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True)
+    points = models.IntegerField(default=0)
+    quizzes = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = "Daily points"
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day', 'category'], name='quizz_daily_user_day_cat_uniq'),
+            # NULL no choca con NULL en un UNIQUE normal
+            models.UniqueConstraint(fields=['user', 'day'], condition=models.Q(category__isnull=True),
+                                    name='quizz_daily_user_day_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['day', 'user'], name='quizz_daily_day_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.day}: {self.points}"
+
+
+class Exam(models.Model):
+    """Examen programado de un Quiz para los alumnos de un grupo"""
+    STATUSES = [
+        ('scheduled', 'Scheduled'),
+        ('open', 'Open'),
+        ('closed', 'Closed'),
+    ]
+
+    quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE, related_name='exams')
+    group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='exams',
+                              help_text="Alumnos inscritos")
+    starts_at = models.DateTimeField()
+    status = models.CharField(max_length=10, choices=STATUSES, default='scheduled')
+    prepared_at = models.DateTimeField(null=True, blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-starts_at']
+        indexes = [
+            models.Index(fields=['status', 'starts_at'], name='quizz_exam_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quiz.title} - {self.group.name} ({self.starts_at:%Y-%m-%d %H:%M})"
+
+
+class ExamDeck(models.Model):
+    """Preguntas sorteadas de antemano para un alumno en un examen, y su entrega"""
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='decks')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='exam_decks')
+    question_ids = models.JSONField(default=list)
+    # Estado del quiz entregado (QuizState codificado); el intento se crea después
+    submission = models.BinaryField(null=True, blank=True, editable=False)
+    submitted_at = models.DateTimeField(null=True, blank=True, editable=False)
+    attempt = models.OneToOneField(QuizAttempt, on_delete=models.SET_NULL, null=True, blank=True,
+                                   related_name='exam_deck')
+
+    class Meta:
+        unique_together = ['exam', 'user']
+        indexes = [
+            # Entregas pendientes de convertir en intento
+            models.Index(fields=['submitted_at'], name='quizz_examdeck_pending_idx',
+                         condition=models.Q(submitted_at__isnull=False, attempt__isnull=True)),
+        ]
+
+    def __str__(self):
+        return f"{self.exam} - {self.user.username}"
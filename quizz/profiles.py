@@ -0,0 +1,42 @@
+"""
+Acceso al perfil del usuario de la petición.
+
+El perfil se crea una sola vez, con la señal post_save de User al
+registrarse; iniciar sesión o guardar el usuario no lo vuelve a escribir.
+Las vistas lo leen con `request.profile` (ProfileMiddleware): una consulta la
+primera vez que se usa en la petición y ninguna después.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.functional import SimpleLazyObject
+
+from .models import UserProfile
+
+
+def get_profile(user):
+    """
+    Perfil del usuario, cacheado en la propia instancia. Solo lo crea si falta
+    (usuarios anteriores a la señal o creados con bulk_create).
+    """
+    try:
+        return user.profile
+    except UserProfile.DoesNotExist:
+        profile, created = UserProfile.objects.get_or_create(user=user)
+        user.profile = profile
+        return profile
+
+
+class ProfileMiddleware:
+    """Añade `request.profile`, que se carga solo si la vista o la plantilla lo usan"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.profile = SimpleLazyObject(
+            lambda: get_profile(request.user) if request.user.is_authenticated else None
+        )
+        return self.get_response(request)
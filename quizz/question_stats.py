@@ -0,0 +1,215 @@
+"""
+Estadísticas por pregunta (QuestionStats) mantenidas de forma incremental.
+
+Cada quiz terminado suma sus respuestas a un búfer del proceso; el búfer se
+vuelca en una sola transacción cuando acumula QUIZZ_QUESTION_STATS_FLUSH_SIZE
+respuestas o han pasado QUIZZ_QUESTION_STATS_FLUSH_SECONDS desde el último
+volcado; un hilo del proceso vuelca lo que quede cuando no llegan más
+respuestas (QUIZZ_QUESTION_STATS_BACKGROUND = False lo desactiva). No se vuelca
+al salir: lo pendiente de un proceso que termina se pierde y `rebuild` lo
+recupera. Nunca se recalcula con GROUP BY sobre QuizResponse, salvo en
+`rebuild` (comando rebuild_question_stats).
+
+El tiempo de respuesta de una pregunta es lo que pasó desde la respuesta
+anterior del mismo intento (o desde el inicio del quiz, QuizAttempt.started_at);
+la mediana se estima sobre un histograma de cubos fijos.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections, transaction, DatabaseError
+
+from .models import Question, QuestionStats, QuizResponse
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = QuestionStats.TIME_BUCKETS
+# Más de esto no es tiempo de respuesta sino una pestaña olvidada
+MAX_ANSWER_SECONDS = 600
+
+
+def answer_times(responses, started_at=None):
+    """
+    Segundos empleados en cada respuesta, o None si no se pueden medir.
+    `responses` son tuplas (question_id, answer_id, is_correct, answered_at).
+    """
+    times = []
+    previous = started_at
+    for _, _, _, answered_at in responses:
+        seconds = None
+        if previous is not None and answered_at is not None:
+            seconds = (answered_at - previous).total_seconds()
+            if not 0 < seconds <= MAX_ANSWER_SECONDS:
+                seconds = None
+        times.append(seconds)
+        previous = answered_at or previous
+    return times
+
+
+def histogram_median(histogram):
+    """Mediana aproximada (interpolación lineal dentro del cubo)"""
+    total = sum(histogram)
+    if not total:
+        return None
+    half = total / 2
+    cumulative = 0
+    for index, count in enumerate(histogram):
+        if count and cumulative + count >= half:
+            low = BUCKETS[index - 1] if index > 0 else 0
+            high = BUCKETS[index] if index < len(BUCKETS) else MAX_ANSWER_SECONDS
+            return low + (high - low) * (half - cumulative) / count
+        cumulative += count
+    return None
+
+
+class _Delta:
+    __slots__ = ('attempts', 'correct', 'answers', 'histogram')
+
+    def __init__(self):
+        self.attempts = 0
+        self.correct = 0
+        self.answers = defaultdict(int)
+        self.histogram = [0] * (len(BUCKETS) + 1)
+
+
+def _accumulate(pending, responses, started_at=None):
+    for (question_id, answer_id, is_correct, _), seconds in zip(responses, answer_times(responses, started_at)):
+        delta = pending[question_id]
+        delta.attempts += 1
+        delta.correct += bool(is_correct)
+        delta.answers[str(answer_id)] += 1
+        if seconds is not None:
+            delta.histogram[bisect_left(BUCKETS, seconds)] += 1
+
+
+def apply_deltas(pending):
+    """Sumar los deltas {question_id: _Delta} a QuestionStats en una transacción"""
+    with transaction.atomic():
+        question_ids = list(Question.objects.filter(pk__in=list(pending)).values_list('pk', flat=True))
+        QuestionStats.objects.bulk_create(
+            [QuestionStats(question_id=pk) for pk in question_ids], ignore_conflicts=True
+        )
+        rows = list(QuestionStats.objects.select_for_update().filter(question_id__in=question_ids))
+        for stats in rows:
+            delta = pending[stats.question_id]
+            stats.attempts += delta.attempts
+            stats.correct += delta.correct
+            for answer_id, count in delta.answers.items():
+                stats.answer_counts[answer_id] = stats.answer_counts.get(answer_id, 0) + count
+            histogram = stats.time_histogram or [0] * (len(BUCKETS) + 1)
+            stats.time_histogram = [a + b for a, b in zip(histogram, delta.histogram)]
+            stats.median_seconds = histogram_median(stats.time_histogram)
+        QuestionStats.objects.bulk_update(rows, [
+            'attempts', 'correct', 'answer_counts', 'time_histogram', 'median_seconds',
+        ])
+        Question.objects.bulk_update(
+            [Question(pk=stats.question_id, difficulty=stats.get_difficulty()) for stats in rows], ['difficulty']
+        )
+    return len(rows)
+
+
+class QuestionStatsBuffer:
+    """Respuestas pendientes de volcar, compartidas por los hilos del proceso"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = defaultdict(_Delta)
+        self._responses = 0
+        self._last_flush = time.monotonic()
+        self._worker = None
+
+    @property
+    def flush_size(self):
+        return getattr(settings, 'QUIZZ_QUESTION_STATS_FLUSH_SIZE', 200)
+
+    @property
+    def flush_seconds(self):
+        return getattr(settings, 'QUIZZ_QUESTION_STATS_FLUSH_SECONDS', 10)
+
+    @property
+    def background(self):
+        return getattr(settings, 'QUIZZ_QUESTION_STATS_BACKGROUND', True)
+
+    def record(self, responses, started_at=None):
+        with self._lock:
+            _accumulate(self._pending, responses, started_at)
+            self._responses += len(responses)
+            due = (self._responses >= self.flush_size
+                   or time.monotonic() - self._last_flush >= self.flush_seconds)
+        if due:
+            self.flush()
+        elif self.background:
+            self._ensure_worker()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(_Delta)
+            self._responses = 0
+            self._last_flush = time.monotonic()
+        if not pending:
+            return 0
+        try:
+            return apply_deltas(pending)
+        except DatabaseError:
+            # Las estadísticas nunca deben tumbar una petición; rebuild las recupera
+            logger.warning("No se pudieron volcar las estadísticas de %d preguntas", len(pending), exc_info=True)
+            return 0
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def discard(self):
+        """Olvidar lo pendiente sin escribirlo (tests)"""
+        with self._lock:
+            self._pending = defaultdict(_Delta)
+            self._responses = 0
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(target=self._run, name='quizz-question-stats', daemon=True)
+            self._worker.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            if not self.pending():
+                continue
+            try:
+                self.flush()
+            finally:
+                connections.close_all()
+
+
+question_stats = QuestionStatsBuffer()
+
+
+def rebuild(batch_size=500):
+    """Recalcular todas las estadísticas desde QuizResponse; devuelve las preguntas escritas"""
+    pending = defaultdict(_Delta)
+    rows = (QuizResponse.objects.order_by('attempt_id', 'answered_at', 'pk')
+            .values_list('attempt_id', 'attempt__started_at', 'question_id', 'selected_answer_id', 'is_correct',
+                         'answered_at'))
+    current, started_at, responses = None, None, []
+    for attempt_id, attempt_started_at, *response in rows.iterator(chunk_size=batch_size):
+        if attempt_id != current:
+            _accumulate(pending, responses, started_at)
+            current, started_at, responses = attempt_id, attempt_started_at, []
+        responses.append(response)
+    _accumulate(pending, responses, started_at)
+
+    question_ids = list(pending)
+    written = 0
+    with transaction.atomic():
+        QuestionStats.objects.all().delete()
+        Question.objects.exclude(difficulty=None).update(difficulty=None)
+        for start in range(0, len(question_ids), batch_size):
+            chunk = question_ids[start:start + batch_size]
+            written += apply_deltas({pk: pending[pk] for pk in chunk})
+    return written
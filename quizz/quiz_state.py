@@ -0,0 +1,192 @@
+"""
+Estado del quiz en curso guardado en la caché, fuera de la sesión.
+
+Antes cada respuesta reescribía la fila de `django_session`; ahora el estado
+es un bloque binario de unos cientos de bytes en la caché (alias
+QUIZZ_QUIZ_STATE_CACHE, con caducidad QUIZZ_QUIZ_STATE_TIMEOUT) y la base
+de datos solo se toca al terminar, con complete_quiz.
+
+Codificación (little-endian):
+
+    cabecera  clave del mazo (16 bytes), user_id, quiz_id y exam_id (0 si
+              no hay), inicio (epoch), puntos, nº de preguntas, nº de respuestas
+    arrays    IDs de las preguntas, IDs de las respuestas elegidas y
+              milisegundos desde el inicio de cada respuesta (uint32)
+    bitmap    un bit por respuesta: 1 si fue correcta
+    cola      categoría jugada (uint32, 0 si no hay); las entregas de examen
+              guardadas con el formato 3 no la tienen y se leen sin categoría
+
+La pregunta actual es el número de respuestas y los aciertos, los bits a 1
+del bitmap. Hay un quiz en curso por usuario; el alias de caché debe ser
+compartido por todos los workers (ver CACHES en config/settings.py).
+"""
+import struct
+import uuid
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .decks import DECK_TIMEOUT, discard_deck
+from .services import complete_quiz
+
+HEADER = struct.Struct('<16sIIIdIHH')
+# Cambia con el formato para no decodificar estados antiguos
+FORMAT_VERSION = 4
+TRAILER = struct.Struct('<I')
+
+
+def _cache():
+    return caches[getattr(settings, 'QUIZZ_QUIZ_STATE_CACHE', 'default')]
+
+
+def state_timeout():
+    return getattr(settings, 'QUIZZ_QUIZ_STATE_TIMEOUT', DECK_TIMEOUT)
+
+
+def state_cache_key(user_id):
+    return f'quizz:state:v{FORMAT_VERSION}:{user_id}'
+
+
+def _pack_ints(values):
+    return struct.pack(f'<{len(values)}I', *values)
+
+
+class QuizState:
+    """Quiz en curso de un usuario"""
+    __slots__ = ('quiz_key', 'user_id', 'quiz_id', 'exam_id', 'category_id', 'started_at', 'score',
+                 'question_ids', 'answer_ids', 'offsets', 'correct')
+
+    def __init__(self, quiz_key, user_id, started_at, question_ids, score=0,
+                 answer_ids=(), offsets=(), correct=0, quiz_id=None, exam_id=None, category_id=None):
+        self.quiz_key = quiz_key
+        self.user_id = user_id
+        self.quiz_id = quiz_id
+        self.exam_id = exam_id
+        self.category_id = category_id
+        self.started_at = started_at
+        self.score = score
+        self.question_ids = list(question_ids)
+        self.answer_ids = list(answer_ids)
+        self.offsets = list(offsets)
+        # Bit i a 1 si la respuesta i fue correcta
+        self.correct = correct
+
+    @property
+    def current_index(self):
+        return len(self.answer_ids)
+
+    @property
+    def total_questions(self):
+        return len(self.question_ids)
+
+    @property
+    def correct_answers(self):
+        return bin(self.correct).count('1')
+
+    @property
+    def finished(self):
+        return self.current_index >= self.total_questions
+
+    def answer(self, answer_id, is_correct, points, answered_at):
+        """Registrar la respuesta a la pregunta actual"""
+        if is_correct:
+            self.correct |= 1 << self.current_index
+            self.score += points
+        self.answer_ids.append(answer_id)
+        self.offsets.append(max(0, round((answered_at - self.started_at) * 1000)))
+
+    def answer_question(self, question_id, answer_id, is_correct, points, answered_at):
+        """
+        Responder cualquier pregunta aún sin responder (la API acepta cualquier
+        orden). Las respondidas quedan al principio de question_ids, así que la
+        pregunta pasa a la posición actual. False si ya tenía respuesta.
+        """
+        try:
+            index = self.question_ids.index(question_id, self.current_index)
+        except ValueError:
+            return False
+        ids = self.question_ids
+        ids[index], ids[self.current_index] = ids[self.current_index], ids[index]
+        self.answer(answer_id, is_correct, points, answered_at)
+        return True
+
+    def responses(self):
+        """Tuplas (question_id, answer_id, is_correct, answered_at epoch) para complete_quiz"""
+        return [
+            (question_id, answer_id, bool(self.correct >> index & 1), self.started_at + offset / 1000)
+            for index, (question_id, answer_id, offset)
+            in enumerate(zip(self.question_ids, self.answer_ids, self.offsets))
+        ]
+
+    def complete(self, user):
+        """Guardar el intento con complete_quiz; devuelve (attempt, profile)"""
+        responses = [
+            (question_id, answer_id, is_correct, datetime.fromtimestamp(answered_at, tz=dt_timezone.utc))
+            for question_id, answer_id, is_correct, answered_at in self.responses()
+        ]
+        started_at = datetime.fromtimestamp(self.started_at, tz=dt_timezone.utc)
+        return complete_quiz(user, self.score, self.correct_answers, self.total_questions, responses, started_at,
+                             quiz_id=self.quiz_id, category_id=self.category_id)
+
+    def encode(self):
+        answered = len(self.answer_ids)
+        return b''.join([
+            HEADER.pack(uuid.UUID(self.quiz_key).bytes, self.user_id, self.quiz_id or 0, self.exam_id or 0,
+                        self.started_at, self.score, len(self.question_ids), answered),
+            _pack_ints(self.question_ids),
+            _pack_ints(self.answer_ids),
+            _pack_ints(self.offsets),
+            self.correct.to_bytes((answered + 7) // 8, 'little'),
+            TRAILER.pack(self.category_id or 0),
+        ])
+
+    @classmethod
+    def decode(cls, data):
+        key, user_id, quiz_id, exam_id, started_at, score, total, answered = HEADER.unpack_from(data)
+        ints = struct.unpack_from(f'<{total + 2 * answered}I', data, HEADER.size)
+        start = HEADER.size + 4 * len(ints)
+        end = start + (answered + 7) // 8
+        bitmap = data[start:end]
+        category_id, = TRAILER.unpack_from(data, end) if len(data) > end else (0,)
+        return cls(
+            uuid.UUID(bytes=key).hex, user_id, started_at, ints[:total], score,
+            answer_ids=ints[total:total + answered],
+            offsets=ints[total + answered:],
+            correct=int.from_bytes(bitmap, 'little'),
+            quiz_id=quiz_id or None,
+            exam_id=exam_id or None,
+            category_id=category_id or None,
+        )
+
+
+def load(user_id):
+    data = _cache().get(state_cache_key(user_id))
+    if data is None:
+        return None
+    state = QuizState.decode(data)
+    return state if state.user_id == user_id else None
+
+
+def save(state):
+    _cache().set(state_cache_key(state.user_id), state.encode(), state_timeout())
+
+
+def discard(user_id):
+    """Borrar el estado; False si ya no existía (otra petición lo cerró)"""
+    return _cache().delete(state_cache_key(user_id))
+
+
+def clear(user_id):
+    """
+    Descartar el quiz en curso del usuario y su mazo. Un examen en curso no se
+    descarta (devuelve False): solo termina al entregarlo.
+    """
+    state = load(user_id)
+    if state is None:
+        return True
+    if state.exam_id:
+        return False
+    discard_deck(state.quiz_key)
+    discard(user_id)
+    return True
@@ -0,0 +1,106 @@
+"""Muestreo aleatorio de preguntas sin ORDER BY RANDOM()"""
+import heapq
+import math
+import random
+
+from django.db.models import Max, Min
+
+from .models import Question
+
+
+class QuestionSampler:
+    """
+    Estrategias de muestreo sobre un queryset de preguntas.
+
+    - uniform: sorteo de IDs dentro del rango [min(id), max(id)] y búsqueda
+      por clave primaria; los huecos se descartan, así que cada fila existente
+      tiene la misma probabilidad. Si el rango es muy disperso se recurre a un
+      muestreo de reservorio sobre los IDs (una pasada, memoria O(k)).
+    - per_category: cuotas por categoría, cada una con `uniform`.
+    - weighted: reservorio ponderado (Efraimidis-Spirakis) en una pasada.
+
+    Todos devuelven una lista de IDs en orden aleatorio.
+    """
+    max_rounds = 6
+    # Límite de parámetros por consulta (SQLite admite 999 en versiones antiguas)
+    max_batch = 900
+
+    def __init__(self, queryset=None):
+        if queryset is None:
+            queryset = Question.objects.filter(is_active=True)
+        self.queryset = queryset.order_by()
+
+    def uniform(self, k, queryset=None):
+        queryset = self.queryset if queryset is None else queryset
+        if k <= 0:
+            return []
+        bounds = queryset.aggregate(low=Min('id'), high=Max('id'))
+        low, high = bounds['low'], bounds['high']
+        if low is None:
+            return []
+
+        span = high - low + 1
+        found = set()
+        tried = set()
+        hit_rate = 1.0
+        for _ in range(self.max_rounds):
+            missing = k - len(found)
+            if missing <= 0 or len(tried) >= span:
+                break
+            draws = min(
+                span - len(tried),
+                self.max_batch,
+                math.ceil(missing / max(hit_rate, 0.05) * 1.5) + 1,
+            )
+            if draws == span - len(tried):
+                candidates = set(range(low, high + 1)) - tried
+            else:
+                candidates = set()
+                while len(candidates) < draws:
+                    pk = random.randint(low, high)
+                    if pk not in tried:
+                        candidates.add(pk)
+            tried |= candidates
+            hits = set(queryset.filter(id__in=candidates).values_list('id', flat=True))
+            found |= hits
+            hit_rate = len(hits) / len(candidates)
+
+        if len(found) < k and len(tried) < span:
+            # Rango muy disperso o pocas filas: una pasada de reservorio sobre los IDs
+            return self._reservoir(queryset.values_list('id', flat=True), k)
+        return random.sample(sorted(found), min(k, len(found)))
+
+    def per_category(self, quotas):
+        """`quotas` es {category_id: k}; devuelve los IDs mezclados"""
+        ids = []
+        for category_id, k in quotas.items():
+            ids.extend(self.uniform(k, self.queryset.filter(category_id=category_id)))
+        random.shuffle(ids)
+        return ids
+
+    def weighted(self, k, weight='points'):
+        """Muestreo sin reemplazo con probabilidad proporcional al campo `weight`"""
+        heap = []
+        rows = self.queryset.filter(**{f'{weight}__gt': 0}).values_list('id', weight)
+        for pk, value in rows.iterator(chunk_size=5000):
+            key = random.random() ** (1.0 / value)
+            if len(heap) < k:
+                heapq.heappush(heap, (key, pk))
+            elif key > heap[0][0]:
+                heapq.heapreplace(heap, (key, pk))
+        ids = [pk for _, pk in heap]
+        random.shuffle(ids)
+        return ids
+
+    @staticmethod
+    def _reservoir(ids, k):
+        sample = []
+        for index, pk in enumerate(ids.iterator(chunk_size=5000)):
+            if index < k:
+                sample.append(pk)
+            else:
+                slot = random.randint(0, index)
+                if slot < k:
+                    sample[slot] = pk
+        random.shuffle(sample)
+        return sample
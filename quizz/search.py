@@ -0,0 +1,329 @@
+"""
+Búsqueda de texto completo para la página de descubrimiento.
+
+Los documentos visibles (quizzes en vivo y categorías) se guardan en tablas
+`quizz_search*` que se mantienen sincronizadas con señales:
+
+- SQLite: tablas virtuales FTS5 con `unicode61 remove_diacritics 2` y ranking bm25.
+- PostgreSQL: columna tsvector (configuración 'spanish' + unaccent) con índice
+  GIN y ranking ts_rank_cd.
+- Otros motores: icontains sobre los modelos, sin ranking.
+
+Las consultas se reducen a palabras (\\w+) con coincidencia por prefijo, así
+que la entrada del usuario nunca llega como sintaxis de FTS.
+"""
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Quiz, Category
+
+TABLE = 'quizz_search'
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TERMS = 8
+# Más allá de este número de coincidencias no se pagina: hay que afinar la búsqueda
+MAX_RESULTS = 1000
+
+# kind -> (modelo, (título, cuerpo) indexados, visible en la búsqueda)
+DOCUMENTS = {
+    'quiz': (Quiz, lambda quiz: (quiz.title, quiz.description), lambda quiz: quiz.is_live),
+    'category': (Category, lambda category: (category.name, category.description), lambda category: True),
+}
+KINDS = list(DOCUMENTS)
+
+
+def terms(query):
+    return TERM_RE.findall(query or '')[:MAX_TERMS]
+
+
+class SearchBackend:
+    """Interfaz común de los motores de búsqueda"""
+
+    def create(self, schema_editor):
+        pass
+
+    def drop(self, schema_editor):
+        pass
+
+    def index(self, kind, pk, title, body):
+        pass
+
+    def remove(self, kind, pk):
+        pass
+
+    def bulk_index(self, rows):
+        """rows: lista de (kind, pk, title, body) sobre un índice vacío"""
+        for row in rows:
+            self.index(*row)
+
+    def clear(self):
+        pass
+
+    def count(self, kind, query):
+        """Coincidencias, como mucho MAX_RESULTS"""
+        raise NotImplementedError
+
+    def search(self, kind, query, offset, limit):
+        """IDs ordenados por relevancia"""
+        raise NotImplementedError
+
+
+class SQLiteSearch(SearchBackend):
+    """
+    Una tabla FTS5 por tipo de documento (quizz_search_quiz, ...) con
+    rowid = pk: actualizar o borrar es una búsqueda por rowid y cada búsqueda
+    recorre sólo las listas de su tipo.
+    """
+
+    @staticmethod
+    def _table(kind):
+        return f'{TABLE}_{kind}'
+
+    def create(self, schema_editor):
+        for kind in KINDS:
+            table = self._table(kind)
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+                "title, body, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+            # El título pesa 10 veces más que el cuerpo en `ORDER BY rank`
+            schema_editor.execute(f"INSERT INTO {table} ({table}, rank) VALUES ('rank', 'bm25(10.0, 1.0)')")
+
+    def drop(self, schema_editor):
+        for kind in KINDS:
+            schema_editor.execute(f'DROP TABLE IF EXISTS {self._table(kind)}')
+
+    def index(self, kind, pk, title, body):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self._table(kind)} WHERE rowid = %s', [pk])
+            cursor.execute(
+                f'INSERT INTO {self._table(kind)} (rowid, title, body) VALUES (%s, %s, %s)', [pk, title, body or '']
+            )
+
+    def bulk_index(self, rows):
+        with connection.cursor() as cursor:
+            for kind in KINDS:
+                cursor.executemany(
+                    f'INSERT INTO {self._table(kind)} (rowid, title, body) VALUES (%s, %s, %s)',
+                    [(pk, title, body or '') for row_kind, pk, title, body in rows if row_kind == kind],
+                )
+
+    def remove(self, kind, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self._table(kind)} WHERE rowid = %s', [pk])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            for kind in KINDS:
+                cursor.execute(f'DELETE FROM {self._table(kind)}')
+
+    @staticmethod
+    def _match(query):
+        # Cada término entre comillas (literal) y con * (prefijo); espacios = AND
+        return ' '.join(f'"{term}"*' for term in terms(query))
+
+    def count(self, kind, query):
+        table = self._table(kind)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM (SELECT 1 FROM {table} WHERE {table} MATCH %s LIMIT %s)',
+                [self._match(query), MAX_RESULTS],
+            )
+            return cursor.fetchone()[0]
+
+    def search(self, kind, query, offset, limit):
+        table = self._table(kind)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM {table} WHERE {table} MATCH %s ORDER BY rank LIMIT %s OFFSET %s',
+                [self._match(query), limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresSearch(SearchBackend):
+    """Una sola tabla con (kind, object_id); object_id es bigint como las claves BigAutoField"""
+
+    DOCUMENT = ("setweight(to_tsvector('spanish', unaccent(%s)), 'A') || "
+                "setweight(to_tsvector('spanish', unaccent(%s)), 'B')")
+
+    def create(self, schema_editor):
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS unaccent')
+        schema_editor.execute(
+            f'CREATE TABLE IF NOT EXISTS {TABLE} ('
+            'kind varchar(20) NOT NULL, object_id bigint NOT NULL, document tsvector NOT NULL, '
+            'PRIMARY KEY (kind, object_id))'
+        )
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {TABLE}_document_idx ON {TABLE} USING GIN (document)')
+
+    def widen(self, schema_editor):
+        """Pasar a bigint el object_id de los índices creados como integer"""
+        schema_editor.execute(f'ALTER TABLE {TABLE} ALTER COLUMN object_id TYPE bigint')
+
+    def drop(self, schema_editor):
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+    def index(self, kind, pk, title, body):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {TABLE} (kind, object_id, document) VALUES (%s, %s, {self.DOCUMENT}) '
+                'ON CONFLICT (kind, object_id) DO UPDATE SET document = EXCLUDED.document',
+                [kind, pk, title, body or ''],
+            )
+
+    def bulk_index(self, rows):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {TABLE} (kind, object_id, document) VALUES (%s, %s, {self.DOCUMENT})',
+                [(kind, pk, title, body or '') for kind, pk, title, body in rows],
+            )
+
+    def remove(self, kind, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE} WHERE kind = %s AND object_id = %s', [kind, pk])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {TABLE}')
+
+    @staticmethod
+    def _tsquery(query):
+        return ' & '.join(f'{term}:*' for term in terms(query))
+
+    def count(self, kind, query):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM (SELECT 1 FROM {TABLE} '
+                "WHERE document @@ to_tsquery('spanish', unaccent(%s)) AND kind = %s LIMIT %s) AS matches",
+                [self._tsquery(query), kind, MAX_RESULTS],
+            )
+            return cursor.fetchone()[0]
+
+    def search(self, kind, query, offset, limit):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT object_id FROM {TABLE}, to_tsquery('spanish', unaccent(%s)) AS q "
+                'WHERE document @@ q AND kind = %s '
+                'ORDER BY ts_rank_cd(document, q) DESC, object_id LIMIT %s OFFSET %s',
+                [self._tsquery(query), kind, limit, offset],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class LikeSearch(SearchBackend):
+    """Respaldo sin índice para motores sin FTS"""
+
+    FIELDS = {'quiz': ('title', 'description'), 'category': ('name', 'description')}
+
+    def _queryset(self, kind, query):
+        queryset = DOCUMENTS[kind][0].objects.all()
+        if kind == 'quiz':
+            queryset = queryset.filter(is_live=True)
+        for term in terms(query):
+            condition = Q()
+            for field in self.FIELDS[kind]:
+                condition |= Q(**{f'{field}__icontains': term})
+            queryset = queryset.filter(condition)
+        return queryset.order_by('pk')
+
+    def count(self, kind, query):
+        return len(self._queryset(kind, query).values_list('pk', flat=True)[:MAX_RESULTS])
+
+    def search(self, kind, query, offset, limit):
+        return list(self._queryset(kind, query).values_list('pk', flat=True)[offset:offset + limit])
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearch,
+    'postgresql': PostgresSearch,
+}
+
+
+def get_backend(vendor=None):
+    return BACKENDS.get(vendor or connection.vendor, LikeSearch)()
+
+
+class SearchResults:
+    """
+    Resultados perezosos para django.core.paginator.Paginator: sólo se
+    consulta el conteo y la página pedida.
+    """
+
+    def __init__(self, kind, query, backend=None):
+        self.kind = kind
+        self.query = query
+        self.backend = backend or get_backend()
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.backend.count(self.kind, self.query) if terms(self.query) else 0
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start, stop = item.start or 0, min(item.stop or MAX_RESULTS, MAX_RESULTS)
+        if start >= stop or not terms(self.query):
+            return []
+        ids = self.backend.search(self.kind, self.query, start, stop - start)
+        model, _, visible = DOCUMENTS[self.kind]
+        objects = model.objects.in_bulk(ids)
+        # El índice puede ir por detrás de un UPDATE que no emitió señales
+        return [objects[pk] for pk in ids if pk in objects and visible(objects[pk])]
+
+
+def search(kind, query):
+    return SearchResults(kind, query)
+
+
+def _document(kind, instance):
+    _, fields, _ = DOCUMENTS[kind]
+    title, body = fields(instance)
+    return kind, instance.pk, title, body
+
+
+def index_instance(kind, instance):
+    """Indexar el documento, o quitarlo si ya no debe aparecer en la búsqueda"""
+    if DOCUMENTS[kind][2](instance):
+        get_backend().index(*_document(kind, instance))
+    else:
+        get_backend().remove(kind, instance.pk)
+
+
+def remove_instance(kind, pk):
+    get_backend().remove(kind, pk)
+
+
+def reindex(kind, pk):
+    """Reindexar por clave tras un queryset.update() (que no emite post_save)"""
+    instance = DOCUMENTS[kind][0].objects.filter(pk=pk).first()
+    if instance is None:
+        remove_instance(kind, pk)
+    else:
+        index_instance(kind, instance)
+
+
+def rebuild(batch_size=2000):
+    """Reconstruir el índice completo desde los modelos; devuelve los documentos indexados"""
+    backend = get_backend()
+    backend.clear()
+    total = 0
+    for kind, (model, _, visible) in DOCUMENTS.items():
+        batch = []
+        for instance in model.objects.order_by('pk').iterator(chunk_size=batch_size):
+            if not visible(instance):
+                continue
+            batch.append(_document(kind, instance))
+            if len(batch) >= batch_size:
+                backend.bulk_index(batch)
+                total += len(batch)
+                batch = []
+        backend.bulk_index(batch)
+        total += len(batch)
+    return total
@@ -0,0 +1,66 @@
+"""Operaciones de escritura compartidas por las vistas"""
+from django.db import transaction
+from django.db.models import F
+
+from .badges import check_and_award_badges
+from .indexes import rank_index
+from .models import UserProfile, QuizAttempt, QuizResponse
+from .question_stats import question_stats
+from . import user_stats
+
+
+def complete_quiz(user, score, correct_answers, total_questions, responses=(), started_at=None, quiz_id=None,
+                  category_id=None):
+    """
+    Registrar un quiz terminado en una sola transacción corta.
+
+    Inserta el intento y sus respuestas, incrementa los contadores del perfil
+    y el resumen UserStats con F() (sin leer-modificar-escribir), otorga
+    insignias y, al confirmar, publica el nuevo total en el índice de ranking.
+
+    `responses` son tuplas (question_id, answer_id, is_correct, answered_at);
+    al confirmar también se suman a las estadísticas por pregunta (`started_at`
+    permite medir el tiempo de la primera respuesta). `quiz_id` enlaza el
+    intento con el Quiz jugado y `category_id` con la categoría jugada (None
+    para los quizzes al azar).
+    Devuelve (attempt, profile) con los contadores ya actualizados.
+    """
+    responses = list(responses)
+    with transaction.atomic():
+        attempt = QuizAttempt.objects.create(
+            user=user,
+            quiz_id=quiz_id,
+            category_id=category_id,
+            started_at=started_at,
+            score=score,
+            correct_answers=correct_answers,
+            total_questions=total_questions,
+        )
+        QuizResponse.objects.bulk_create([
+            QuizResponse(
+                attempt=attempt,
+                question_id=question_id,
+                selected_answer_id=answer_id,
+                is_correct=is_correct,
+                answered_at=answered_at,
+            )
+            for question_id, answer_id, is_correct, answered_at in responses
+        ])
+
+        counters = {
+            'total_points': F('total_points') + score,
+            'quizzes_played': F('quizzes_played') + 1,
+        }
+        if not UserProfile.objects.filter(user=user).update(**counters):
+            UserProfile.objects.get_or_create(user=user)
+            UserProfile.objects.filter(user=user).update(**counters)
+        profile = UserProfile.objects.get(user=user)
+        user_stats.record(user.pk, score, correct_answers, total_questions)
+
+        check_and_award_badges(user, profile)
+
+        user_id, total_points = user.pk, profile.total_points
+        transaction.on_commit(lambda: rank_index.record(user_id, total_points))
+        if responses:
+            transaction.on_commit(lambda: question_stats.record(responses, started_at))
+    return attempt, profile
@@ -1,7 +1,11 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile
+from .models import UserProfile, Question, Answer, QuizAttempt, Badge, Quiz, Category, Friend, Exam
+from .indexes import question_pool, rank_index
+from . import daily_points, exams, friends, leaderboards, search
+from .badges import badge_engine
 
 
 @receiver(post_save, sender=User)
@@ -11,8 +15,112 @@ def create_user_profile(sender, instance, created, **kwargs):
         UserProfile.objects.create(user=instance)
 
 
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    """Guardar perfil cuando se guarda el usuario"""
-    if hasattr(instance, 'profile'):
-        instance.profile.save()
+@receiver(post_save, sender=UserProfile)
+def refresh_rank_index(sender, instance, **kwargs):
+    """Registrar los puntos confirmados del perfil en el índice de ranking"""
+    user_id, points = instance.user_id, instance.total_points
+    transaction.on_commit(lambda: rank_index.record(user_id, points))
+
+
+@receiver(post_delete, sender=UserProfile)
+def remove_from_rank_index(sender, instance, **kwargs):
+    """Quitar el perfil eliminado del índice de ranking"""
+    user_id = instance.user_id
+    transaction.on_commit(lambda: rank_index.remove(user_id))
+
+
+@receiver(post_save, sender=Question)
+def refresh_question_pool(sender, instance, **kwargs):
+    """Actualizar el pool de preguntas cuando se guarda una pregunta"""
+    transaction.on_commit(lambda: question_pool.refresh_question(
+        instance.pk, instance.category_id, instance.is_active
+    ))
+
+
+@receiver(post_delete, sender=Question)
+def remove_from_question_pool(sender, instance, **kwargs):
+    """Quitar la pregunta del pool cuando se elimina"""
+    pk = instance.pk
+    transaction.on_commit(lambda: question_pool.remove_question(pk))
+
+
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+def refresh_question_answers(sender, instance, **kwargs):
+    """
+    Republicar la pregunta al añadir, editar o borrar sus respuestas (descarta
+    los mazos que la contienen; la primera respuesta la vuelve jugable)
+    """
+    question_id = instance.question_id
+
+    def publish():
+        row = Question.objects.filter(pk=question_id).values_list('category_id', 'is_active').first()
+        if row is not None:
+            question_pool.refresh_question(question_id, *row)
+    transaction.on_commit(publish)
+
+
+@receiver(post_save, sender=QuizAttempt)
+def update_leaderboards(sender, instance, created, **kwargs):
+    """Sumar el intento a las clasificaciones semanal y mensual"""
+    if created:
+        leaderboards.record_attempt(instance)
+
+
+@receiver(post_save, sender=QuizAttempt)
+def update_daily_points(sender, instance, created, **kwargs):
+    """Sumar el intento a los puntos diarios del usuario"""
+    if created:
+        daily_points.record_attempt(instance)
+
+
+@receiver(post_save, sender=QuizAttempt)
+def refresh_friends_leaderboards(sender, instance, created, **kwargs):
+    """Invalidar las clasificaciones de amigos en las que aparece el jugador"""
+    if created:
+        user_id = instance.user_id
+        transaction.on_commit(lambda: friends.invalidate_followers(user_id))
+
+
+@receiver(post_save, sender=Friend)
+@receiver(post_delete, sender=Friend)
+def refresh_own_friends_leaderboard(sender, instance, **kwargs):
+    """Invalidar la clasificación de amigos del usuario al cambiar su lista"""
+    user_id = instance.user_id
+    transaction.on_commit(lambda: friends.invalidate(user_id))
+
+
+@receiver(post_save, sender=Badge)
+@receiver(post_delete, sender=Badge)
+def reload_badge_thresholds(sender, **kwargs):
+    """Recargar los umbrales de insignias en todos los procesos"""
+    transaction.on_commit(badge_engine.invalidate)
+
+
+@receiver(post_save, sender=Quiz)
+def index_quiz(sender, instance, **kwargs):
+    """Indexar el quiz para la búsqueda (en la misma transacción)"""
+    search.index_instance('quiz', instance)
+
+
+@receiver(post_delete, sender=Quiz)
+def unindex_quiz(sender, instance, **kwargs):
+    search.remove_instance('quiz', instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def index_category(sender, instance, **kwargs):
+    """Indexar la categoría para la búsqueda"""
+    search.index_instance('category', instance)
+
+
+@receiver(post_delete, sender=Category)
+def unindex_category(sender, instance, **kwargs):
+    search.remove_instance('category', instance.pk)
+
+
+@receiver(post_save, sender=Exam)
+def prepare_exam_decks(sender, instance, created, **kwargs):
+    """Preparar los mazos de todos los alumnos en cuanto se programa el examen"""
+    if created:
+        transaction.on_commit(lambda: exams.prepare(instance))
@@ -0,0 +1,34 @@
+"""
+Runner de tests del proyecto (TEST_RUNNER en settings).
+
+Los tests no deben escribir fuera de la base de datos de pruebas: usan una
+caché en memoria propia (vaciarla no toca la de un servidor de desarrollo
+con redis o memcached), se desactivan los hilos en segundo plano (también
+la reserva de mazos: DeckPoolTests la activa con QUIZZ_DECK_POOL_SIZE) y lo
+que quede en los búferes del proceso se descarta al terminar.
+"""
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+from .question_stats import question_stats
+
+
+class QuizzTestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._settings = override_settings(
+            CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'quizz-tests',
+                'OPTIONS': {'MAX_ENTRIES': 100000},
+            }},
+            QUIZZ_QUESTION_STATS_BACKGROUND=False,
+            QUIZZ_DECK_POOL_SIZE=0,
+        )
+        self._settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        question_stats.discard()
+        self._settings.disable()
+        super().teardown_test_environment(**kwargs)
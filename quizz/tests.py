@@ -1,3 +1,1322 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from io import StringIO
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+from django.contrib.auth.models import Group, User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import daily_points, exams, exports, friends, leaderboards, live, quiz_state, search, user_stats
+from .badges import badge_engine
+from .deck_pool import DeckPool
+from .decks import deck_cache_key
+from .importers import QuestionImporter, read_csv, read_jsonl
+from .management.commands import bench_start_quiz
+from .management.commands._bench import seed_questions, seed_users
+from .indexes import RankIndex, question_pool, rank_index
+from .models import (
+    Badge, UserBadge, UserProfile, QuizAttempt, Question, Answer, Category, Friend, Quiz, DailyPoints, Exam,
+    LeaderboardEntry, LiveAnswerTally, QuestionStats, UserStats,
+)
+from .metrics import MetricsMiddleware
+from .profiles import ProfileMiddleware, get_profile
+from .question_stats import answer_times, histogram_median, question_stats, rebuild as rebuild_question_stats
+from .quiz_state import QuizState
+from .sampling import QuestionSampler
+from .services import complete_quiz
+
+
+class CompleteQuizConcurrencyTests(TransactionTestCase):
+    """Varios trabajadores terminando quizzes a la vez no pierden puntos"""
+
+    workers = 8
+    completions = 40
+
+    def setUp(self):
+        self.user = User.objects.create_user('alumno')
+        Badge.objects.create(name='Primer Quiz', description='', badge_type='beginner', requirement=1)
+        Badge.objects.create(name='Experto', description='', badge_type='expert', requirement=100)
+        rank_index.invalidate()
+
+    def _complete(self, score):
+        try:
+            return complete_quiz(self.user, score, score // 10, 20)
+        finally:
+            connection.close()
+
+    def test_parallel_completions_keep_every_increment(self):
+        scores = [10 * (i % 5) for i in range(self.completions)]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(self._complete, scores))
+
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual(profile.total_points, sum(scores))
+        self.assertEqual(profile.quizzes_played, self.completions)
+        self.assertEqual(QuizAttempt.objects.filter(user=self.user).count(), self.completions)
+        self.assertEqual(UserBadge.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(rank_index.verify(), [])
+        self.assertEqual(daily_points.window_totals(self.user.pk, 7), (sum(scores), self.completions))
+        self.assertEqual(daily_points.verify(), [])
+
+
+class BadgeEngineTests(TestCase):
+    """Las insignias se otorgan al cruzar cada umbral, una sola vez por usuario"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alumno')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.beginner = Badge.objects.create(name='Primer Quiz', description='', badge_type='beginner', requirement=1)
+            self.veteran = Badge.objects.create(name='Veterano', description='', badge_type='beginner', requirement=3)
+            self.intermediate = Badge.objects.create(name='Intermedio', description='', badge_type='intermediate', requirement=100)
+            self.expert = Badge.objects.create(name='Experto', description='', badge_type='expert', requirement=200)
+            Badge.objects.create(name='Especial', description='', badge_type='special', requirement=0)
+
+    def tearDown(self):
+        # Las insignias desaparecen con el rollback: que nadie herede sus umbrales
+        badge_engine.invalidate()
+
+    def earned(self, user=None):
+        return set(UserBadge.objects.filter(user=user or self.user).values_list('badge_id', flat=True))
+
+    def test_awarded_at_each_threshold(self):
+        steps = [
+            (99, {self.beginner.id}),
+            (1, {self.intermediate.id}),
+            (100, {self.veteran.id, self.expert.id}),
+        ]
+        earned = set()
+        for score, new_badges in steps:
+            _, profile = complete_quiz(self.user, score, 1, 5)
+            earned |= new_badges
+            self.assertEqual(self.earned(), earned, score)
+            # complete_quiz ya las otorgó: reevaluar no añade nada
+            self.assertEqual(badge_engine.evaluate(self.user, profile), set())
+
+    def test_no_duplicate_awards(self):
+        profile = self.user.profile
+        profile.quizzes_played, profile.total_points = 3, 150
+        self.assertEqual(badge_engine.evaluate(self.user, profile), {self.beginner.id, self.veteran.id, self.intermediate.id})
+        self.assertEqual(badge_engine.evaluate(self.user, profile), set())
+        self.assertEqual(badge_engine.reevaluate_all(), 0)
+        self.assertEqual(UserBadge.objects.filter(user=self.user).count(), 3)
+
+    def test_reevaluate_badges_command(self):
+        others = [User.objects.create_user(f'alumno{i}') for i in range(3)]
+        UserProfile.objects.filter(user__in=others).update(quizzes_played=5, total_points=120)
+        UserProfile.objects.filter(user=self.user).update(quizzes_played=1, total_points=10)
+
+        out = StringIO()
+        call_command('reevaluate_badges', batch_size=2, stdout=out)
+        self.assertIn('Insignias otorgadas: 10', out.getvalue())
+        self.assertEqual(self.earned(), {self.beginner.id})
+        for user in others:
+            self.assertEqual(self.earned(user), {self.beginner.id, self.veteran.id, self.intermediate.id})
+
+        # Un badge nuevo se otorga a quien ya cumplía el umbral, sin repetir los demás
+        with self.captureOnCommitCallbacks(execute=True):
+            dedicated = Badge.objects.create(name='Constante', description='', badge_type='beginner', requirement=5)
+        out = StringIO()
+        call_command('reevaluate_badges', stdout=out)
+        self.assertIn('Insignias otorgadas: 3', out.getvalue())
+        self.assertTrue(all(dedicated.id in self.earned(user) for user in others))
+
+
+class RankIndexSyncTests(TestCase):
+    """Cada worker tiene su índice; se sincronizan por la caché compartida y por tiempo"""
+
+    def setUp(self):
+        cache.clear()
+        self.users = [User.objects.create_user(f'alumno{points}') for points in (100, 50, 10)]
+        for user, points in zip(self.users, (100, 50, 10)):
+            UserProfile.objects.filter(user=user).update(total_points=points)
+
+    def test_changes_from_another_worker_are_replayed(self):
+        worker_a, worker_b = RankIndex(), RankIndex()
+        self.assertEqual(worker_a.rank(60), 2)
+        UserProfile.objects.filter(user=self.users[2]).update(total_points=80)
+        worker_b.record(self.users[2].pk, 80)
+        self.assertEqual(worker_a.rank(60), 3)
+
+    @override_settings(QUIZZ_INDEX_RESYNC_SECONDS=60)
+    def test_lost_changes_are_recovered_by_the_periodic_resync(self):
+        worker = RankIndex()
+        self.assertEqual(worker.rank(60), 2)
+        # Un cambio que nunca se publicó (p. ej. un incr perdido)
+        UserProfile.objects.filter(user=self.users[2]).update(total_points=80)
+        self.assertEqual(worker.rank(60), 2)
+        worker._loaded_at -= 60
+        self.assertEqual(worker.rank(60), 3)
+
+    def test_check_command_inspects_the_worker_index(self):
+        metrics_dir = tempfile.mkdtemp(prefix='quizz-test-metrics-')
+        self.addCleanup(shutil.rmtree, metrics_dir, ignore_errors=True)
+        with override_settings(QUIZZ_METRICS_DIR=metrics_dir):
+            rank_index.invalidate()
+            rank_index.rank(0)
+            call_command('check_rank_index', stdout=StringIO())
+
+            UserProfile.objects.filter(user=self.users[2]).update(total_points=80)
+            with self.assertRaises(CommandError):
+                call_command('check_rank_index', stdout=StringIO())
+
+
+class MetricsTests(TestCase):
+    """El middleware mide cada vista y /metrics/ suma los archivos de todos los workers"""
+
+    # Mayor que pid_max: ningún proceso vivo tiene este PID
+    DEAD_PID = 4194305
+
+    def setUp(self):
+        self.metrics_dir = tempfile.mkdtemp(prefix='quizz-test-metrics-')
+        self.addCleanup(shutil.rmtree, self.metrics_dir, ignore_errors=True)
+        settings_override = override_settings(QUIZZ_METRICS_DIR=self.metrics_dir, QUIZZ_METRICS_TOKEN='secreto')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def write_worker(self, pid, counters=(), gauges=()):
+        with open(os.path.join(self.metrics_dir, f'metrics-{pid}.json'), 'w') as fh:
+            json.dump({'counters': list(counters), 'gauges': list(gauges), 'histograms': []}, fh)
+
+    def scrape(self, **headers):
+        response = self.client.get(reverse('metrics'), headers=headers or {'authorization': 'Bearer secreto'})
+        self.assertEqual(response.status_code, 200)
+        return response.content.decode()
+
+    def test_requests_are_measured_per_view(self):
+        self.client.force_login(User.objects.create_user('alumno'))
+        self.client.get(reverse('leaderboard'))
+        text = self.scrape()
+        self.assertRegex(text, r'quizz_requests_total\{status="2xx",view="leaderboard"\} \d+')
+        self.assertRegex(text, r'quizz_sql_queries_total\{view="leaderboard"\} [1-9]')
+        self.assertRegex(text, r'quizz_request_duration_seconds_bucket\{view="leaderboard",le="\+Inf"\} [1-9]')
+        self.assertIn('# TYPE quizz_request_duration_seconds histogram', text)
+
+    def test_workers_are_summed_and_dead_gauges_dropped(self):
+        labels = {'status': '2xx', 'view': 'otra_vista'}
+        self.write_worker(os.getppid(), counters=[['quizz_requests_total', labels, 3]],
+                          gauges=[['quizz_rank_index_users', {'pid': str(os.getppid())}, 7]])
+        self.write_worker(self.DEAD_PID, counters=[['quizz_requests_total', labels, 2]],
+                          gauges=[['quizz_rank_index_users', {'pid': str(self.DEAD_PID)}, 9]])
+        text = self.scrape()
+        self.assertIn('quizz_requests_total{status="2xx",view="otra_vista"} 5', text)
+        self.assertIn(f'quizz_rank_index_users{{pid="{os.getppid()}"}} 7', text)
+        self.assertNotIn(f'pid="{self.DEAD_PID}"', text)
+
+    def test_dead_workers_are_archived(self):
+        labels = {'status': '2xx', 'view': 'otra_vista'}
+        for pid, value in ((self.DEAD_PID, 2), (self.DEAD_PID + 1, 4)):
+            self.write_worker(pid, counters=[['quizz_requests_total', labels, value]])
+        self.assertIn('quizz_requests_total{status="2xx",view="otra_vista"} 6', self.scrape())
+        self.assertFalse(os.path.exists(os.path.join(self.metrics_dir, f'metrics-{self.DEAD_PID}.json')))
+        self.assertFalse(os.path.exists(os.path.join(self.metrics_dir, f'metrics-{self.DEAD_PID + 1}.json')))
+
+        # Los totales no retroceden: el archivo común conserva lo de los muertos
+        self.write_worker(self.DEAD_PID, counters=[['quizz_requests_total', labels, 1]])
+        self.assertIn('quizz_requests_total{status="2xx",view="otra_vista"} 7', self.scrape())
+        self.assertIn('quizz_requests_total{status="2xx",view="otra_vista"} 7', self.scrape())
+
+    def test_endpoint_is_restricted(self):
+        url = reverse('metrics')
+        # Ni siquiera desde localhost sin lista de IPs explícita
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(url, headers={'authorization': 'Bearer otro'}).status_code, 403)
+        with override_settings(QUIZZ_METRICS_TOKEN=''):
+            self.assertEqual(self.client.get(url, headers={'authorization': 'Bearer '}).status_code, 403)
+        with override_settings(QUIZZ_METRICS_ALLOWED_IPS=['127.0.0.1']):
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.force_login(User.objects.create_user('admin', is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN es propio de SQLite')
+class HotQueryPlanTests(TestCase):
+    """Las consultas calientes deben resolverse con índice, nunca con un recorrido completo"""
+
+    # "SCAN tabla" sin "USING ... INDEX" es un recorrido completo de la tabla
+    FULL_SCAN = re.compile(r'^SCAN (\w+)$')
+
+    def assertUsesIndex(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = [row[-1] for row in cursor.fetchall()]
+        scans = [detail for detail in plan if self.FULL_SCAN.match(detail)]
+        self.assertFalse(scans, f'Recorrido completo en {sql!r}: {plan}')
+
+    def test_hot_queries_use_indexes(self):
+        user = User.objects.create_user('alumno')
+        since = timezone.now() - timezone.timedelta(days=7)
+        hot_queries = {
+            'puntos semanales': QuizAttempt.objects.filter(user=user, completed_at__gte=since).values('score'),
+            'quizzes ganados': QuizAttempt.objects.filter(user=user, correct_answers__gte=14),
+            'ranking': UserProfile.objects.filter(total_points__gt=100).values('id'),
+            'top global': UserProfile.objects.order_by('-total_points')[:10],
+            'preguntas activas': Question.objects.filter(is_active=True).values_list('id', 'category_id'),
+            'amigos': Friend.objects.filter(user=user).values('friend_id'),
+            'quizzes en vivo': Quiz.objects.filter(is_live=True),
+            'preguntas por dificultad': Question.objects.order_by('-difficulty')[:100],
+            'intentos por quiz': QuizAttempt.objects.filter(quiz_id=1).values('score'),
+            'ventana diaria': DailyPoints.objects.filter(user=user, day__gte=since.date()).values('points'),
+            'top de la ventana': DailyPoints.objects.filter(day__gte=since.date()).values('user_id', 'points'),
+        }
+        for name, queryset in hot_queries.items():
+            with self.subTest(name):
+                self.assertUsesIndex(queryset)
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'Índice FTS5 de SQLite')
+class SQLiteSearchTests(TestCase):
+    """La búsqueda ignora tildes, busca por prefijo y sigue a los modelos con las señales"""
+
+    def setUp(self):
+        teacher = User.objects.create_user('docente')
+        self.algebra = Quiz.objects.create(title='Álgebra básica', description='Ecuaciones lineales',
+                                           created_by=teacher, is_live=True)
+        self.review = Quiz.objects.create(title='Repaso general', description='Incluye algebra y geometría',
+                                          created_by=teacher, is_live=True)
+        self.draft = Quiz.objects.create(title='Álgebra avanzada', created_by=teacher)
+
+    def found(self, kind, query):
+        return [document.pk for document in search.search(kind, query)[:10]]
+
+    def test_accents_prefixes_and_title_weight(self):
+        self.assertEqual(self.found('quiz', 'algebra'), [self.algebra.pk, self.review.pk])
+        self.assertEqual(self.found('quiz', 'ÁLGE lin'), [self.algebra.pk])
+        self.assertEqual(search.search('quiz', 'algebra').count(), 2)
+        # La sintaxis de FTS5 del usuario se reduce a palabras
+        self.assertEqual(self.found('quiz', '"algebra"* -('), [self.algebra.pk, self.review.pk])
+        self.assertEqual(self.found('quiz', '***'), [])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.draft.is_live = True
+        self.draft.save()
+        self.assertIn(self.draft.pk, self.found('quiz', 'avanzada'))
+        self.algebra.is_live = False
+        self.algebra.save()
+        self.review.delete()
+        self.assertEqual(self.found('quiz', 'algebra'), [self.draft.pk])
+
+        Category.objects.create(name='Geografía', description='Capitales')
+        self.assertEqual(len(self.found('category', 'geografia')), 1)
+        self.assertEqual(search.rebuild(), 2)
+        self.assertEqual(self.found('quiz', 'algebra'), [self.draft.pk])
+
+    def test_live_rooms_reindex_the_quiz(self):
+        live.set_live(self.draft.pk, True)
+        self.assertIn(self.draft.pk, self.found('quiz', 'avanzada'))
+        live.set_live(self.algebra.pk, False)
+        self.assertEqual(self.found('quiz', 'algebra'), [self.draft.pk, self.review.pk])
+        # Un UPDATE sin señales deja el documento, pero la búsqueda no lo muestra
+        Quiz.objects.filter(pk=self.review.pk).update(is_live=False)
+        self.assertEqual(self.found('quiz', 'algebra'), [self.draft.pk])
+
+
+class FriendsLeaderboardTests(TestCase):
+    """La clasificación de amigos sale de una consulta y se invalida al jugar o cambiar de amigos"""
+
+    def setUp(self):
+        cache.clear()
+        self.user, self.ana, self.luis = (User.objects.create_user(name) for name in ('alumno', 'ana', 'luis'))
+        Friend.objects.create(user=self.user, friend=self.ana)
+        UserProfile.objects.filter(user=self.ana).update(total_points=50)
+
+    def ranking(self, period='alltime'):
+        return [(member.user.username, member.points) for member in friends.leaderboard(self.user, period)]
+
+    def test_single_query_then_cached(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.ranking(), [('ana', 50), ('alumno', 0)])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.ranking('weekly'), [('alumno', 0), ('ana', 0)])
+        with self.assertNumQueries(0):
+            self.ranking()
+            self.ranking('weekly')
+
+    def test_invalidated_when_a_friend_plays_or_friends_change(self):
+        self.ranking('weekly')
+        with self.captureOnCommitCallbacks(execute=True):
+            complete_quiz(self.ana, 30, 3, 20)
+        self.assertEqual(self.ranking('weekly'), [('ana', 30), ('alumno', 0)])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Friend.objects.create(user=self.user, friend=self.luis)
+        self.assertEqual(self.ranking(), [('ana', 80), ('alumno', 0), ('luis', 0)])
+
+
+class LeaderboardTests(TestCase):
+    """Clasificaciones por semana y mes de calendario, con purga al escribir"""
+
+    def setUp(self):
+        leaderboards._pruned_buckets.clear()
+        self.ana, self.luis = (User.objects.create_user(name) for name in ('ana', 'luis'))
+        # Miércoles 14 de octubre de 2026; su semana empieza el lunes 12
+        self.now = timezone.make_aware(timezone.datetime(2026, 10, 14, 12))
+
+    def entries(self, period):
+        return list(
+            LeaderboardEntry.objects.filter(period=period)
+            .order_by('bucket', 'user__username')
+            .values_list('bucket', 'user__username', 'points', 'quizzes')
+        )
+
+    def test_buckets_are_calendar_weeks_and_months(self):
+        monday = timezone.datetime(2026, 10, 12).date()
+        for days in range(7):
+            self.assertEqual(leaderboards.bucket_start('weekly', monday + timezone.timedelta(days=days)), monday)
+        next_monday = monday + timezone.timedelta(weeks=1)
+        self.assertEqual(leaderboards.bucket_start('weekly', next_monday), next_monday)
+        self.assertEqual(leaderboards.bucket_start('monthly', self.now), monday.replace(day=1))
+
+    def test_record_attempt_top_and_standing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            complete_quiz(self.ana, 30, 3, 5)
+            complete_quiz(self.ana, 10, 1, 5)
+            complete_quiz(self.luis, 50, 5, 5)
+        for period in leaderboards.PERIODS:
+            self.assertEqual(
+                [(entry.user.username, entry.points, entry.quizzes) for entry in leaderboards.top(period)],
+                [('luis', 50, 1), ('ana', 40, 2)],
+            )
+            self.assertEqual(leaderboards.standing(period, self.ana), (40, 2))
+        self.assertEqual(self.ana.profile.get_weekly_points(), 40)
+        self.assertEqual(self.ana.profile.get_monthly_quizzes(), 2)
+
+        previous_week = timezone.now() - timezone.timedelta(weeks=1)
+        self.assertEqual(list(leaderboards.top('weekly', when=previous_week)), [])
+        self.assertEqual(leaderboards.standing('weekly', self.ana, previous_week), (0, 1))
+
+    def test_prune_keeps_recent_buckets(self):
+        for weeks in range(10):
+            leaderboards.add_points(self.ana.id, 1, self.now - timezone.timedelta(weeks=weeks))
+        self.assertEqual(leaderboards.prune(self.now), 2)
+        weekly = self.entries('weekly')
+        self.assertEqual(len(weekly), leaderboards.KEEP_BUCKETS['weekly'])
+        self.assertEqual(weekly[0][0], leaderboards.bucket_start('weekly', self.now - timezone.timedelta(weeks=7)))
+        self.assertEqual(leaderboards.prune(self.now), 0)
+
+    def test_first_write_of_a_new_bucket_prunes(self):
+        stale = leaderboards.bucket_start('weekly') - timezone.timedelta(weeks=20)
+        LeaderboardEntry.objects.create(period='weekly', bucket=stale, user=self.luis, points=5, quizzes=1)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            leaderboards.add_points(self.ana.id, 10)
+        self.assertFalse(LeaderboardEntry.objects.filter(bucket=stale).exists())
+        self.assertEqual(len(callbacks), 1)
+
+        # Las escrituras siguientes del mismo periodo no vuelven a purgar
+        with self.captureOnCommitCallbacks() as callbacks:
+            leaderboards.add_points(self.luis.id, 10)
+            leaderboards.add_points(self.ana.id, 10)
+        self.assertEqual(callbacks, [])
+
+    def test_rebuild_from_attempts(self):
+        for user, score, weeks in ((self.ana, 30, 0), (self.ana, 20, 1), (self.luis, 40, 0), (self.luis, 5, 12)):
+            attempt, _ = complete_quiz(user, score, 1, 5)
+            QuizAttempt.objects.filter(pk=attempt.pk).update(completed_at=self.now - timezone.timedelta(weeks=weeks))
+
+        self.assertEqual(leaderboards.rebuild(self.now), 7)
+        week, month = (leaderboards.bucket_start(period, self.now) for period in leaderboards.PERIODS)
+        self.assertEqual(self.entries('weekly'), [
+            (week - timezone.timedelta(weeks=1), 'ana', 20, 1),
+            (week, 'ana', 30, 1),
+            (week, 'luis', 40, 1),
+        ])
+        self.assertEqual(self.entries('monthly'), [
+            (month.replace(month=7), 'luis', 5, 1),
+            (month, 'ana', 50, 2),
+            (month, 'luis', 40, 1),
+        ])
+
+
+class ProfileQueryTests(TestCase):
+    """Iniciar sesión, registrarse y ver páginas no repiten lecturas ni escrituras del perfil"""
+
+    PROFILE_LOOKUP = re.compile(r'^SELECT .* FROM "quizz_userprofile" .*WHERE "quizz_userprofile"\."user_id" = ')
+    PROFILE_WRITE = re.compile(r'^(INSERT INTO|UPDATE) "quizz_userprofile"')
+
+    def setUp(self):
+        self.user = User.objects.create_user('alumno', password='clave-segura-123')
+
+    def profile_queries(self, queries, pattern):
+        return [query['sql'] for query in queries.captured_queries if pattern.match(query['sql'])]
+
+    def test_login_does_not_touch_the_profile(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('login'), {'username': 'alumno', 'password': 'clave-segura-123'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual([query['sql'] for query in queries.captured_queries if 'quizz_userprofile' in query['sql']], [])
+
+    def test_registration_creates_the_profile_once(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('register'), {
+                'username': 'nuevo', 'password1': 'clave-segura-123', 'password2': 'clave-segura-123',
+            })
+        self.assertEqual(response.status_code, 302)
+        writes = self.profile_queries(queries, self.PROFILE_WRITE)
+        self.assertEqual(len(writes), 1, writes)
+        self.assertTrue(writes[0].startswith('INSERT'))
+        self.assertTrue(UserProfile.objects.filter(user__username='nuevo').exists())
+
+    def test_pages_load_the_profile_once_without_writes(self):
+        self.client.force_login(self.user)
+        rank_index.invalidate()
+        self.client.get(reverse('leaderboard') + '?tab=alltime')
+        for url in ('home', 'leaderboard', 'profile'):
+            for query in ('', '?tab=alltime'):
+                with self.subTest(url=url, query=query), CaptureQueriesContext(connection) as queries:
+                    self.assertEqual(self.client.get(reverse(url) + query).status_code, 200)
+                    self.assertEqual(self.profile_queries(queries, self.PROFILE_WRITE), [])
+                    # La pestaña semanal ni siquiera necesita el perfil
+                    self.assertLessEqual(len(self.profile_queries(queries, self.PROFILE_LOOKUP)), 1)
+
+    def test_stats_window_reads_the_daily_points(self):
+        complete_quiz(self.user, 30, 3, 5)
+        complete_quiz(self.user, 20, 2, 5)
+        DailyPoints.objects.create(user=self.user, day=timezone.localdate() - timezone.timedelta(days=40),
+                                   points=100, quizzes=4)
+        self.client.force_login(self.user)
+        for window, expected in (('7', (50, 2)), ('90', (150, 6)), ('x', (50, 2))):
+            with self.subTest(window=window), CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse('profile') + f'?window={window}')
+                self.assertEqual((response.context['window_points'], response.context['window_quizzes']), expected)
+                self.assertEqual(len([q for q in queries.captured_queries if 'quizz_quizattempt' in q['sql']]), 0)
+
+    def test_accessor_is_cached_per_request(self):
+        request = RequestFactory().get('/')
+        request.user = User.objects.get(pk=self.user.pk)
+        ProfileMiddleware(lambda request: None)(request)
+        with self.assertNumQueries(1):
+            self.assertEqual(request.profile.user_id, self.user.pk)
+            self.assertEqual(request.profile.total_points, 0)
+            self.assertEqual(get_profile(request.user).pk, request.profile.pk)
+
+
+class UserStatsTests(TestCase):
+    """El resumen incremental de UserStats coincide con el reconstruido desde los intentos"""
+
+    FIELDS = ('best_score', 'wins', 'correct_answers', 'questions_answered', 'current_streak', 'best_streak',
+              'last_played_on')
+
+    def setUp(self):
+        self.users = [User.objects.create_user(f'alumno{number}') for number in range(2)]
+        start = timezone.make_aware(timezone.datetime(2026, 9, 29, 12))
+        # (usuario, día desde el 29/09, puntaje, aciertos de 20)
+        self.plays = [(0, 0, 100, 15), (0, 0, 40, 5), (0, 1, 120, 14), (0, 3, 80, 10), (1, 2, 60, 20)]
+        for user, day, score, correct in self.plays:
+            when = start + timezone.timedelta(days=day)
+            attempt = QuizAttempt.objects.create(user=self.users[user], score=score, correct_answers=correct,
+                                                 total_questions=20)
+            QuizAttempt.objects.filter(pk=attempt.pk).update(completed_at=when)
+            user_stats.record(self.users[user].pk, score, correct, 20, when=when)
+
+    def snapshot(self):
+        return {stats.user_id: tuple(getattr(stats, field) for field in self.FIELDS)
+                for stats in UserStats.objects.all()}
+
+    def test_record_tracks_wins_and_streaks(self):
+        stats = UserStats.objects.get(user=self.users[0])
+        self.assertEqual((stats.best_score, stats.wins), (120, 2))
+        self.assertEqual((stats.correct_answers, stats.questions_answered), (44, 80))
+        self.assertAlmostEqual(stats.get_accuracy(), 55)
+        # 29/09, 29/09, 30/09 y 02/10: racha de 2 cortada
+        self.assertEqual((stats.current_streak, stats.best_streak), (1, 2))
+        self.assertEqual(stats.get_current_streak(today=stats.last_played_on + timezone.timedelta(days=1)), 1)
+        self.assertEqual(stats.get_current_streak(today=stats.last_played_on + timezone.timedelta(days=2)), 0)
+
+    def test_rebuild_matches_the_incremental_rows(self):
+        incremental = self.snapshot()
+        self.assertEqual(user_stats.rebuild(batch_size=1), 2)
+        self.assertEqual(self.snapshot(), incremental)
+
+        UserStats.objects.filter(user=self.users[1]).update(wins=0)
+        call_command('backfill_user_stats', stdout=StringIO())
+        self.assertEqual(self.snapshot(), incremental)
+
+
+class QuizStateTests(TestCase):
+    """El quiz en curso vive en la caché: responder no escribe en la base de datos"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alumno')
+        self.category = Category.objects.create(name='Historia')
+        for number in range(3):
+            question = Question.objects.create(category=self.category, question_text=f'Pregunta {number}', points=10)
+            Answer.objects.create(question=question, answer_text='Sí', is_correct=True)
+            Answer.objects.create(question=question, answer_text='No', is_correct=False)
+        question_pool.invalidate()
+
+    def test_compact_encoding_round_trip(self):
+        state = QuizState('0' * 32, 7, 1000.0, [3, 1, 2], quiz_id=5, category_id=4)
+        state.answer(11, True, 10, 1001.5)
+        state.answer(12, False, 0, 1003.25)
+        data = state.encode()
+        # Cabecera, 3 preguntas + 2 respuestas + 2 tiempos en uint32, un byte de bitmap y la categoría
+        self.assertEqual(len(data), 44 + 4 * 7 + 1 + 4)
+        decoded = QuizState.decode(data)
+        self.assertEqual((decoded.score, decoded.correct_answers, decoded.current_index), (10, 1, 2))
+        self.assertEqual((decoded.quiz_id, decoded.category_id), (5, 4))
+        self.assertEqual(decoded.responses(), [(3, 11, True, 1001.5), (1, 12, False, 1003.25)])
+        # Las entregas guardadas con el formato anterior no llevan categoría
+        legacy = QuizState.decode(data[:-4])
+        self.assertEqual((legacy.category_id, legacy.correct_answers), (None, 1))
+
+    def test_answers_do_not_write_the_session(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('start_quiz'))
+        for _ in range(3):
+            question = self.client.get(reverse('play_quiz')).context['question']
+            correct = next(answer for answer in question.answers if answer.is_correct)
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.client.post(reverse('play_quiz'), {'answer': correct.id}).status_code, 302)
+            writes = [query['sql'] for query in queries.captured_queries
+                      if not query['sql'].startswith('SELECT')]
+            self.assertEqual(writes, [])
+
+        self.assertEqual(self.client.get(reverse('quiz_results')).status_code, 200)
+        attempt = QuizAttempt.objects.get(user=self.user)
+        self.assertEqual((attempt.score, attempt.correct_answers, attempt.total_questions), (30, 3, 3))
+        self.assertEqual(attempt.responses.count(), 3)
+        # El estado se descartó: volver a los resultados no duplica el intento
+        self.assertRedirects(self.client.get(reverse('quiz_results')), reverse('home'), fetch_redirect_response=False)
+
+    def test_quiz_scoped_play_links_the_attempt(self):
+        other = Category.objects.create(name='Arte')
+        question = Question.objects.create(category=other, question_text='Otra', points=5)
+        Answer.objects.create(question=question, answer_text='Sí', is_correct=True)
+        question_pool.invalidate()
+        quiz = Quiz.objects.create(title='Historia', category=self.category, created_by=self.user, total_questions=2)
+
+        self.client.force_login(self.user)
+        self.client.get(reverse('start_quiz_for', args=[quiz.pk]))
+        for _ in range(2):
+            question = self.client.get(reverse('play_quiz')).context['question']
+            self.assertTrue(Question.objects.filter(pk=question.id, category=self.category).exists())
+            self.client.post(reverse('play_quiz'), {'answer': question.answers[0].id})
+        self.client.get(reverse('quiz_results'))
+        attempt = QuizAttempt.objects.get(user=self.user)
+        self.assertEqual((attempt.quiz, attempt.category, attempt.total_questions), (quiz, self.category, 2))
+
+    def test_category_scoped_play_keeps_the_category(self):
+        self.client.force_login(self.user)
+        self.client.get(reverse('start_category_quiz', args=[self.category.pk]))
+        self.assertEqual(quiz_state.load(self.user.pk).category_id, self.category.pk)
+        for _ in range(3):
+            question = self.client.get(reverse('play_quiz')).context['question']
+            self.client.post(reverse('play_quiz'), {'answer': question.answers[0].id})
+        self.client.get(reverse('quiz_results'))
+        attempt = QuizAttempt.objects.get(user=self.user)
+        self.assertEqual((attempt.quiz, attempt.category), (None, self.category))
+        self.assertEqual(DailyPoints.objects.get(user=self.user).category, self.category)
+        # Sumar el intento a su día no consulta la categoría: un solo UPDATE
+        with self.assertNumQueries(1):
+            daily_points.record_attempt(attempt)
+
+    def test_category_without_questions_shows_no_questions(self):
+        empty = Category.objects.create(name='Vacía')
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('start_category_quiz', args=[empty.pk]))
+        self.assertTemplateUsed(response, 'quizz/no_questions.html')
+
+
+class PlayApiTests(TestCase):
+    """La API acepta lotes en cualquier orden y guarda las respuestas en el estado del quiz"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('alumno')
+        category = Category.objects.create(name='Historia')
+        for number in range(3):
+            question = Question.objects.create(category=category, question_text=f'Pregunta {number}', points=10)
+            Answer.objects.create(question=question, answer_text='Sí', is_correct=True)
+            Answer.objects.create(question=question, answer_text='No', is_correct=False)
+        question_pool.invalidate()
+        self.client.force_login(self.user)
+
+    def submit(self, quiz_key, answers, finish=False):
+        return self.client.post(reverse('api_submit_answers', args=[quiz_key]),
+                                {'answers': answers, 'finish': finish}, content_type='application/json')
+
+    def test_batched_answers_are_graded_once(self):
+        data = self.client.post(reverse('api_start_quiz')).json()
+        self.assertNotIn('is_correct', str(data['questions']))
+        right = {q['id']: Answer.objects.get(question_id=q['id'], is_correct=True).id for q in data['questions']}
+        first, *rest = reversed(list(right))
+
+        result = self.submit(data['quiz_key'], [{'question': first, 'answer': right[first]},
+                                                {'question': first, 'answer': right[first] + 1},
+                                                {'question': 0, 'answer': 1}]).json()
+        self.assertEqual((result['accepted'], len(result['rejected']), result['answered']), (1, 1, 1))
+        self.assertFalse(QuizAttempt.objects.exists())
+
+        result = self.submit(data['quiz_key'], [{'question': pk, 'answer': right[pk]} for pk in rest]).json()
+        self.assertTrue(result['finished'])
+        self.assertEqual((result['score'], result['correct_answers'], result['total_questions']), (30, 3, 3))
+        attempt = QuizAttempt.objects.get(user=self.user)
+        self.assertEqual(attempt.responses.filter(is_correct=True).count(), 3)
+        self.assertEqual(self.submit(data['quiz_key'], [], finish=True).status_code, 404)
+
+    def test_finish_grades_unanswered_questions_as_wrong(self):
+        data = self.client.post(reverse('api_start_quiz')).json()
+        question = data['questions'][0]['id']
+        answer = Answer.objects.get(question_id=question, is_correct=True).id
+        result = self.submit(data['quiz_key'], [{'question': question, 'answer': answer}], finish=True).json()
+        self.assertEqual((result['correct_answers'], result['total_questions']), (1, 3))
+
+    def test_restart_discards_the_previous_deck_but_not_an_exam(self):
+        first = self.client.post(reverse('api_start_quiz')).json()['quiz_key']
+        self.assertIsNotNone(cache.get(deck_cache_key(first)))
+        second = self.client.post(reverse('api_start_quiz')).json()['quiz_key']
+        self.assertIsNone(cache.get(deck_cache_key(first)))
+
+        state = quiz_state.load(self.user.pk)
+        state.exam_id = 1
+        quiz_state.save(state)
+        self.assertEqual(self.client.post(reverse('api_start_quiz')).status_code, 409)
+        self.assertEqual(quiz_state.load(self.user.pk).quiz_key, second)
+        self.assertIsNotNone(cache.get(deck_cache_key(second)))
+
+    def test_malformed_answers_are_rejected(self):
+        data = self.client.post(reverse('api_start_quiz')).json()
+        question = data['questions'][0]['id']
+        for answers in ([{'question': [question], 'answer': 1}], [{'question': question, 'answer': {}}],
+                        [{'question': str(question), 'answer': 1}], ['x'], {'question': question}):
+            with self.subTest(answers=answers):
+                self.assertEqual(self.submit(data['quiz_key'], answers).status_code, 400)
+        self.assertEqual(quiz_state.load(self.user.pk).current_index, 0)
+
+    def test_other_users_cannot_submit(self):
+        data = self.client.post(reverse('api_start_quiz')).json()
+        self.client.force_login(User.objects.create_user('otro'))
+        self.assertEqual(self.submit(data['quiz_key'], [], finish=True).status_code, 404)
+
+
+def worker_cache(location, backend='filebased.FileBasedCache'):
+    """Configuración de caché de un worker; cada override crea instancias nuevas"""
+    return override_settings(CACHES={'default': {
+        'BACKEND': f'django.core.cache.backends.{backend}',
+        'LOCATION': location,
+    }})
+
+
+class SharedCacheTests(TestCase):
+    """Cada petición del quiz puede caer en un worker distinto"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('alumno')
+        category = Category.objects.create(name='Historia')
+        for number in range(3):
+            question = Question.objects.create(category=category, question_text=f'Pregunta {number}', points=10)
+            Answer.objects.create(question=question, answer_text='Sí', is_correct=True)
+        question_pool.invalidate()
+        self.client.force_login(self.user)
+        self.cache_dir = tempfile.mkdtemp(prefix='quizz-test-cache-')
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+
+    def play_alternating(self, workers):
+        """
+        start → 3 respuestas → resultados, alternando las peticiones entre dos
+        workers; False si algún worker no encuentra el quiz en curso
+        """
+        workers = iter(workers * 10)
+        with next(workers)():
+            self.client.get(reverse('start_quiz'))
+        for _ in range(3):
+            with next(workers)():
+                page = self.client.get(reverse('play_quiz'))
+            if page.status_code != 200:
+                return False
+            with next(workers)():
+                self.client.post(reverse('play_quiz'), {'answer': page.context['question'].answers[0].id})
+        with next(workers)():
+            self.last = self.client.get(reverse('quiz_results'))
+        return self.last.status_code == 200
+
+    def test_quiz_survives_switching_workers(self):
+        self.assertTrue(self.play_alternating([lambda: worker_cache(self.cache_dir)] * 2))
+        self.assertTemplateUsed(self.last, 'quizz/quiz_results.html')
+        attempt = QuizAttempt.objects.get(user=self.user)
+        self.assertEqual((attempt.correct_answers, attempt.total_questions), (3, 3))
+
+    def test_per_process_cache_loses_the_quiz(self):
+        workers = [lambda: worker_cache('a', 'locmem.LocMemCache'), lambda: worker_cache('b', 'locmem.LocMemCache')]
+        self.assertFalse(self.play_alternating(workers))
+        self.assertFalse(QuizAttempt.objects.exists())
+
+
+@override_settings(QUIZZ_QUESTION_STATS_FLUSH_SIZE=1000, QUIZZ_QUESTION_STATS_FLUSH_SECONDS=3600)
+class QuestionStatsTests(TestCase):
+    """Las estadísticas se acumulan por lotes y rebuild llega a los mismos números"""
+
+    def setUp(self):
+        question_stats.discard()
+        self.addCleanup(question_stats.discard)
+        self.user = User.objects.create_user('alumno')
+        category = Category.objects.create(name='Historia')
+        self.questions = []
+        for number in range(2):
+            question = Question.objects.create(category=category, question_text=f'Pregunta {number}', points=10)
+            question.right = Answer.objects.create(question=question, answer_text='Sí', is_correct=True)
+            question.wrong = Answer.objects.create(question=question, answer_text='No', is_correct=False)
+            self.questions.append(question)
+        self.start = timezone.now()
+
+    def play(self, seconds, correct):
+        """Responder las dos preguntas tardando `seconds` en cada una"""
+        responses, answered_at = [], self.start
+        for question, wait, is_correct in zip(self.questions, seconds, correct):
+            answered_at += timezone.timedelta(seconds=wait)
+            answer = question.right if is_correct else question.wrong
+            responses.append((question.pk, answer.pk, is_correct, answered_at))
+        with self.captureOnCommitCallbacks(execute=True):
+            complete_quiz(self.user, 10, sum(correct), 2, responses, self.start)
+
+    def snapshot(self):
+        return {stats.question_id: (stats.attempts, stats.correct, stats.answer_counts, stats.time_histogram,
+                                    stats.median_seconds, stats.question.difficulty)
+                for stats in QuestionStats.objects.select_related('question')}
+
+    def test_answer_times_and_median(self):
+        answered = [(1, 1, True, self.start + timezone.timedelta(seconds=seconds)) for seconds in (4, 4, 700, 710)]
+        self.assertEqual(answer_times(answered, self.start), [4, None, None, 10])
+        self.assertEqual(answer_times(answered[:1]), [None])
+        histogram = [0] * (len(QuestionStats.TIME_BUCKETS) + 1)
+        histogram[3] = 4  # 3-5 s
+        self.assertEqual(histogram_median(histogram), 4)
+        self.assertIsNone(histogram_median([0] * len(histogram)))
+
+    def test_buffer_flushes_at_the_size_threshold(self):
+        self.play([2, 4], [True, False])
+        self.assertEqual(question_stats.pending(), 2)
+        self.assertFalse(QuestionStats.objects.exists())
+        with override_settings(QUIZZ_QUESTION_STATS_FLUSH_SIZE=4):
+            self.play([2, 20], [True, True])
+        self.assertEqual(question_stats.pending(), 0)
+
+        first, second = (QuestionStats.objects.get(question=question) for question in self.questions)
+        self.assertEqual((first.attempts, first.correct), (2, 2))
+        self.assertEqual(first.answer_counts, {str(self.questions[0].right.pk): 2})
+        self.assertEqual((second.attempts, second.correct), (2, 1))
+        self.assertEqual(first.median_seconds, 1.5)
+        self.assertEqual(Question.objects.get(pk=self.questions[1].pk).difficulty, 0.5)
+
+    def test_rebuild_matches_the_incremental_numbers(self):
+        self.play([2, 4], [True, False])
+        self.play([7, 40], [False, False])
+        self.play([1, 3], [True, True])
+        question_stats.flush()
+        incremental = self.snapshot()
+        self.assertEqual(rebuild_question_stats(), 2)
+        self.assertEqual(self.snapshot(), incremental)
+
+
+class QuestionSamplerTests(TestCase):
+    """El muestreo no usa ORDER BY RANDOM() y respeta el queryset, las cuotas y los pesos"""
+
+    def setUp(self):
+        self.categories = [Category.objects.create(name=name) for name in ('Historia', 'Arte')]
+        self.questions = [
+            Question.objects.create(category=self.categories[number % 2], question_text=f'Pregunta {number}',
+                                    points=number % 3)
+            for number in range(30)
+        ]
+        Question.objects.filter(pk=self.questions[0].pk).update(is_active=False)
+        self.active = set(Question.objects.filter(is_active=True).values_list('id', flat=True))
+
+    def test_no_query_orders_at_random(self):
+        with CaptureQueriesContext(connection) as queries:
+            list(Question.objects.all())
+            QuestionSampler().uniform(5)
+            QuestionSampler().weighted(5)
+        self.assertFalse([query['sql'] for query in queries if 'RANDOM()' in query['sql'].upper()])
+
+    def test_uniform_returns_distinct_active_ids(self):
+        sample = QuestionSampler().uniform(10)
+        self.assertEqual(len(sample), 10)
+        self.assertEqual(len(set(sample)), 10)
+        self.assertLessEqual(set(sample), self.active)
+        self.assertEqual(sorted(QuestionSampler().uniform(100)), sorted(self.active))
+        self.assertEqual(QuestionSampler().uniform(0), [])
+
+    def test_sparse_ids_fall_back_to_the_reservoir(self):
+        keep = self.questions[1], self.questions[-1]
+        Question.objects.exclude(pk__in=[question.pk for question in keep]).delete()
+        sampler = QuestionSampler()
+        # Una sola ronda de sorteo no basta para encontrar 2 IDs entre ~30
+        sampler.max_rounds = 1
+        sampler.max_batch = 1
+        self.assertEqual(sorted(sampler.uniform(2)), [question.pk for question in keep])
+
+    def test_per_category_quotas_and_weights(self):
+        history, art = self.categories
+        sample = QuestionSampler().per_category({history.pk: 3, art.pk: 2})
+        categories = dict(Question.objects.filter(pk__in=sample).values_list('id', 'category_id'))
+        self.assertEqual(sorted(categories.values()), [history.pk] * 3 + [art.pk] * 2)
+
+        weighted = QuestionSampler().weighted(8)
+        self.assertEqual(len(set(weighted)), 8)
+        # Peso 0 nunca sale
+        self.assertFalse(Question.objects.filter(pk__in=weighted, points=0).exists())
+        self.assertEqual(len(QuestionSampler().weighted(100)), 20)
+
+
+@override_settings(QUIZZ_DECK_POOL_SIZE=4)
+class DeckPoolTests(TestCase):
+    """Los mazos se sacan sin consultas y se descartan al cambiar sus preguntas"""
+
+    def setUp(self):
+        category = Category.objects.create(name='Historia')
+        for number in range(6):
+            question = Question.objects.create(category=category, question_text=f'Pregunta {number}', points=10)
+            Answer.objects.create(question=question, answer_text='Sí', is_correct=True)
+        question_pool.invalidate()
+        self.pool = DeckPool(deck_size=2, background=False)
+        question_pool.subscribe(self.pool.discard_question)
+        self.addCleanup(question_pool._listeners.remove, self.pool.discard_question)
+
+    def test_pop_uses_prebuilt_decks(self):
+        self.assertEqual(self.pool.refill(), 4)
+        with self.assertNumQueries(0):
+            deck = self.pool.pop()
+        self.assertEqual(len(deck), 2)
+        self.assertEqual(len(self.pool), 3)
+
+    def test_editing_a_question_discards_its_decks(self):
+        self.pool.refill()
+        question = Question.objects.get(pk=self.pool._buckets[None, 2][0][0].id)
+        containing = sum(question.pk in {q.id for q in deck} for deck in self.pool._buckets[None, 2])
+        question.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            question.save()
+        self.assertGreater(containing, 0)
+        self.assertEqual(len(self.pool), 4 - containing)
+        self.pool.refill()
+        self.assertFalse(any(question.pk in {q.id for q in deck} for deck in self.pool._buckets[None, 2]))
+
+    def test_adding_an_answer_republishes_the_question(self):
+        self.pool.refill()
+        question = self.pool._buckets[None, 2][0][0]
+        with self.captureOnCommitCallbacks(execute=True):
+            Answer.objects.create(question_id=question.id, answer_text='No', is_correct=False)
+        # Ningún mazo de la reserva sirve ya la pregunta con una sola respuesta
+        self.assertFalse(any(question.id in {q.id for q in deck} for deck in self.pool._buckets[None, 2]))
+
+    def test_first_answer_makes_the_question_playable(self):
+        category = Category.objects.create(name='Arte')
+        Answer.objects.create(question=Question.objects.create(category=category, question_text='Con respuesta'),
+                              answer_text='Sí', is_correct=True)
+        with self.captureOnCommitCallbacks(execute=True):
+            question = Question.objects.create(category=category, question_text='Sin respuestas')
+        self.assertEqual(len(self.pool.pop(category.pk)), 1)
+        self.pool.refill()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Answer.objects.create(question=question, answer_text='Sí', is_correct=True)
+        self.assertEqual(len(self.pool._buckets[category.pk, 2]), 0)
+        self.pool.refill()
+        self.assertEqual(len(self.pool.pop(category.pk)), 2)
+
+    def test_answer_changes_republish_the_question(self):
+        republished = []
+
+        def listener(pk):
+            # None es una recarga completa del pool, no el aviso de una pregunta
+            if pk is not None:
+                republished.append(pk)
+        # Los cambios se avisan al aplicarse sobre el pool ya cargado
+        self.assertEqual(question_pool.count(), 6)
+        question_pool.subscribe(listener)
+        self.addCleanup(question_pool._listeners.remove, listener)
+        question = Question.objects.first()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            answer = Answer.objects.create(question=question, answer_text='No', is_correct=False)
+        self.assertEqual(republished, [question.pk])
+        answer.answer_text = 'Tampoco'
+        with self.captureOnCommitCallbacks(execute=True):
+            answer.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            answer.delete()
+        self.assertEqual(republished, [question.pk] * 3)
+
+        # Se republica con su estado actual: una pregunta desactivada sigue fuera del pool
+        Question.objects.filter(pk=question.pk).update(is_active=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            Answer.objects.create(question=question, answer_text='No', is_correct=False)
+        self.assertEqual(republished, [question.pk] * 4)
+        self.assertNotIn(question.pk, question_pool.sample(question_pool.count() + 1))
+
+
+class BenchStartQuizTests(TestCase):
+    """El benchmark de start_quiz siembra preguntas jugables y falla si no se empieza un quiz"""
+
+    def setUp(self):
+        self.client.force_login(seed_users(1)[0])
+
+    def test_seeded_questions_start_a_quiz(self):
+        categories = seed_questions(30, categories=3, answers=4, batch_size=7)
+        self.assertEqual(len(categories), 3)
+        self.assertEqual(Answer.objects.count(), 4 * 30)
+        self.assertEqual(Answer.objects.filter(is_correct=True).count(), 30)
+        question_pool.invalidate()
+        response = bench_start_quiz.start_quiz(self.client)
+        self.assertRedirects(response, reverse('play_quiz'), fetch_redirect_response=False)
+        self.assertEqual(quiz_state.load(response.wsgi_request.user.pk).total_questions, 20)
+
+    def test_questions_without_answers_fail_the_benchmark(self):
+        # Así medía antes la página "sin preguntas" en lugar de un inicio de quiz
+        seed_questions(30, answers=0)
+        question_pool.invalidate()
+        with self.assertRaisesMessage(CommandError, 'start_quiz no empezó un quiz (HTTP 200)'):
+            bench_start_quiz.start_quiz(self.client)
+
+
+class QuestionImportTests(TestCase):
+    """Las marcas de correcta se interpretan, no se convierten con bool()"""
+
+    JSONL = '\n'.join(json.dumps(row) for row in [
+        {'category': 'Historia', 'text': '¿Año 1821?', 'answers': [
+            {'text': 'Sí', 'correct': 'true'}, {'text': 'No', 'correct': 'false'}]},
+        {'category': 'Historia', 'text': '¿Capital?', 'answers': [
+            {'text': 'Lima', 'correct': 'Sí'}, {'text': 'Cusco', 'correct': '0'}, {'text': 'Quito', 'correct': 'no'}]},
+        {'category': 'historia', 'text': '¿año  1821?', 'answers': [
+            {'text': 'Sí', 'correct': 1}, {'text': 'No', 'correct': 0}]},
+        {'category': 'Historia', 'text': '¿Ambiguo?', 'answers': [
+            {'text': 'A', 'correct': 'quizás'}, {'text': 'B', 'correct': False}]},
+        {'category': 'Historia', 'text': '¿Sin correcta?', 'answers': [
+            {'text': 'A', 'correct': 'false'}, {'text': 'B', 'correct': 'no'}]},
+    ])
+
+    def import_rows(self, rows):
+        errors = []
+        stats = QuestionImporter(batch_size=2, on_error=lambda line, error: errors.append((line, str(error)))).run(rows)
+        return stats, errors
+
+    def correct_answers(self, text):
+        return list(Answer.objects.filter(question__question_text=text, is_correct=True)
+                    .values_list('answer_text', flat=True))
+
+    def test_jsonl_flags_are_parsed_and_unknown_values_rejected(self):
+        stats, errors = self.import_rows(read_jsonl(StringIO(self.JSONL)))
+        self.assertEqual(stats, {'rows': 5, 'created': 2, 'duplicates': 1, 'invalid': 2})
+        self.assertEqual(self.correct_answers('¿Año 1821?'), ['Sí'])
+        self.assertEqual(self.correct_answers('¿Capital?'), ['Lima'])
+        self.assertEqual([line for line, _ in errors], [4, 5])
+        self.assertIn("'quizás'", errors[0][1])
+
+    def test_csv_marks_the_correct_position(self):
+        rows = ('category,text,points,correct,answer1,answer2,answer3\n'
+                'Arte,¿Autor?,20,2,Dalí,Picasso,Miró\n'
+                'Arte,¿Sin marca?,10,x,A,B,\n')
+        stats, errors = self.import_rows(read_csv(StringIO(rows)))
+        self.assertEqual((stats['created'], stats['invalid']), (1, 1))
+        self.assertEqual(self.correct_answers('¿Autor?'), ['Picasso'])
+        self.assertEqual(Question.objects.get().points, 20)
+
+    def test_command_reports_invalid_lines(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl', delete=False, encoding='utf-8') as fh:
+            fh.write(self.JSONL)
+        self.addCleanup(os.remove, fh.name)
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_questions', fh.name, stdout=stdout, stderr=stderr)
+        self.assertIn('Preguntas creadas: 2', stdout.getvalue())
+        self.assertIn('Línea 4:', stderr.getvalue())
+
+
+class ExportTests(TestCase):
+    """Los exports se filtran por fecha, categoría y grupo y se leen por páginas"""
+
+    def setUp(self):
+        self.staff = User.objects.create_user('admin', is_staff=True)
+        self.students = [User.objects.create_user(f'alumno{number}') for number in range(2)]
+        Group.objects.create(name='Sección A').user_set.add(self.students[0])
+        self.categories = [Category.objects.create(name=name) for name in ('Historia', 'Arte')]
+        answers = []
+        for category in self.categories:
+            question = Question.objects.create(category=category, question_text=f'¿{category.name}?', points=10)
+            answers.append(Answer.objects.create(question=question, answer_text='Sí', is_correct=True))
+        now = timezone.now()
+        plays = [(self.students[0], answers[0], 2), (self.students[0], answers[1], 1), (self.students[1], answers[0], 0)]
+        self.attempts = []
+        for user, answer, days_ago in plays:
+            attempt, _ = complete_quiz(user, 10, 1, 1, [(answer.question_id, answer.pk, True, now)],
+                                       category_id=answer.question.category_id)
+            QuizAttempt.objects.filter(pk=attempt.pk).update(completed_at=now - timezone.timedelta(days=days_ago))
+            self.attempts.append(attempt)
+        self.today = timezone.localdate()
+
+    def export(self, dataset, **params):
+        self.client.force_login(self.staff)
+        return self.client.get(reverse('export_results', args=[dataset]), params)
+
+    def test_csv_filters_by_day_category_and_group(self):
+        response = self.export('attempts', **{'from': str(self.today - timezone.timedelta(days=1))})
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0][:2], ['attempt_id', 'username'])
+        self.assertEqual([int(row[0]) for row in rows[1:]], [self.attempts[1].pk, self.attempts[2].pk])
+
+        response = self.export('attempts', category=self.categories[0].pk, group='Sección A')
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual([(int(row[0]), row[3]) for row in rows[1:]], [(self.attempts[0].pk, 'Historia')])
+
+    def test_attempts_without_responses_keep_their_category(self):
+        attempt, _ = complete_quiz(self.students[1], 0, 0, 5, category_id=self.categories[1].pk)
+        queryset = exports.build_queryset('attempts', category=self.categories[1].pk)
+        self.assertEqual(list(queryset.order_by('pk').values_list('pk', flat=True)), [self.attempts[1].pk, attempt.pk])
+
+    def test_invalid_filters_and_non_staff_are_rejected(self):
+        self.assertEqual(self.export('attempts', **{'from': '18/10/2026'}).status_code, 400)
+        self.assertEqual(self.export('attempts', format='xml').status_code, 400)
+        self.assertEqual(self.export('votes').status_code, 400)
+        self.client.force_login(self.students[0])
+        self.assertEqual(self.client.get(reverse('export_results', args=['attempts'])).status_code, 302)
+
+    def test_command_writes_jsonl_in_pages(self):
+        stdout = StringIO()
+        call_command('export_results', 'responses', format='jsonl', category=self.categories[1].pk, stdout=stdout)
+        rows = [json.loads(line) for line in stdout.getvalue().splitlines()]
+        self.assertEqual([(row['username'], row['category'], row['is_correct']) for row in rows],
+                         [('alumno0', 'Arte', True)])
+
+        queryset = exports.build_queryset('attempts')
+        with CaptureQueriesContext(connection) as queries:
+            ids = [row[0] for row in exports.iter_rows(queryset, ['id'], page_size=2, chunk_size=1)]
+        self.assertEqual(ids, [attempt.pk for attempt in self.attempts])
+        self.assertEqual(len(queries), 2)
+
+
+@override_settings(QUIZZ_EXAM_QUEUE_SIZE=0)
+class ExamTests(TestCase):
+    """Los mazos del examen se preparan al programarlo; empezar no consulta tablas del quiz"""
+
+    def setUp(self):
+        cache.clear()
+        self.teacher = User.objects.create_user('docente')
+        self.students = [User.objects.create_user(f'alumno{number}') for number in range(2)]
+        group = Group.objects.create(name='Sección A')
+        group.user_set.add(*self.students)
+        category = Category.objects.create(name='Historia')
+        for number in range(4):
+            question = Question.objects.create(category=category, question_text=f'Pregunta {number}', points=10)
+            Answer.objects.create(question=question, answer_text='Sí', is_correct=True)
+        question_pool.invalidate()
+        self.quiz = Quiz.objects.create(title='Parcial', category=category, created_by=self.teacher,
+                                        total_questions=3)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.exam = Exam.objects.create(quiz=self.quiz, group=group, starts_at=timezone.now())
+        self.start_url = reverse('start_exam', args=[self.exam.pk])
+
+    def play_exam(self, user):
+        self.client.force_login(user)
+        self.client.get(self.start_url)
+        for _ in range(3):
+            question = self.client.get(reverse('play_quiz')).context['question']
+            self.client.post(reverse('play_quiz'), {'answer': question.answers[0].id})
+        return self.client.get(reverse('quiz_results'))
+
+    def test_start_after_open_reads_only_the_cache(self):
+        self.assertEqual(self.exam.decks.count(), 2)
+        self.client.force_login(self.students[0])
+        response = self.client.get(self.start_url)
+        self.assertEqual(response.context['status'], 'scheduled')
+
+        self.assertTrue(exams.open_exam(self.exam.pk))
+        # El estado recién abierto lo lee (y cachea) la primera petición de la clase
+        self.assertEqual(exams.exam_header(self.exam.pk), (self.quiz.pk, self.quiz.category_id, 'open'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.start_url)
+        self.assertRedirects(response, reverse('play_quiz'), fetch_redirect_response=False)
+        self.assertFalse([query['sql'] for query in queries.captured_queries if 'quizz_' in query['sql']])
+
+        self.client.force_login(self.teacher)
+        self.assertEqual(self.client.get(self.start_url).context['status'], 'unavailable')
+
+    def test_submission_links_the_attempt_and_blocks_a_restart(self):
+        exams.open_exam(self.exam.pk)
+        response = self.play_exam(self.students[0])
+        self.assertTemplateUsed(response, 'quizz/exam_submitted.html')
+        self.assertEqual(response.context['correct_answers'], 3)
+
+        deck = self.exam.decks.get(user=self.students[0])
+        self.assertEqual((deck.attempt.quiz, deck.attempt.score), (self.quiz, 30))
+        self.assertEqual(self.client.get(self.start_url).context['status'], 'unavailable')
+
+    def test_leaving_an_exam_resumes_it(self):
+        exams.open_exam(self.exam.pk)
+        student = self.students[0]
+        self.client.force_login(student)
+        self.client.get(self.start_url)
+        question = self.client.get(reverse('play_quiz')).context['question']
+        self.client.post(reverse('play_quiz'), {'answer': question.answers[0].id})
+        started = quiz_state.load(student.pk)
+
+        self.assertRedirects(self.client.get(reverse('start_quiz')), reverse('play_quiz'))
+        self.assertRedirects(self.client.get(self.start_url), reverse('play_quiz'))
+        self.assertEqual(self.client.get(reverse('play_quiz')).context['question_number'], 2)
+
+        # Aunque el estado se pierda, empezar de nuevo retoma el mismo intento y su reloj
+        quiz_state.discard(student.pk)
+        self.client.get(self.start_url)
+        resumed = quiz_state.load(student.pk)
+        self.assertEqual((resumed.quiz_key, resumed.started_at, resumed.question_ids),
+                         (started.quiz_key, started.started_at, started.question_ids))
+
+    def test_a_second_submission_is_rejected(self):
+        exams.open_exam(self.exam.pk)
+        student = self.students[1]
+        self.assertTemplateUsed(self.play_exam(student), 'quizz/exam_submitted.html')
+        # Otra pestaña que aún tenía el examen abierto
+        question_ids = self.exam.decks.get(user=student).question_ids
+        quiz_state.save(QuizState('0' * 32, student.pk, time.time(), question_ids,
+                                  quiz_id=self.quiz.pk, exam_id=self.exam.pk))
+        response = self.client.get(reverse('quiz_results'))
+        self.assertTemplateUsed(response, 'quizz/exam_waiting.html')
+        self.assertEqual(response.context['status'], 'rejected')
+        self.assertEqual(QuizAttempt.objects.filter(user=student).count(), 1)
+
+    def submission(self, user):
+        return QuizState('0' * 32, user.pk, time.time(), [], quiz_id=self.quiz.pk, exam_id=self.exam.pk)
+
+    @override_settings(QUIZZ_EXAM_QUEUE_SIZE=5)
+    def test_submission_is_stored_before_the_attempt(self):
+        queue = exams.SubmissionQueue(background=False)
+        student = self.students[1]
+        self.assertTrue(queue.submit(student, self.submission(student)))
+        deck = self.exam.decks.get(user=student)
+        self.assertIsNotNone(deck.submitted_at)
+        self.assertIsNone(deck.attempt)
+        self.assertFalse(queue.submit(student, self.submission(student)))
+        cache.clear()
+        self.assertIsNone(exams.load_deck(self.exam.pk, student.pk))
+
+        self.assertEqual(queue.drain(), 1)
+        self.assertEqual(self.exam.decks.get(user=student).attempt.quiz, self.quiz)
+
+    @override_settings(QUIZZ_EXAM_QUEUE_SIZE=5)
+    def test_submissions_left_by_a_dead_process_are_swept(self):
+        # La cola de este proceso nunca se vacía (el worker murió)
+        exams.SubmissionQueue(background=False).submit(self.students[1], self.submission(self.students[1]))
+        self.assertEqual(exams.SubmissionQueue(background=False).sweep(), 1)
+        self.assertEqual(exams.SubmissionQueue(background=False).sweep(), 0)
+        self.assertEqual(QuizAttempt.objects.get().exam_deck.user, self.students[1])
+
+
+@override_settings(QUIZZ_LIVE_FLUSH_SECONDS=0.01)
+class LiveRoomTests(TestCase):
+    """Salas en vivo: unirse, avanzar una pregunta por acción y guardar al cerrar"""
+
+    def setUp(self):
+        self.teacher = User.objects.create_user('docente')
+        self.student = User.objects.create_user('alumno')
+        category = Category.objects.create(name='Historia')
+        for number in range(3):
+            question = Question.objects.create(category=category, question_text=f'Pregunta {number}', points=10)
+            Answer.objects.create(question=question, answer_text='Sí', is_correct=True)
+            Answer.objects.create(question=question, answer_text='No', is_correct=False)
+        question_pool.invalidate()
+        self.quiz = Quiz.objects.create(title='En vivo', category=category, created_by=self.teacher,
+                                        total_questions=3)
+        self.control_url = reverse('live_control', args=[self.quiz.pk])
+        self.addCleanup(live.live_rooms.rooms.clear)
+        self.addCleanup(setattr, live.live_rooms, '_flush_task', None)
+
+    async def control(self, action):
+        await self.async_client.aforce_login(self.teacher)
+        response = await self.async_client.post(self.control_url, {'action': action})
+        return json.loads(response.content)
+
+    async def test_joining_streams_the_current_question(self):
+        await self.control('start')
+        await self.async_client.aforce_login(self.student)
+        response = await self.async_client.get(reverse('live_events', args=[self.quiz.pk]))
+        events = aiter(response.streaming_content)
+
+        async def receive():
+            return (await asyncio.wait_for(anext(events), 1)).decode()
+
+        try:
+            first = await receive()
+            self.assertIn('event: question', first)
+            self.assertIn('"index": 1', first)
+            await self.control('next')
+            self.assertIn('event: results', await receive())
+            self.assertIn('"index": 2', await receive())
+        finally:
+            await events.aclose()
+
+    async def test_start_advances_only_once(self):
+        self.assertEqual((await self.control('start'))['index'], 1)
+        self.assertEqual((await self.control('start'))['index'], 1)
+        self.assertEqual((await self.control('next'))['index'], 2)
+        self.assertEqual(live.live_rooms.rooms[self.quiz.pk].index, 1)
+
+    async def test_closing_persists_attempts_and_tallies(self):
+        await self.control('start')
+        room = live.live_rooms.rooms[self.quiz.pk]
+        correct = next(answer for answer in room.current.answers if answer.is_correct)
+        await self.async_client.aforce_login(self.student)
+        response = await self.async_client.post(reverse('live_answer', args=[self.quiz.pk]), {'answer': correct.id})
+        self.assertTrue(json.loads(response.content)['accepted'])
+        # Un alumno que borró su cuenta antes del cierre no impide guardar a los demás
+        gone = await User.objects.acreate(username='borrado')
+        room.answer(gone.pk, correct.id)
+        await gone.adelete()
+
+        self.assertEqual(await self.control('finish'), {'finished': True, 'players': 2})
+        attempt = await QuizAttempt.objects.aget()
+        self.assertEqual((attempt.user_id, attempt.quiz_id, attempt.score), (self.student.pk, self.quiz.pk, 10))
+        tally = await LiveAnswerTally.objects.aget(answer_id=correct.id)
+        self.assertEqual(tally.count, 2)
+        self.assertFalse((await Quiz.objects.aget(pk=self.quiz.pk)).is_live)
+        self.assertNotIn(self.quiz.pk, live.live_rooms.rooms)
+        response = await self.async_client.post(reverse('live_answer', args=[self.quiz.pk]), {'answer': correct.id})
+        self.assertEqual(response.status_code, 409)
+
+    async def test_a_failed_save_keeps_the_room_open(self):
+        await self.control('start')
+        room = live.live_rooms.rooms[self.quiz.pk]
+        correct = next(answer for answer in room.current.answers if answer.is_correct)
+        other = await User.objects.acreate(username='otro')
+        room.answer(self.student.pk, correct.id)
+        room.answer(other.pk, correct.id)
+
+        def fail_for_other(user, *args, **kwargs):
+            if user.pk == other.pk:
+                raise RuntimeError('fallo al guardar')
+            return complete_quiz(user, *args, **kwargs)
+
+        with mock.patch.object(live, 'complete_quiz', fail_for_other):
+            with self.assertRaises(RuntimeError):
+                await live.live_rooms.close(self.quiz.pk)
+        # Nada a medias: ningún intento, y la sala sigue en vivo con sus conteos
+        # pendientes (el volcado periódico puede guardarlos, pero una sola vez)
+        self.assertFalse(await QuizAttempt.objects.aexists())
+        self.assertTrue((await Quiz.objects.aget(pk=self.quiz.pk)).is_live)
+        self.assertIs(live.live_rooms.rooms[self.quiz.pk], room)
+
+        self.assertEqual(len(await live.live_rooms.close(self.quiz.pk)), 2)
+        self.assertEqual(await QuizAttempt.objects.acount(), 2)
+        self.assertEqual((await LiveAnswerTally.objects.aget(answer_id=correct.id)).count, 2)
+        self.assertFalse((await Quiz.objects.aget(pk=self.quiz.pk)).is_live)
+        self.assertNotIn(self.quiz.pk, live.live_rooms.rooms)
+
+    def test_middleware_runs_async_views_without_a_thread_hop(self):
+        async def view(request):
+            pass
+
+        for middleware in (MetricsMiddleware, ProfileMiddleware):
+            self.assertTrue(iscoroutinefunction(middleware(view)), middleware.__name__)
@@ -1,6 +1,6 @@
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from . import views
+from . import views, api, live, metrics, exports
 
 urlpatterns = [
     # 🔐 Autenticación
@@ -15,6 +15,9 @@ urlpatterns = [
     path('welcome/', views.welcome, name='welcome'),
     path('home/', views.home, name='home'),
     path('start-quiz/', views.start_quiz, name='start_quiz'),
+    path('quiz/<int:quiz_id>/start/', views.start_quiz, name='start_quiz_for'),
+    path('category/<int:category_id>/start/', views.start_quiz, name='start_category_quiz'),
+    path('exam/<int:exam_id>/start/', views.start_exam, name='start_exam'),
     path('play/', views.play_quiz, name='play_quiz'),
     path('results/', views.quiz_results, name='quiz_results'),
     path('leaderboard/', views.leaderboard, name='leaderboard'),
@@ -22,6 +25,20 @@ urlpatterns = [
     path('profile/<str:username>/', views.profile, name='profile_user'),
     path('discover/', views.discover, name='discover'),
 
+    # 📡 API JSON de juego
+    path('api/quiz/start/', api.api_start_quiz, name='api_start_quiz'),
+    path('api/quiz/<str:quiz_key>/answers/', api.api_submit_answers, name='api_submit_answers'),
+
+    # 🔴 Salas en vivo (ASGI)
+    path('live/<int:quiz_id>/', live.live_room, name='live_room'),
+    path('live/<int:quiz_id>/events/', live.live_events, name='live_events'),
+    path('live/<int:quiz_id>/answer/', live.live_answer, name='live_answer'),
+    path('live/<int:quiz_id>/control/', live.live_control, name='live_control'),
+
+    # 📥 Exportaciones (personal)
+    path('exports/<str:dataset>/', exports.export_view, name='export_results'),
+
     # 🛠 Debug
     path('debug/', views.debug_quiz, name='debug_quiz'),
+    path('metrics/', metrics.metrics_view, name='metrics'),
 ]
@@ -0,0 +1,71 @@
+"""Resumen por usuario (UserStats) mantenido al terminar cada quiz"""
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import QuizAttempt, UserStats
+
+
+def is_win(correct_answers, total_questions):
+    return total_questions > 0 and correct_answers >= total_questions * UserStats.WIN_RATIO
+
+
+def record(user_id, score, correct_answers, total_questions, when=None):
+    """
+    Sumar un intento con un único UPDATE condicional (sin leer la fila), dentro
+    de la transacción de quien llama.
+    """
+    today = timezone.localdate(when) if when else timezone.localdate()
+    streak = Case(
+        When(last_played_on=today, then=F('current_streak')),
+        When(last_played_on=today - timezone.timedelta(days=1), then=F('current_streak') + 1),
+        default=Value(1),
+        output_field=IntegerField(),
+    )
+    updates = {
+        'best_score': Greatest('best_score', Value(score)),
+        'wins': F('wins') + int(is_win(correct_answers, total_questions)),
+        'correct_answers': F('correct_answers') + correct_answers,
+        'questions_answered': F('questions_answered') + total_questions,
+        'current_streak': streak,
+        'best_streak': Greatest('best_streak', streak),
+        'last_played_on': today,
+    }
+    stats = UserStats.objects.filter(user_id=user_id)
+    if not stats.update(**updates):
+        UserStats.objects.get_or_create(user_id=user_id)
+        stats.update(**updates)
+
+
+def _replay(stats, score, correct_answers, total_questions, today):
+    """Lo mismo que `record`, en memoria, para reconstruir desde los intentos"""
+    stats.best_score = max(stats.best_score, score)
+    stats.wins += is_win(correct_answers, total_questions)
+    stats.correct_answers += correct_answers
+    stats.questions_answered += total_questions
+    if stats.last_played_on != today:
+        yesterday = today - timezone.timedelta(days=1)
+        stats.current_streak = stats.current_streak + 1 if stats.last_played_on == yesterday else 1
+    stats.best_streak = max(stats.best_streak, stats.current_streak)
+    stats.last_played_on = today
+
+
+def rebuild(batch_size=1000):
+    """Recalcular el resumen de todos los usuarios desde QuizAttempt; devuelve las filas creadas"""
+    attempts = (QuizAttempt.objects.order_by('user_id', 'completed_at', 'pk')
+                .values_list('user_id', 'score', 'correct_answers', 'total_questions', 'completed_at'))
+    batch, stats, created = [], None, 0
+    with transaction.atomic():
+        UserStats.objects.all().delete()
+        for user_id, score, correct_answers, total_questions, completed_at in attempts.iterator(chunk_size=batch_size):
+            if stats is None or stats.user_id != user_id:
+                stats = UserStats(user_id=user_id)
+                batch.append(stats)
+                if len(batch) > batch_size:
+                    UserStats.objects.bulk_create(batch[:-1])
+                    created += len(batch) - 1
+                    batch = batch[-1:]
+            _replay(stats, score, correct_answers, total_questions, timezone.localdate(completed_at))
+        UserStats.objects.bulk_create(batch)
+    return created + len(batch)
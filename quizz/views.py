@@ -1,16 +1,25 @@
+import time
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
+from django.core.paginator import Paginator
 from django.db.models import Sum, Count, Q
 from django.utils import timezone
-from django.http import JsonResponse
+from django.http import JsonResponse, Http404
 from .models import (
     Category, Question, Answer, UserProfile, Badge, 
-    UserBadge, Quiz, QuizAttempt, QuizResponse, Friend
+    UserBadge, Quiz, QuizAttempt, QuizResponse, Friend, UserStats
 )
-import random
+from .deck_pool import deck_pool
+from .indexes import question_pool
+from .decks import new_attempt_key, store_deck, load_deck, discard_deck
+from . import daily_points, exams, friends, leaderboards, quiz_state, search
+from .profiles import get_profile
+from .quiz_state import QuizState
+from .sampling import QuestionSampler
 
 
 def welcome(request):
@@ -25,9 +34,8 @@ def register(request):
     if request.method == 'POST':
         form = UserCreationForm(request.POST)
         if form.is_valid():
+            # El perfil lo crea la señal post_save de User
             user = form.save()
-            # Crear perfil automáticamente
-            UserProfile.objects.create(user=user)
             login(request, user)
             return redirect('home')
     else:
@@ -38,8 +46,8 @@ def register(request):
 @login_required
 def home(request):
     """Pantalla principal - Discover"""
-    # Obtener o crear perfil del usuario
-    profile, created = UserProfile.objects.get_or_create(user=request.user)
+    # Perfil del usuario (cargado una vez por petición)
+    profile = request.profile
     
     # Quizzes disponibles
     quizzes = Quiz.objects.filter(is_live=True)[:5]
@@ -51,7 +59,7 @@ def home(request):
     friends = Friend.objects.filter(user=request.user).select_related('friend', 'friend__profile')[:5]
     
     # Quiz reciente del usuario
-    recent_quiz = QuizAttempt.objects.filter(user=request.user).first()
+    recent_quiz = QuizAttempt.objects.filter(user=request.user).select_related('quiz').first()
     
     context = {
         'profile': profile,
@@ -64,101 +72,119 @@ def home(request):
 
 
 @login_required
-def start_quiz(request):
-    """Iniciar un nuevo quiz - VERSIÓN MEJORADA"""
-    # Limpiar sesión anterior
-    for key in ['quiz_questions', 'current_question', 'score', 'correct_answers']:
-        if key in request.session:
-            del request.session[key]
-    
-    # Obtener preguntas aleatorias
-    all_questions = list(Question.objects.filter(is_active=True))
-    
-    if len(all_questions) < 20:
-        # Si hay menos de 20 preguntas, tomar todas las que hay
-        questions = all_questions
-    else:
-        # Seleccionar 20 aleatorias
-        questions = random.sample(all_questions, 20)
-    
-    if not questions:
+def start_quiz(request, quiz_id=None, category_id=None):
+    """Iniciar un nuevo quiz: al azar, de un Quiz concreto o de una categoría"""
+    size = None
+    if quiz_id is not None:
+        quiz = get_object_or_404(Quiz.objects.only('category_id', 'total_questions'), pk=quiz_id)
+        category_id, size = quiz.category_id, quiz.total_questions
+    
+    # Descartar el quiz anterior; un examen en curso no se abandona así
+    if not quiz_state.clear(request.user.pk):
+        return redirect('play_quiz')
+    
+    # Sacar un mazo ya construido de la categoría (o construirlo si no hay);
+    # las categorías sin preguntas activas no llegan a crear reserva
+    deck = []
+    if category_id is None or question_pool.count(category_id):
+        deck = deck_pool.pop(category_id, size)
+
+    if not deck:
         # No hay preguntas, mostrar mensaje
         return render(request, 'quizz/no_questions.html')
-    
-    # Guardar IDs de preguntas en sesión
-    request.session['quiz_questions'] = [q.id for q in questions]
-    request.session['current_question'] = 0
-    request.session['score'] = 0
-    request.session['correct_answers'] = 0
-    request.session.modified = True
+
+    # Guardar el mazo y el estado compacto del intento en caché (no en sesión)
+    quiz_key = new_attempt_key()
+    store_deck(quiz_key, deck)
+    quiz_state.save(QuizState(quiz_key, request.user.pk, time.time(), [q.id for q in deck],
+                              quiz_id=quiz_id, category_id=category_id))
     
     # Redirigir directamente a la primera pregunta
     return redirect('play_quiz')
 
 
+@login_required
+def start_exam(request, exam_id):
+    """Empezar un examen programado con el mazo preparado del alumno"""
+    header = exams.exam_header(exam_id)
+    if header is None:
+        raise Http404("Examen no encontrado")
+    quiz_id, category_id, status = header
+    if status != 'open':
+        # Aún no empieza (la página se recarga sola) o ya terminó
+        return render(request, 'quizz/exam_waiting.html', {'exam_id': exam_id, 'status': status})
+    
+    # Recargar la página o volver a "empezar" no reinicia un examen en curso
+    state = quiz_state.load(request.user.pk)
+    if state is not None and state.exam_id:
+        return redirect('play_quiz')
+    
+    # Mazo sorteado al programar el examen (sin consultas si está en caché)
+    deck = exams.load_deck(exam_id, request.user.pk)
+    if not deck:
+        return render(request, 'quizz/exam_waiting.html', {'exam_id': exam_id, 'status': 'unavailable'})
+    
+    quiz_state.clear(request.user.pk)
+    # Si ya lo había empezado (y su estado se perdió) se retoma con la misma clave e inicio
+    state = exams.begin(QuizState(new_attempt_key(), request.user.pk, time.time(), [q.id for q in deck],
+                                  quiz_id=quiz_id, exam_id=exam_id, category_id=category_id))
+    store_deck(state.quiz_key, deck)
+    quiz_state.save(state)
+    return redirect('play_quiz')
+
+
 @login_required
 def play_quiz(request):
     """Jugar el quiz - VERSIÓN MEJORADA"""
-    # Obtener datos de la sesión
-    question_ids = request.session.get('quiz_questions', [])
-    current_index = request.session.get('current_question', 0)
-    score = request.session.get('score', 0)
-    correct_answers = request.session.get('correct_answers', 0)
-    
-    # Verificar si hay preguntas en la sesión
-    if not question_ids:
+    # Obtener el estado del quiz en curso
+    state = quiz_state.load(request.user.pk)
+    
+    # Verificar si hay un quiz en curso
+    if state is None:
         return redirect('start_quiz')
     
     # Verificar si terminó el quiz
-    if current_index >= len(question_ids):
+    if state.finished:
         return redirect('quiz_results')
     
-    # Obtener la pregunta actual
-    try:
-        question = Question.objects.get(id=question_ids[current_index])
-    except Question.DoesNotExist:
-        # Si la pregunta no existe, limpiar sesión y empezar de nuevo
-        for key in ['quiz_questions', 'current_question', 'score', 'correct_answers']:
-            if key in request.session:
-                del request.session[key]
+    # Obtener la pregunta actual del mazo (sin consultas)
+    deck = load_deck(state.quiz_key, state.question_ids)
+    if len(deck) != state.total_questions:
+        if state.exam_id:
+            # Se borró una pregunta del examen: se entrega lo respondido
+            return redirect('quiz_results')
+        # Alguna pregunta ya no existe, descartar el quiz y empezar de nuevo
+        quiz_state.clear(request.user.pk)
         return redirect('start_quiz')
-    
-    # Obtener respuestas de la pregunta
-    answers = list(question.answers.all())
+    current_index = state.current_index
+    question = deck[current_index]
+    if question.id != state.question_ids[current_index]:
+        # Quiz empezado por la API: las preguntas respondidas pasan al principio
+        question = next(q for q in deck if q.id == state.question_ids[current_index])
     
     # Calcular progreso
-    progress = ((current_index + 1) / len(question_ids)) * 100
+    progress = ((current_index + 1) / state.total_questions) * 100
     
     # Procesar respuesta si es POST
     if request.method == 'POST':
-        selected_answer_id = request.POST.get('answer')
+        selected_answer = question.get_answer(request.POST.get('answer'))
         
-        if selected_answer_id:
-            try:
-                selected_answer = Answer.objects.get(id=selected_answer_id)
-                
-                # Verificar si es correcta
-                if selected_answer.is_correct:
-                    request.session['score'] = score + question.points
-                    request.session['correct_answers'] = correct_answers + 1
-                
-                # Avanzar a la siguiente pregunta
-                request.session['current_question'] = current_index + 1
-                request.session.modified = True
-                
-                # Redirigir a la siguiente pregunta o resultados
-                return redirect('play_quiz')
-                
-            except Answer.DoesNotExist:
-                pass
+        if selected_answer:
+            # Registrar la respuesta y avanzar; se persiste en lote al terminar
+            state.answer(selected_answer.id, selected_answer.is_correct,
+                         question.points_for(selected_answer), time.time())
+            quiz_state.save(state)
+            
+            # Redirigir a la siguiente pregunta o resultados
+            return redirect('play_quiz')
     
     context = {
         'question': question,
-        'answers': answers,
+        'answers': question.answers,
         'question_number': current_index + 1,
-        'total_questions': len(question_ids),
+        'total_questions': state.total_questions,
         'progress': progress,
-        'score': score,
+        'score': state.score,
     }
     return render(request, 'quizz/play_quiz.html', context)
 
@@ -166,45 +192,50 @@ def play_quiz(request):
 @login_required
 def quiz_results(request):
     """Mostrar resultados del quiz - VERSIÓN MEJORADA"""
-    # Obtener datos de la sesión
-    score = request.session.get('score', 0)
-    correct_answers = request.session.get('correct_answers', 0)
-    question_ids = request.session.get('quiz_questions', [])
-    total_questions = len(question_ids) if question_ids else 0
+    # Obtener el estado del quiz en curso
+    state = quiz_state.load(request.user.pk)
     
     # Si no hay datos de quiz, redirigir al home
-    if total_questions == 0:
+    if state is None or not state.total_questions:
         return redirect('home')
     
-    # Obtener o crear perfil
-    profile, created = UserProfile.objects.get_or_create(user=request.user)
-    
-    # Guardar el intento en la base de datos
-    attempt = QuizAttempt.objects.create(
-        user=request.user,
-        score=score,
-        correct_answers=correct_answers,
-        total_questions=total_questions
-    )
+    # Solo una petición puede cerrar el intento
+    if not quiz_state.discard(request.user.pk):
+        return redirect('home')
     
-    # Actualizar perfil del usuario
-    profile.total_points += score
-    profile.quizzes_played += 1
-    profile.save()
+    score, correct_answers, total_questions = state.score, state.correct_answers, state.total_questions
+    percentage = (correct_answers / total_questions * 100) if total_questions > 0 else 0
     
-    # Verificar y otorgar badges
-    check_and_award_badges(request.user, profile)
+    if state.exam_id:
+        # La entrega se guarda ya; el intento lo crea el hilo de entregas
+        try:
+            accepted = exams.submissions.submit(request.user, state)
+        except Exception:
+            quiz_state.save(state)
+            raise
+        discard_deck(state.quiz_key)
+        if not accepted:
+            # Ya había entregado (otra pestaña) o el mazo ya no es suyo
+            return render(request, 'quizz/exam_waiting.html', {'exam_id': state.exam_id, 'status': 'rejected'})
+        return render(request, 'quizz/exam_submitted.html', {
+            'score': score,
+            'correct_answers': correct_answers,
+            'total_questions': total_questions,
+            'percentage': percentage,
+        })
+    
+    # Guardar intento, respuestas, contadores e insignias en una transacción
+    try:
+        attempt, profile = state.complete(request.user)
+    except Exception:
+        quiz_state.save(state)
+        raise
     
     # Obtener ranking
     rank = profile.get_rank()
     
-    # Calcular porcentaje
-    percentage = (correct_answers / total_questions * 100) if total_questions > 0 else 0
-    
-    # Limpiar sesión
-    for key in ['quiz_questions', 'current_question', 'score', 'correct_answers']:
-        if key in request.session:
-            del request.session[key]
+    # Descartar el mazo
+    discard_deck(state.quiz_key)
     
     context = {
         'attempt': attempt,
@@ -218,75 +249,50 @@ def quiz_results(request):
     return render(request, 'quizz/quiz_results.html', context)
 
 
-def check_and_award_badges(user, profile):
-    """Verificar y otorgar badges según logros"""
-    badges = Badge.objects.all()
-    
-    for badge in badges:
-        # Verificar si ya tiene el badge
-        if UserBadge.objects.filter(user=user, badge=badge).exists():
-            continue
-        
-        # Verificar requisitos según tipo
-        awarded = False
-        if badge.badge_type == 'beginner' and profile.quizzes_played >= badge.requirement:
-            awarded = True
-        elif badge.badge_type in ['intermediate', 'expert', 'master'] and profile.total_points >= badge.requirement:
-            awarded = True
-        
-        if awarded:
-            UserBadge.objects.create(user=user, badge=badge)
-
-
 @login_required
 def leaderboard(request):
     """Tabla de clasificación"""
     tab = request.GET.get('tab', 'weekly')
-    
-    if tab == 'weekly':
-        # Leaderboard semanal
-        week_ago = timezone.now() - timezone.timedelta(days=7)
-        
-        # Calcular puntos semanales para cada usuario
-        users_with_points = []
-        all_profiles = UserProfile.objects.select_related('user').all()
+    scope = request.GET.get('scope', 'global')
+    
+    if scope == 'friends':
+        # Solo el usuario y sus amigos (una consulta, en caché por usuario)
+        period = tab if tab in leaderboards.PERIODS else 'alltime'
+        members = friends.leaderboard(request.user, period)
+        leaderboard_data = [
+            {'user': member.user, 'profile': member, 'points': member.points}
+            for member in members
+        ]
+        user_rank, current_user_points = next((
+            (position, member.points) for position, member in enumerate(members, start=1)
+            if member.user_id == request.user.pk
+        ), (1, 0))
+    else:
+        if tab in leaderboards.PERIODS:
+            # Leaderboard semanal o mensual (materializado)
+            leaderboard_data = [
+                {'user': entry.user, 'profile': entry.user.profile, 'points': entry.points}
+                for entry in leaderboards.top(tab, 10)
+            ]
+        else:
+            # Leaderboard all-time
+            leaderboard_data = []
+            top_profiles = UserProfile.objects.select_related('user').order_by('-total_points')[:10]
         
-        for profile in all_profiles:
-            weekly_points = QuizAttempt.objects.filter(
-                user=profile.user,
-                completed_at__gte=week_ago
-            ).aggregate(total=Sum('score'))['total'] or 0
-            
-            if weekly_points > 0:
-                users_with_points.append({
+            for profile in top_profiles:
+                leaderboard_data.append({
                     'user': profile.user,
                     'profile': profile,
-                    'points': weekly_points
+                    'points': profile.total_points
                 })
-        
-        # Ordenar por puntos
-        leaderboard_data = sorted(users_with_points, key=lambda x: x['points'], reverse=True)[:10]
-    else:
-        # Leaderboard all-time
-        leaderboard_data = []
-        top_profiles = UserProfile.objects.select_related('user').order_by('-total_points')[:10]
-        
-        for profile in top_profiles:
-            leaderboard_data.append({
-                'user': profile.user,
-                'profile': profile,
-                'points': profile.total_points
-            })
-    
-    # Obtener posición del usuario actual
-    current_user_profile, created = UserProfile.objects.get_or_create(user=request.user)
-    if tab == 'weekly':
-        current_user_points = current_user_profile.get_weekly_points()
-        higher_count = len([u for u in users_with_points if u['points'] > current_user_points])
-        user_rank = higher_count + 1
-    else:
-        user_rank = current_user_profile.get_rank()
-        current_user_points = current_user_profile.total_points
+    
+        # Obtener posición del usuario actual
+        current_user_profile = request.profile
+        if tab in leaderboards.PERIODS:
+            current_user_points, user_rank = leaderboards.standing(tab, request.user)
+        else:
+            user_rank = current_user_profile.get_rank()
+            current_user_points = current_user_profile.total_points
     
     # Top 3 para el podio
     top_3 = leaderboard_data[:3] if len(leaderboard_data) >= 3 else leaderboard_data
@@ -295,45 +301,58 @@ def leaderboard(request):
         'leaderboard': leaderboard_data,
         'top_3': top_3,
         'tab': tab,
+        'scope': scope,
         'user_rank': user_rank,
         'current_user_points': current_user_points,
     }
     return render(request, 'quizz/leaderboard.html', context)
 
 
+# Ventanas de la pestaña Stats del perfil (días -> etiqueta)
+PROFILE_WINDOWS = {7: 'Last 7 days', 30: 'Last 30 days', 90: 'Last 90 days'}
+
+
 @login_required
 def profile(request, username=None):
     """Perfil de usuario"""
-    if username:
-        user = get_object_or_404(User, username=username)
-    else:
-        user = request.user
+    # Perfil, usuario y resumen de estadísticas en una sola fila
+    lookup = {'user__username': username} if username else {'user': request.user}
+    profile = UserProfile.objects.select_related('user', 'user__stats').filter(**lookup).first()
+    if profile is None:
+        user = get_object_or_404(User, username=username) if username else request.user
+        profile = get_profile(user)
+    user = profile.user
     
-    profile, created = UserProfile.objects.get_or_create(user=user)
+    try:
+        stats = user.stats
+    except UserStats.DoesNotExist:
+        # Aún no ha terminado ningún quiz
+        stats = UserStats(user=user)
     
     # Badges del usuario
-    user_badges = UserBadge.objects.filter(user=user).select_related('badge')
+    user_badges = list(UserBadge.objects.filter(user=user).select_related('badge'))
     
-    # Estadísticas
-    rank = profile.get_rank()
-    monthly_quizzes = profile.get_monthly_quizzes()
-    
-    # Quizzes ganados (con más del 70% de aciertos)
-    quizzes_won = QuizAttempt.objects.filter(
-        user=user,
-        correct_answers__gte=14  # Al menos 14 de 20 correctas
-    ).count()
-    
-    # Quizzes creados
-    quizzes_created = profile.quizzes_created
+    # Puntos y quizzes de la ventana elegida, desde los puntos diarios
+    try:
+        window = int(request.GET.get('window', 30))
+    except ValueError:
+        window = 30
+    if window not in PROFILE_WINDOWS:
+        window = 30
+    window_points, window_quizzes = daily_points.window_totals(user.pk, window)
     
     context = {
         'profile': profile,
+        'stats': stats,
         'user_badges': user_badges,
-        'rank': rank,
-        'monthly_quizzes': monthly_quizzes,
-        'quizzes_won': quizzes_won,
-        'quizzes_created': quizzes_created,
+        'rank': profile.get_rank(),
+        'window': window,
+        'windows': PROFILE_WINDOWS,
+        'window_points': window_points,
+        'window_quizzes': window_quizzes,
+        'show_stats': 'window' in request.GET,
+        'quizzes_won': stats.wins,
+        'quizzes_created': profile.quizzes_created,
         'is_own_profile': user == request.user,
     }
     return render(request, 'quizz/profile.html', context)
@@ -344,13 +363,13 @@ def discover(request):
     """Página de descubrimiento"""
     # Buscar quizzes y categorías
     search_query = request.GET.get('search', '')
+    page_obj = None
     
     if search_query:
-        quizzes = Quiz.objects.filter(
-            Q(title__icontains=search_query) | Q(description__icontains=search_query),
-            is_live=True
-        )
-        categories = Category.objects.filter(name__icontains=search_query)
+        # Búsqueda de texto completo con ranking (ver quizz.search)
+        page_obj = Paginator(search.search('quiz', search_query), 10).get_page(request.GET.get('page'))
+        quizzes = page_obj.object_list
+        categories = search.search('category', search_query)[:8]
     else:
         quizzes = Quiz.objects.filter(is_live=True)[:10]
         categories = Category.objects.all()[:8]
@@ -363,6 +382,7 @@ def discover(request):
         'categories': categories,
         'friends': friends,
         'search_query': search_query,
+        'page_obj': page_obj,
     }
     return render(request, 'quizz/discover.html', context)
 
@@ -375,7 +395,8 @@ def debug_quiz(request):
     total_questions = Question.objects.count()
     active_questions = Question.objects.filter(is_active=True).count()
     total_categories = Category.objects.count()
-    sample_questions = Question.objects.filter(is_active=True).prefetch_related('answers')[:5]
+    sample_ids = QuestionSampler().uniform(5)
+    sample_questions = Question.objects.filter(id__in=sample_ids).prefetch_related('answers')
     
     context = {
         'total_questions': total_questions,